@@ -0,0 +1 @@
+"""Benchmarks for medisort. Run with: python -m benchmarks.run"""
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# name -> (image specs, video specs). Image specs are (format, (w, h), count);
+# video specs are (container, fourcc, (w, h), seconds, fps, count).
+CORPORA = {
+    "small": (
+        [("JPEG", (1280, 960), 12), ("JPEG", (4000, 3000), 6), ("PNG", (1920, 1080), 6), ("GIF", (800, 600), 4)],
+        [("mp4", "mp4v", (640, 360), 3, 30, 3), ("avi", "MJPG", (1280, 720), 3, 30, 2)],
+    ),
+    "large": (
+        [("JPEG", (1280, 960), 60), ("JPEG", (4000, 3000), 30), ("JPEG", (6000, 4000), 10),
+         ("PNG", (1920, 1080), 20), ("PNG", (4000, 3000), 5), ("GIF", (800, 600), 10)],
+        [("mp4", "mp4v", (1280, 720), 5, 30, 6), ("mp4", "mp4v", (1920, 1080), 5, 30, 3),
+         ("avi", "MJPG", (1280, 720), 5, 30, 3)],
+    ),
+}
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif"}
+MANIFEST = "corpus.json"
+
+
+def synthetic_image(rng, size):
+    """A smooth gradient with shapes and noise, so encoders and decoders do realistic work."""
+    w, h = size
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    phase = rng.uniform(0, 2 * np.pi, 3)
+    freq = rng.uniform(1, 4, 3)
+    channels = [127 + 100 * np.sin(freq[c] * (x / w + y / h) * np.pi + phase[c]) for c in range(3)]
+    img = np.stack(channels, axis=2)
+    for _ in range(8):
+        x0, y0 = rng.integers(0, w), rng.integers(0, h)
+        x1, y1 = x0 + rng.integers(w // 20, w // 4), y0 + rng.integers(h // 20, h // 4)
+        img[y0:y1, x0:x1] = rng.integers(0, 256, 3)
+    img += rng.normal(0, 6, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def write_video(path, fourcc, size, seconds, fps, rng):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        raise OSError(f"OpenCV cannot encode {fourcc} video: {path}")
+    try:
+        background = synthetic_image(rng, size)[:, :, ::-1].copy()
+        w, h = size
+        for i in range(seconds * fps):
+            frame = np.roll(background, i * 4, axis=1)
+            x = int((w - 80) * (0.5 + 0.5 * np.sin(i / fps * 2)))
+            cv2.rectangle(frame, (x, h // 3), (x + 80, h // 3 + 80), (255, 255, 255), -1)
+            cv2.putText(frame, str(i), (10, h - 20), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def build_corpus(root, name="small", seed=0):
+    """Generates the named corpus under root/name, or reuses it if it was built with the same settings.
+
+    Returns the corpus directory, with images/ and videos/ subfolders.
+    """
+    images, videos = CORPORA[name]
+    settings = {"images": images, "videos": videos, "seed": seed}
+    path = os.path.join(root, name)
+    manifest = os.path.join(path, MANIFEST)
+    try:
+        with open(manifest, encoding="utf-8") as f:
+            if json.load(f) == json.loads(json.dumps(settings)):
+                return path
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(path, "images"))
+    os.makedirs(os.path.join(path, "videos"))
+    rng = np.random.default_rng(seed)
+
+    for fmt, size, count in images:
+        for i in range(count):
+            img = Image.fromarray(synthetic_image(rng, size))
+            if fmt == "GIF":
+                img = img.quantize(256)
+            filename = f"{fmt.lower()}_{size[0]}x{size[1]}_{i:03d}{EXTENSIONS[fmt]}"
+            img.save(os.path.join(path, "images", filename), fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+
+    for container, fourcc, size, seconds, fps, count in videos:
+        for i in range(count):
+            filename = f"{fourcc.lower()}_{size[0]}x{size[1]}_{i:03d}.{container}"
+            write_video(os.path.join(path, "videos", filename), fourcc, size, seconds, fps, rng)
+
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    return path
@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+
+class StubPhotoImage:
+    """Stands in for ImageTk.PhotoImage: copies the pixels like Tk would, but draws nothing."""
+
+    def __init__(self, image=None, size=None, **kw):
+        if isinstance(image, str):
+            image = Image.new(image, size)
+        self.image = image.copy() if image is not None else Image.new("RGB", size or (1, 1))
+
+    def paste(self, im, box=None):
+        self.image.paste(im, box)
+
+    def width(self):
+        return self.image.width
+
+    def height(self):
+        return self.image.height
+
+
+class StubWindow:
+    """Single-threaded stand-in for a Tk window, running after() callbacks from its own timer queue."""
+
+    def __init__(self):
+        self.timers = []
+        self.sequence = itertools.count()
+        self.destroyed = False
+
+    def after(self, ms, func=None, *args):
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, next(self.sequence), func, args))
+
+    def after_idle(self, func, *args):
+        self.after(0, func, *args)
+
+    def protocol(self, name, func):
+        pass
+
+    def bind(self, sequence, func):
+        pass
+
+    def winfo_exists(self):
+        return not self.destroyed
+
+    def destroy(self):
+        self.destroyed = True
+
+    def run_until(self, condition, timeout):
+        """Runs due callbacks until condition() holds. Returns False on timeout."""
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            now = time.perf_counter()
+            if now > deadline:
+                return False
+            if self.timers and self.timers[0][0] <= now:
+                _, _, func, args = heapq.heappop(self.timers)
+                func(*args)
+            else:
+                wake = self.timers[0][0] if self.timers else now + 0.001
+                time.sleep(max(0, min(wake, deadline) - now))
+        return True
+
+
+class StubLabel:
+    """Records when a new image is put on screen, which is what the benchmarks time."""
+
+    def __init__(self, window):
+        self.window = window
+        self.image = None
+        self.shown = 0
+        self.last_shown = None
+
+    def config(self, image=None, **kw):
+        if image is not None and image is not getattr(self, "current", None):
+            self.current = image
+            self.shown += 1
+            self.last_shown = time.perf_counter()
+
+    configure = config
+
+    def bind(self, sequence, func):
+        pass
+
+    def winfo_exists(self):
+        return self.window.winfo_exists()
+
+    def winfo_width(self):
+        return 1 # Never mapped, so sorters fall back to their default preview size
+
+    def winfo_height(self):
+        return 1
+
+    def winfo_fpixels(self, distance):
+        return 96.0
+
+    def after_idle(self, func, *args):
+        self.window.after_idle(func, *args)
+
+
+class StubMessageBox:
+    def __init__(self):
+        self.messages = []
+
+    def showinfo(self, title, message):
+        self.messages.append(("info", title, message))
+
+    def showerror(self, title, message):
+        self.messages.append(("error", title, message))
+
+
+@contextmanager
+def headless(*modules):
+    """Swaps ImageTk.PhotoImage and messagebox in the given sorter modules for stubs, where they use them."""
+    messages = StubMessageBox()
+    stubs = {"ImageTk": type("ImageTk", (), {"PhotoImage": StubPhotoImage}), "messagebox": messages}
+    saved = []
+    for module in modules:
+        for name, stub in stubs.items():
+            if hasattr(module, name):
+                saved.append((module, name, getattr(module, name)))
+                setattr(module, name, stub)
+    try:
+        yield messages
+    finally:
+        for module, name, original in saved:
+            setattr(module, name, original)
@@ -0,0 +1,301 @@
+"""Reproducible end-to-end benchmarks for the image and video sorters.
+
+    python -m benchmarks.run --save-baseline baseline.json
+    python -m benchmarks.run --baseline baseline.json
+
+Each scenario runs in a fresh interpreter on a fresh copy of the corpus, drives the
+sorter through a renderer stub and prints its results; the parent collects them,
+takes the median over --repeat runs and compares against a stored baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import CORPORA, build_corpus
+
+TIERS = ["Good", "Bad", "Skip"]
+
+# Metrics where a larger number is an improvement; everything else is a latency or a size
+HIGHER_IS_BETTER = {"moves_per_s", "move_mb_per_s", "playback_fps", "decode_fps"}
+
+
+def peak_rss_mb():
+    # Linux keeps ru_maxrss across exec, so a child would report its parent's peak; VmHWM is per process
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None # Not available on Windows
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(max(own, children) * scale / 2 ** 20, 1)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def wait_for_moves(mover, timeout):
+    deadline = time.perf_counter() + timeout
+    while mover.counts()[0] and time.perf_counter() < deadline:
+        time.sleep(0.005)
+
+
+def folder_bytes(folder):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder)
+               if os.path.isfile(os.path.join(folder, name)))
+
+
+def summarize(started, first_shown, switches, snapshot, moved_bytes):
+    """Builds the common results. Move throughput is per mover thread, so decision pacing does not skew it."""
+    moved = snapshot["counters"].get("moves_done", 0)
+    move_seconds = max(snapshot["stages"].get("move", {}).get("total_ms", 0) / 1000, 1e-9)
+    ms = [s * 1000 for s in switches]
+    return {
+        "time_to_first_ms": round((first_shown - started) * 1000, 2),
+        "switch_p50_ms": round(percentile(ms, 50), 2) if ms else None,
+        "switch_p95_ms": round(percentile(ms, 95), 2) if ms else None,
+        "switch_max_ms": round(max(ms), 2) if ms else None,
+        "decisions": len(switches),
+        "moves_per_s": round(moved / move_seconds, 1) if moved else None,
+        "move_mb_per_s": round(moved_bytes / 2 ** 20 / move_seconds, 1) if moved else None,
+    }
+
+
+def stage_means(snapshot):
+    return {name: summary["mean_ms"] for name, summary in snapshot["stages"].items()}
+
+
+def run_images(folder, timeout):
+    from benchmarks.headless import StubLabel, StubWindow, headless
+    from medisort import img_sort, session
+    from medisort.metrics import metrics
+
+    metrics.configure()
+    window = StubWindow()
+    label = StubLabel(window)
+    closed = []
+    total_bytes = folder_bytes(folder)
+
+    with headless(img_sort, session) as messages:
+        started = time.perf_counter()
+        sorter = img_sort.ImageSorter(window, label, folder, TIERS, lambda: closed.append(True))
+        sorter.start()
+        if not window.run_until(lambda: label.shown or closed, timeout):
+            raise TimeoutError("No image was shown")
+        first_shown = label.last_shown
+
+        switches = []
+        while not closed:
+            before = label.shown
+            decided = time.perf_counter()
+            sorter.on_tier_select(TIERS[len(switches) % len(TIERS)])
+            if not window.run_until(lambda: label.shown > before or closed, timeout):
+                raise TimeoutError("The next image was never shown")
+            if label.shown > before:
+                switches.append(label.last_shown - decided)
+        wait_for_moves(sorter.session.mover, timeout)
+
+    errors = [m for m in messages.messages if m[0] == "error"]
+    if errors:
+        raise RuntimeError(errors[0][2])
+    snapshot = metrics.snapshot()
+    result = summarize(started, first_shown, switches, snapshot, total_bytes - folder_bytes(folder))
+    result["stages_mean_ms"] = stage_means(snapshot)
+    return result
+
+
+def run_videos(folder, timeout, watch_seconds):
+    from benchmarks.headless import StubLabel, StubWindow, headless
+    from medisort import session, vid_sort
+    from medisort.metrics import metrics
+
+    metrics.configure()
+    window = StubWindow()
+    label = StubLabel(window)
+    closed = []
+    total_bytes = folder_bytes(folder)
+
+    with headless(vid_sort, session) as messages:
+        started = time.perf_counter()
+        sorter = vid_sort.VideoSorter(window, label, folder, TIERS, lambda: closed.append(True))
+        sorter.start()
+        if not window.run_until(lambda: label.shown or closed, timeout):
+            raise TimeoutError("No video was shown")
+        first_shown = label.last_shown
+
+        switches = []
+        while not closed:
+            # Let the video play before deciding, as a person would
+            window.run_until(lambda: closed, watch_seconds)
+            if closed:
+                break
+            before = label.shown
+            decided = time.perf_counter()
+            sorter.on_tier_select(TIERS[len(switches) % len(TIERS)])
+            if not window.run_until(lambda: label.shown > before or closed, timeout):
+                raise TimeoutError("The next video was never shown")
+            if label.shown > before:
+                switches.append(label.last_shown - decided)
+        wait_for_moves(sorter.session.mover, timeout)
+        time.sleep(0.1) # Let the last playback thread record its run
+
+    errors = [m for m in messages.messages if m[0] == "error"]
+    if errors:
+        raise RuntimeError(errors[0][2])
+    snapshot = metrics.snapshot()
+    result = summarize(started, first_shown, switches, snapshot, total_bytes - folder_bytes(folder))
+    result["playback_fps"] = snapshot["rates"]["display_fps"]
+    result["decode_fps"] = snapshot["rates"]["decode_fps"]
+    result["dropped_frames"] = snapshot["counters"].get("frames_dropped", 0)
+    result["stages_mean_ms"] = stage_means(snapshot)
+    return result
+
+
+def run_scenario(args):
+    """Child process: runs one scenario against args.folder and prints its results as JSON."""
+    if args.scenario == "images":
+        result = run_images(args.folder, args.timeout)
+    else:
+        result = run_videos(args.folder, args.timeout, args.watch)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+    return 0
+
+
+def spawn_scenario(scenario, corpus_path, args):
+    """Copies the corpus to a scratch folder and runs one scenario in a fresh interpreter."""
+    scratch = tempfile.mkdtemp(prefix=f"medisort-bench-{scenario}-")
+    try:
+        folder = os.path.join(scratch, scenario)
+        shutil.copytree(os.path.join(corpus_path, scenario), folder)
+        command = [sys.executable, "-m", "benchmarks.run", "--scenario", scenario, "--folder", folder,
+                   "--timeout", str(args.timeout), "--watch", str(args.watch)]
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, cwd=root).stdout
+        return json.loads(output.decode().strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def median_results(runs):
+    result = {}
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if isinstance(value, dict):
+            result[key] = median_results([run[key] for run in runs])
+        elif values and all(isinstance(v, (int, float)) for v in values):
+            result[key] = round(statistics.median(values), 2)
+        else:
+            result[key] = value
+    return result
+
+
+def environment(corpus):
+    import cv2
+    import PIL
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "opencv": cv2.__version__,
+        "corpus": corpus,
+    }
+
+
+def compare(baseline, results, threshold):
+    """Prints a table of changes against the baseline. Returns the regressions beyond threshold."""
+    regressions = []
+    print(f"{'metric':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for key, value in current.items():
+            old = previous.get(key)
+            if key == "decisions" or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = -change if key in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            if flag:
+                regressions.append(f"{scenario}.{key}")
+            print(f"{scenario + '.' + key:<32} {old:>10} {value:>10} {change:>+8.1%}{flag}")
+    if baseline.get("environment") != results["environment"]:
+        print("Note: the baseline was recorded in a different environment", file=sys.stderr)
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Benchmark the medisort sorters.")
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="small", help="corpus size (default: small)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "medisort-bench-corpus"),
+                        help="where generated corpora are kept between runs")
+    parser.add_argument("--only", choices=["images", "videos"], help="run a single scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median is reported")
+    parser.add_argument("--watch", type=float, default=1.5, help="seconds each video plays before a decision")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for any single step")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against a results file and fail on regressions")
+    parser.add_argument("--save-baseline", metavar="PATH", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    parser.add_argument("--scenario", choices=["images", "videos"], help=argparse.SUPPRESS)
+    parser.add_argument("--folder", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.scenario:
+        return run_scenario(args)
+
+    print(f"Preparing the {args.corpus} corpus in {args.corpus_dir}...", file=sys.stderr)
+    corpus_path = build_corpus(args.corpus_dir, args.corpus)
+
+    results = {"environment": environment(args.corpus), "repeat": args.repeat, "scenarios": {}}
+    for scenario in [args.only] if args.only else ["images", "videos"]:
+        runs = []
+        for i in range(args.repeat):
+            print(f"Running {scenario} ({i + 1}/{args.repeat})...", file=sys.stderr)
+            runs.append(spawn_scenario(scenario, corpus_path, args))
+        results["scenarios"][scenario] = median_results(runs)
+
+    text = json.dumps(results, indent=2)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+
+    if not args.baseline:
+        print(text)
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, results, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
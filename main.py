@@ -1,7 +1,4 @@
-from medisort.medisort import MediaSorterApp
-import tkinter as tk
+from medisort.medisort import main
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = MediaSorterApp(root)
-    root.mainloop()
\ No newline at end of file
+    main()
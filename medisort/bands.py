@@ -0,0 +1,312 @@
+import io
+import math
+import struct
+import zlib
+
+from PIL import Image
+
+from medisort.exif import TiffReader
+
+# Bits per pixel of the uncompressed raw layouts we know how to split into row ranges
+RAW_BITS = {
+    "1": 1, "L": 8, "P": 8, "LA": 16, "I;16": 16, "I;16B": 16, "I;16L": 16,
+    "RGB": 24, "BGR": 24, "RGBX": 32, "RGBA": 32, "BGRX": 32, "BGRA": 32, "CMYK": 32,
+}
+
+# Rows per tile when splitting a single uncompressed strip
+RAW_ROWS_PER_TILE = 64
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+INFLATE_STEP = 1024 * 1024 # Most bytes one zlib call may produce
+
+# Pixels decoded at once when the format allows; every copy made on the way scales with it
+BAND_BYTES = 4 * 1024 * 1024
+
+IMAGE_LENGTH = 0x0101
+STRIP_OFFSETS = 0x0111
+ROWS_PER_STRIP = 0x0116
+STRIP_BYTE_COUNTS = 0x0117
+PLANAR_CONFIG = 0x011C
+SAMPLES_PER_PIXEL = 0x0115
+TILE_WIDTH = 0x0142
+TILE_LENGTH = 0x0143
+TILE_OFFSETS = 0x0144
+TILE_BYTE_COUNTS = 0x0145
+LONG = 4
+# Tags a band needs to decode like the full image; everything else is left out of it
+TIFF_DECODE_TAGS = {
+    0x0100, 0x0102, 0x0103, 0x0106, 0x010A, SAMPLES_PER_PIXEL, ROWS_PER_STRIP, PLANAR_CONFIG,
+    0x013D, 0x0140, TILE_WIDTH, TILE_LENGTH, 0x0152, 0x0153, 0x015B, 0x0211, 0x0212, 0x0213, 0x0214,
+}
+
+
+def image_bands(path, img, row_bytes, max_bytes):
+    """Returns a generator of (top, band) images covering img from top to bottom, each band at
+    most max_bytes of pixels (BAND_BYTES where the layout allows), or None if img's format
+    cannot be decoded a band at a time."""
+    for plan in (raw_plan, png_plan, tiff_plan):
+        bands = plan(path, img, row_bytes, max_bytes)
+        if bands is not None:
+            return bands
+    return None
+
+
+def group_rows(units, row_bytes, max_bytes):
+    """Merges consecutive (top, bottom, part) row ranges into bands of about BAND_BYTES.
+
+    Returns [[top, bottom, parts]], or None if a single range is larger than max_bytes.
+    """
+    bands = []
+    for top, bottom, part in units:
+        if (bottom - top) * row_bytes > max_bytes:
+            return None
+        if bands and (bottom - bands[-1][0]) * row_bytes <= min(max_bytes, BAND_BYTES):
+            bands[-1][1] = bottom
+            bands[-1][2].append(part)
+        else:
+            bands.append([top, bottom, [part]])
+    return bands
+
+
+def split_raw_tiles(tiles):
+    """Splits uncompressed tiles into (top, bottom, part) row ranges, or returns None if any tile
+    is compressed or in a layout we cannot split."""
+    units = []
+    for name, (x0, y0, x1, y1), offset, args in tiles:
+        if name != "raw" or not isinstance(args, tuple) or len(args) < 3 or args[0] not in RAW_BITS:
+            return None
+        rawmode, stride, orientation = args[:3]
+        stride = stride or ((x1 - x0) * RAW_BITS[rawmode] + 7) // 8
+        height = y1 - y0
+        for top in range(0, height, RAW_ROWS_PER_TILE):
+            bottom = min(top + RAW_ROWS_PER_TILE, height)
+            # Bottom-up layouts store the last row first
+            first_row = top if orientation > 0 else height - bottom
+            part = (y0 + top, bottom - top, x0, x1, offset + first_row * stride, rawmode, stride, orientation)
+            units.append((y0 + top, y0 + bottom, part))
+    return sorted(units, key=lambda unit: unit[0])
+
+
+def raw_plan(path, img, row_bytes, max_bytes):
+    units = split_raw_tiles(img.tile)
+    if units is None or len(units) < 2:
+        return None
+    bands = group_rows(units, row_bytes, max_bytes)
+    return None if bands is None else raw_bands(path, img, bands)
+
+
+def raw_bands(path, img, bands):
+    with open(path, "rb") as fp:
+        for top, bottom, parts in bands:
+            band = Image.new(img.mode, (img.width, bottom - top))
+            for part_top, height, x0, x1, offset, rawmode, stride, orientation in parts:
+                fp.seek(offset)
+                data = fp.read(height * stride)
+                if len(data) < height * stride:
+                    raise OSError("Truncated image data")
+                piece = Image.frombytes(img.mode, (x1 - x0, height), data, "raw", rawmode, stride, orientation)
+                band.paste(piece, (x0, part_top - top))
+            yield top, band
+
+
+def png_plan(path, img, row_bytes, max_bytes):
+    """Non-interlaced PNGs whose rows Pillow can pack back into their stored form."""
+    if img.format != "PNG" or img.info.get("interlace") or len(img.tile) != 1:
+        return None
+    args = img.tile[0][3]
+    rawmode = args[0] if isinstance(args, tuple) else args
+    try:
+        # The last row of each band is written back out unfiltered to start the next one
+        Image.new(img.mode, (1, 1)).tobytes("raw", rawmode)
+    except (ValueError, OSError):
+        return None
+    rows = min(max_bytes, BAND_BYTES) // row_bytes - 1
+    if rows < 1:
+        return None
+    return png_bands(path, img, rawmode, rows)
+
+
+def write_chunk(stream, kind, *parts):
+    """Writes a PNG chunk made of parts without joining them."""
+    stream.write(struct.pack(">I", sum(map(len, parts))) + kind)
+    crc = zlib.crc32(kind)
+    for part in parts:
+        stream.write(part)
+        crc = zlib.crc32(part, crc)
+    stream.write(struct.pack(">I", crc))
+
+
+def png_bands(path, img, rawmode, band_rows):
+    """Inflates the image data incrementally and decodes each band as a small PNG of its own.
+
+    PNG filters only refer to the row above, so a band decodes exactly once the last row of
+    the band before is put in front of it, unfiltered.
+    """
+    with open(path, "rb") as fp:
+        if fp.read(8) != PNG_SIGNATURE:
+            raise OSError("Not a PNG file")
+        ihdr, extra, idat = None, io.BytesIO(), []
+        while True:
+            head = fp.read(8)
+            if len(head) < 8:
+                raise OSError("Truncated PNG file")
+            length, kind = struct.unpack(">I4s", head)
+            if kind == b"IDAT":
+                idat.append((fp.tell(), length))
+                fp.seek(length, 1)
+            elif kind in (b"IHDR", b"PLTE", b"tRNS"):
+                data = fp.read(length)
+                if kind == b"IHDR":
+                    ihdr = data
+                else:
+                    write_chunk(extra, kind, data)
+            elif kind == b"IEND":
+                break
+            else:
+                fp.seek(length, 1)
+            fp.seek(4, 1) # CRC
+        if ihdr is None or len(ihdr) != 13:
+            raise OSError("Corrupt PNG header")
+        width, height, depth, color_type = struct.unpack(">IIBB", ihdr[:10])
+        stored = 1 + (width * PNG_CHANNELS.get(color_type, 1) * depth + 7) // 8
+
+        inflater = zlib.decompressobj()
+        pending = bytearray()
+        previous = None
+        top = 0
+        for offset, length in idat:
+            fp.seek(offset)
+            data = fp.read(length)
+            while top < height:
+                try:
+                    inflated = inflater.decompress(data, INFLATE_STEP)
+                except zlib.error as e:
+                    raise OSError(f"Corrupt PNG data: {e}")
+                data = inflater.unconsumed_tail
+                if not inflated and not data:
+                    break
+                pending += inflated
+                while top < height and len(pending) >= min(band_rows, height - top) * stored:
+                    rows = min(band_rows, height - top)
+                    lead = b"" if previous is None else b"\0" + previous
+                    stream = io.BytesIO()
+                    stream.write(PNG_SIGNATURE)
+                    write_chunk(stream, b"IHDR", ihdr[:4] + struct.pack(">I", rows + bool(lead)) + ihdr[8:])
+                    stream.write(extra.getvalue())
+                    # Stored, not compressed: the band is only wrapped up for Pillow's decoder
+                    packer = zlib.compressobj(0)
+                    write_chunk(stream, b"IDAT", packer.compress(lead))
+                    with memoryview(pending) as view:
+                        for start in range(0, rows * stored, INFLATE_STEP):
+                            write_chunk(stream, b"IDAT", packer.compress(view[start:min(start + INFLATE_STEP, rows * stored)]))
+                    write_chunk(stream, b"IDAT", packer.flush())
+                    del pending[:rows * stored]
+                    write_chunk(stream, b"IEND")
+                    stream.seek(0)
+                    decoded = Image.open(stream)
+                    decoded.load()
+                    del stream
+                    previous = decoded.crop((0, decoded.height - 1, width, decoded.height)).tobytes("raw", rawmode)
+                    yield top, decoded.crop((0, 1, width, decoded.height)) if lead else decoded
+                    top += rows
+        if top < height:
+            raise OSError("Truncated PNG data")
+
+
+def tiff_plan(path, img, row_bytes, max_bytes):
+    """Compressed TIFFs stored in several strips or tiles, one image plane."""
+    if img.format != "TIFF" or len(img.tile) != 1 or img.tile[0][0] != "libtiff":
+        return None
+    with open(path, "rb") as fp:
+        try:
+            if fp.read(4)[2:4] not in (b"\x2a\x00", b"\x00\x2a"): # BigTIFF keeps 8-byte offsets
+                return None
+            reader = TiffReader(fp)
+            entries, _ = reader.read_entries(reader.first_ifd)
+            tags, _ = reader.read_ifd(reader.first_ifd)
+        except (ValueError, struct.error):
+            return None
+    if tags.get(PLANAR_CONFIG, (1,))[0] != 1 and tags.get(SAMPLES_PER_PIXEL, (1,))[0] > 1:
+        return None
+
+    units = []
+    if TILE_OFFSETS in tags and TILE_BYTE_COUNTS in tags:
+        tile_width, tile_length = tags.get(TILE_WIDTH, (0,))[0], tags.get(TILE_LENGTH, (0,))[0]
+        if not tile_width or not tile_length:
+            return None
+        across = math.ceil(img.width / tile_width)
+        blocks = list(zip(tags[TILE_OFFSETS], tags[TILE_BYTE_COUNTS]))
+        for top in range(0, img.height, tile_length):
+            start = top // tile_length * across
+            units.append((top, min(top + tile_length, img.height), blocks[start:start + across]))
+        offsets_tag, counts_tag = TILE_OFFSETS, TILE_BYTE_COUNTS
+    elif STRIP_OFFSETS in tags and STRIP_BYTE_COUNTS in tags:
+        rows_per_strip = tags.get(ROWS_PER_STRIP, (img.height,))[0]
+        blocks = list(zip(tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]))
+        for index, block in enumerate(blocks):
+            top = index * rows_per_strip
+            if top < img.height:
+                units.append((top, min(top + rows_per_strip, img.height), [block]))
+        offsets_tag, counts_tag = STRIP_OFFSETS, STRIP_BYTE_COUNTS
+    else:
+        return None
+    if len(units) < 2 or sum(len(part) for _, _, part in units) != len(blocks):
+        return None
+    bands = group_rows(units, row_bytes, max_bytes)
+    if bands is None:
+        return None
+
+    kept = {tag: entry for tag, entry in entries.items() if tag in TIFF_DECODE_TAGS}
+    return tiff_bands(path, img, reader.endian, kept, offsets_tag, counts_tag, bands)
+
+
+def tiff_bands(path, img, endian, entries, offsets_tag, counts_tag, bands):
+    """Decodes each band as a small TIFF of its own made of the band's strips or tiles."""
+    with open(path, "rb") as fp:
+        for top, bottom, parts in bands:
+            blocks = [block for part in parts for block in part]
+            data = []
+            for offset, length in blocks:
+                fp.seek(offset)
+                data.append(fp.read(length))
+                if len(data[-1]) < length:
+                    raise OSError("Truncated image data")
+            fields = dict(entries)
+            fields[IMAGE_LENGTH] = (LONG, 1, struct.pack(endian + "I", bottom - top))
+            fields[counts_tag] = (LONG, len(data), struct.pack(endian + "I" * len(data), *map(len, data)))
+            band = Image.open(io.BytesIO(tiff_file(endian, fields, offsets_tag, data)))
+            del data
+            band.load()
+            yield top, band
+
+
+def tiff_file(endian, fields, offsets_tag, data):
+    """Builds a one-image TIFF from raw IFD entries, with data as its strips or tiles."""
+    fields[offsets_tag] = (LONG, len(data), b"\0" * 4 * len(data))
+    size = len(tiff_header(endian, fields))
+    offsets, position = [], size
+    for block in data:
+        offsets.append(position)
+        position += len(block)
+    fields[offsets_tag] = (LONG, len(data), struct.pack(endian + "I" * len(data), *offsets))
+    return tiff_header(endian, fields) + b"".join(data)
+
+
+def tiff_header(endian, fields):
+    """Returns the TIFF header, the IFD and its out-of-line values."""
+    values_at = 8 + 2 + len(fields) * 12 + 4
+    ifd, values = [struct.pack(endian + "H", len(fields))], bytearray()
+    for tag in sorted(fields):
+        field_type, count, raw = fields[tag]
+        if len(raw) <= 4:
+            field = raw.ljust(4, b"\0")
+        else:
+            field = struct.pack(endian + "I", values_at + len(values))
+            values += raw
+            if len(values) % 2:
+                values += b"\0"
+        ifd.append(struct.pack(endian + "HHI", tag, field_type, count) + field)
+    ifd.append(struct.pack(endian + "I", 0))
+    magic = b"II*\0" if endian == "<" else b"MM\0*"
+    return magic + struct.pack(endian + "I", 8) + b"".join(ifd) + bytes(values)
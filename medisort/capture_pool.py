@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from PIL import Image
+
+from medisort.metrics import metrics
+from medisort.preview import PREVIEW_SIZE, fit_size
+
+
+class PreparedCapture:
+    """An opened capture positioned after its first frame, plus that frame ready for display."""
+
+    def __init__(self, cap, first_image):
+        self.cap = cap
+        self.first_image = first_image
+
+
+def open_capture(path, size=PREVIEW_SIZE):
+    with metrics.time("video_open"):
+        return open_first_frame(path, size)
+
+
+def open_first_frame(path, size):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        cap.release()
+        raise OSError(f"Could not open video: {path}")
+    ok, frame = cap.read()
+    if not ok:
+        cap.release()
+        raise OSError(f"Could not decode video: {path}")
+    frame = cv2.resize(frame, fit_size((frame.shape[1], frame.shape[0]), size), interpolation=cv2.INTER_AREA)
+    return PreparedCapture(cap, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+
+
+def release_when_done(future):
+    """Releases the capture behind future once it is ready, whether or not anyone waits for it."""
+    def release(done):
+        if not done.cancelled() and done.exception() is None:
+            done.result().cap.release()
+    future.cancel()
+    future.add_done_callback(release)
+
+
+class CapturePool:
+    """Opens the next few videos in the background and decodes their first frames ahead of time."""
+
+    def __init__(self, folder_path, depth=2, playback_path=None):
+        self.folder_path = folder_path
+        self.depth = depth
+        # Maps a name to the file that is actually played, e.g. a proxy of it
+        self.playback_path = playback_path or (lambda name: os.path.join(folder_path, name))
+        self.entries = {} # Name -> (path opened, future)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix="medisort-capture")
+
+    def schedule(self, upcoming):
+        """Opens the given names (nearest first) and releases every other prepared capture."""
+        wanted = {name: self.playback_path(name) for name in list(upcoming)[:self.depth]}
+        with self.lock:
+            for name in list(self.entries):
+                # Also reopened when a proxy has become ready since
+                if wanted.get(name) != self.entries[name][0]:
+                    release_when_done(self.entries.pop(name)[1])
+            for name, path in wanted.items():
+                if name not in self.entries:
+                    self.entries[name] = (path, self.executor.submit(open_capture, path))
+
+    def take(self, name):
+        """Returns a future for the prepared capture. The caller owns the capture from then on."""
+        path = self.playback_path(name)
+        with self.lock:
+            entry = self.entries.pop(name, None)
+        if entry is not None and entry[0] != path:
+            release_when_done(entry[1])
+            entry = None
+        return entry[1] if entry is not None else self.executor.submit(open_capture, path)
+
+    def close(self):
+        with self.lock:
+            for _, future in self.entries.values():
+                release_when_done(future)
+            self.entries.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,255 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from medisort.mover import STATE_DIR
+from medisort.scan import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+
+CATALOG_NAME = "catalog.sqlite3"
+PENDING = "pending"
+DECIDED = "decided"
+METADATA_BATCH = 100
+
+
+def media_kind(name):
+    lower = name.lower()
+    if lower.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    if lower.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return None
+
+
+def is_under(rel_dir, dirs):
+    """True if rel_dir is one of dirs or lies inside one of them."""
+    while rel_dir:
+        if rel_dir in dirs:
+            return True
+        rel_dir = os.path.dirname(rel_dir)
+    return False
+
+
+def read_dimensions(path, kind):
+    """Returns (width, height, duration) from the file header, or zeros if it cannot be read."""
+    if kind == "image":
+        from PIL import Image
+
+        from medisort.raw import open_image
+        try:
+            with open_image(path) as img:
+                return img.width, img.height, None
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return 0, 0, None
+
+    import cv2
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return 0, 0, None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        duration = frames / fps if fps > 0 and frames > 0 else None
+        return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), duration
+    finally:
+        cap.release()
+
+
+class Catalog:
+    """Per-folder SQLite record of every media file, its metadata and whether it has been sorted.
+
+    Each file gets a random position when it is first seen, so the shuffled order survives
+    between sessions. Directories are only listed again when their mtime changes.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        path = os.path.join(folder_path, STATE_DIR, CATALOG_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.closed = False
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, dir TEXT NOT NULL, kind TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " width INTEGER, height INTEGER, duration REAL,"
+            " state TEXT NOT NULL, tier TEXT, decided_at REAL, position REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_pending ON files (kind, state, position)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+        # mtime_ns is NULL for directories that have been seen but never listed
+        self.conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)")
+        self.conn.commit()
+
+    def iter_pending(self, kind, recursive=False, skip_dirs=()):
+        """Yields unsorted files of kind: new ones as the rescan finds them, then the rest in stored order."""
+        fresh = set()
+        try:
+            for name, name_kind in self.rescan(recursive, skip_dirs):
+                if name_kind == kind:
+                    fresh.add(name)
+                    yield name
+            for name in self.pending(kind, recursive, skip_dirs):
+                if name not in fresh:
+                    yield name
+        except sqlite3.Error as e:
+            raise OSError(f"Catalog error: {e}")
+        threading.Thread(target=self.fill_metadata, args=(kind,), daemon=True).start()
+
+    def rescan(self, recursive=False, skip_dirs=()):
+        """Brings the catalog up to date, listing only directories whose mtime changed.
+
+        Yields (path, kind) for each newly found file, a directory at a time, in stored order.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            rows = self.conn.execute("SELECT path, parent, mtime_ns FROM dirs").fetchall()
+        known_dirs = {path: mtime_ns for path, parent, mtime_ns in rows}
+        children = {}
+        for path, parent, _ in rows:
+            if parent is not None:
+                children.setdefault(parent, []).append(path)
+
+        seen = set()
+        pending_dirs = [""]
+        while pending_dirs and not self.closed:
+            rel_dir = pending_dirs.pop()
+            seen.add(rel_dir)
+            try:
+                mtime_ns = os.stat(os.path.join(self.folder_path, rel_dir)).st_mtime_ns
+                if known_dirs.get(rel_dir) == mtime_ns:
+                    subdirs = children.get(rel_dir, [])
+                else:
+                    subdirs, added = self._relist(rel_dir, mtime_ns)
+                    yield from added
+            except OSError:
+                if not rel_dir:
+                    raise
+                continue
+            if recursive:
+                pending_dirs.extend(d for d in subdirs if d not in skip_dirs)
+
+        gone = [d for d in known_dirs if d not in seen and not os.path.isdir(os.path.join(self.folder_path, d))]
+        if gone:
+            with self.lock:
+                if self.closed:
+                    return
+                self.conn.executemany("DELETE FROM dirs WHERE path = ?", [(d,) for d in gone])
+                self.conn.executemany("DELETE FROM files WHERE dir = ? AND state = ?", [(d, PENDING) for d in gone])
+                self.conn.commit()
+
+    def pending(self, kind, recursive=False, skip_dirs=()):
+        """Returns unsorted files of kind in their stored order."""
+        with self.lock:
+            if self.closed:
+                return []
+            rows = self.conn.execute(
+                "SELECT path, dir FROM files WHERE kind = ? AND state = ? ORDER BY position", (kind, PENDING)
+            ).fetchall()
+        return [path for path, rel_dir in rows if (recursive or not rel_dir) and not is_under(rel_dir, skip_dirs)]
+
+    def mark_decided(self, names, tier):
+        now = time.time()
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.conn.executemany("UPDATE files SET state = ?, tier = ?, decided_at = ? WHERE path = ?",
+                                      [(DECIDED, tier, now, name) for name in names])
+                self.conn.commit()
+            except sqlite3.Error:
+                # The journal is the record that matters; the catalog only speeds up the next session
+                self.conn.rollback()
+
+    def fill_metadata(self, kind):
+        """Reads dimensions (and durations for videos) for pending files that do not have them yet."""
+        while not self.closed:
+            with self.lock:
+                if self.closed:
+                    return
+                names = [row[0] for row in self.conn.execute(
+                    "SELECT path FROM files WHERE kind = ? AND state = ? AND width IS NULL LIMIT ?",
+                    (kind, PENDING, METADATA_BATCH))]
+            if not names:
+                return
+            values = []
+            for name in names:
+                if self.closed:
+                    return
+                width, height, duration = read_dimensions(os.path.join(self.folder_path, name), kind)
+                values.append((width, height, duration, name))
+            with self.lock:
+                if self.closed:
+                    return
+                try:
+                    self.conn.executemany("UPDATE files SET width = ?, height = ?, duration = ? WHERE path = ?", values)
+                    self.conn.commit()
+                except sqlite3.Error:
+                    self.conn.rollback()
+                    return
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.conn.close()
+
+    def _relist(self, rel_dir, mtime_ns):
+        """Lists one changed directory, stat'ing only entries the catalog has not seen as pending."""
+        with self.lock:
+            if self.closed:
+                return [], []
+            existing = dict(self.conn.execute("SELECT path, state FROM files WHERE dir = ?", (rel_dir,)).fetchall())
+
+        subdirs, found, added = [], set(), []
+        with os.scandir(os.path.join(self.folder_path, rel_dir)) as it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            subdirs.append(rel_path)
+                        continue
+                    kind = media_kind(entry.name)
+                    if kind is None or not entry.is_file():
+                        continue
+                    found.add(rel_path)
+                    # A decided file that is back in the source folder (failed move, restored) is offered again
+                    if existing.get(rel_path) != PENDING:
+                        st = entry.stat()
+                        added.append((rel_path, rel_dir, kind, st.st_size, st.st_mtime_ns, PENDING, random.random()))
+                except OSError:
+                    continue
+
+        gone = [(path,) for path, state in existing.items() if path not in found and state == PENDING]
+        with self.lock:
+            if self.closed:
+                return [], []
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, kind, size, mtime_ns, state, position) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                added,
+            )
+            self.conn.executemany("DELETE FROM files WHERE path = ?", gone)
+            self.conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                              (rel_dir, os.path.dirname(rel_dir) if rel_dir else None, mtime_ns))
+            self.conn.executemany("INSERT OR IGNORE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+                                  [(d, rel_dir) for d in subdirs])
+            self.conn.commit()
+
+        added.sort(key=lambda row: row[-1])
+        return subdirs, [(row[0], row[2]) for row in added]
+
+
+def open_catalog(folder_path):
+    """Opens the folder's catalog. Returns (catalog, None), or (None, error) if it cannot be
+    opened (e.g. a read-only folder); sorting then goes on without resume."""
+    try:
+        return Catalog(folder_path), None
+    except (OSError, sqlite3.Error) as e:
+        return None, e
@@ -0,0 +1,278 @@
+import getpass
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from medisort.metrics import metrics
+from medisort.mover import STATE_DIR
+from medisort.scan import MediaQueue
+
+CLAIMS_NAME = "claims.sqlite3"
+CLAIMED = "claimed"
+DONE = "done"
+LEASE_SECONDS = 120
+# A decided file keeps its lease this long, so nobody takes it while the move is still queued;
+# if it is somehow still in the folder after that, it is offered again
+DONE_SECONDS = 3600
+BATCH_SIZE = 8
+CONTESTED_RETRY = 5.0
+MAX_RETRY = 500 # Stays under SQLite's limit on query parameters
+
+
+def operator_name():
+    """Identifies the person and machine, stable across sessions so each operator keeps one journal."""
+    try:
+        user = getpass.getuser()
+    except (OSError, KeyError):
+        user = "user"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{socket.gethostname()}-{user}")
+
+
+class ClaimTable:
+    """Leases on the files of a folder that several people sort at once, in a SQLite file inside it.
+
+    A file belongs to whoever holds an unexpired lease on it. Leases are taken a small batch at a
+    time inside BEGIN IMMEDIATE, renewed while the session runs and released when it ends; those
+    of a session that crashed simply expire and are taken over by the others.
+    """
+
+    def __init__(self, folder_path, lease_seconds=LEASE_SECONDS):
+        path = os.path.join(folder_path, STATE_DIR, CLAIMS_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{operator_name()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+        self.lock = threading.Lock()
+        self.closed = False
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        # A rollback journal rather than WAL: WAL relies on shared memory, which a network share cannot provide
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            " path TEXT PRIMARY KEY, owner TEXT NOT NULL, state TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS claims_owner ON claims (owner, state)")
+
+    def claim(self, names):
+        """Leases whichever of names are free or expired. Returns (claimed, held), held mapping names
+        another session is working on to their lease expiry. Files already decided are in neither."""
+        now = time.time()
+        with self.lock:
+            if self.closed:
+                return [], {}
+            with metrics.time("claim"):
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    placeholders = ",".join("?" * len(names))
+                    rows = {path: (owner, state, expires) for path, owner, state, expires in self.conn.execute(
+                        f"SELECT path, owner, state, expires FROM claims WHERE path IN ({placeholders})", names)}
+                    claimed, held = [], {}
+                    for name in names:
+                        row = rows.get(name)
+                        if row is None or row[2] < now or (row[0] == self.owner and row[1] == CLAIMED):
+                            claimed.append(name)
+                        elif row[1] == CLAIMED:
+                            held[name] = row[2]
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO claims (path, owner, state, expires) VALUES (?, ?, ?, ?)",
+                        [(name, self.owner, CLAIMED, now + self.lease_seconds) for name in claimed])
+                    self.conn.execute("COMMIT")
+                except sqlite3.Error:
+                    if self.conn.in_transaction:
+                        self.conn.execute("ROLLBACK")
+                    raise
+        metrics.count("files_claimed", len(claimed))
+        return claimed, held
+
+    def renew(self):
+        with self.lock:
+            if not self.closed:
+                self.conn.execute("UPDATE claims SET expires = ? WHERE owner = ? AND state = ?",
+                                  (time.time() + self.lease_seconds, self.owner, CLAIMED))
+
+    def complete(self, names):
+        """Marks names as decided, keeping everyone else off them while their moves run."""
+        with self.lock:
+            if not self.closed:
+                self.conn.executemany("UPDATE claims SET state = ?, expires = ? WHERE path = ? AND owner = ?",
+                                      [(DONE, time.time() + DONE_SECONDS, name, self.owner) for name in names])
+
+    def release(self, names=None):
+        """Gives up the leases on names (all undecided ones if None), so others can take them at once."""
+        with self.lock:
+            if self.closed:
+                return
+            if names is None:
+                self.conn.execute("DELETE FROM claims WHERE owner = ? AND state = ?", (self.owner, CLAIMED))
+            else:
+                self.conn.executemany("DELETE FROM claims WHERE path = ? AND owner = ? AND state = ?",
+                                      [(name, self.owner, CLAIMED) for name in names])
+
+    def close(self):
+        try:
+            self.release()
+            with self.lock:
+                # Rows for files that have long since been moved are of no use to anyone
+                self.conn.execute("DELETE FROM claims WHERE state = ? AND expires < ?", (DONE, time.time()))
+        except sqlite3.Error:
+            pass # Whatever is left expires on its own
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.conn.close()
+
+
+class ClaimQueue:
+    """MediaQueue counterpart for a folder shared with other operators.
+
+    Only hands out files this session holds a lease on, claiming a small batch ahead of the
+    sorter. The folder listing is shuffled per session, so operators work through it in
+    different orders and rarely contend for the same files. Files another session holds are
+    retried until that session decides them or its lease runs out.
+    """
+
+    def __init__(self, folder_path, source, exclude=(), batch_size=BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+        self.folder_path = folder_path
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.listing = MediaQueue(source, shuffle=True, exclude=exclude)
+
+        self.ready = deque()
+        self.contested = {} # Name -> lease expiry, for files another session is working on
+        self.completed = []
+        self.released = []
+        self.finished = False
+        self.error = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+        # Not a daemon: the leases should be handed back before the process exits
+        self.thread = threading.Thread(target=self._run, name="medisort-claims")
+        self.thread.start()
+
+    def pop(self):
+        """Returns the next claimed file, or None if none is ready yet."""
+        with self.lock:
+            name = self.ready.popleft() if self.ready else None
+            if len(self.ready) < self.batch_size:
+                self.wake.set()
+            return name
+
+    def peek(self, count):
+        with self.lock:
+            return list(self.ready)[:count]
+
+    def unpop(self, name):
+        """Puts a file this session still holds back at the front of the queue."""
+        with self.lock:
+            self.ready.appendleft(name)
+
+    def exhausted(self):
+        with self.lock:
+            return self.finished and not self.ready
+
+    def held_elsewhere(self):
+        with self.lock:
+            return len(self.contested)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ready) + len(self.contested) + len(self.listing)
+
+    def complete(self, names):
+        """Records that names were decided in this session."""
+        with self.lock:
+            self.completed.extend(names)
+        self.wake.set()
+
+    def release(self, names):
+        """Hands names back undecided, e.g. when they were skipped."""
+        with self.lock:
+            self.released.extend(names)
+        self.wake.set()
+
+    def close(self, wait=False):
+        """Stops claiming and hands the unused leases back. With wait, returns once that is done."""
+        self.closed = True
+        self.listing.close(wait)
+        self.wake.set()
+        if wait:
+            self.thread.join()
+
+    def _run(self):
+        claims = None
+        try:
+            claims = ClaimTable(self.folder_path, self.lease_seconds)
+            renewed = time.monotonic()
+            retried = 0.0
+            while not self.closed:
+                self._flush(claims)
+                if time.monotonic() - renewed > self.lease_seconds / 3:
+                    claims.renew()
+                    renewed = time.monotonic()
+                if self.contested and time.monotonic() - retried > CONTESTED_RETRY:
+                    self._retry_contested(claims)
+                    retried = time.monotonic()
+                self._refill(claims)
+                self.wake.wait(0.5)
+                self.wake.clear()
+            self._flush(claims)
+        except (OSError, sqlite3.Error) as e:
+            self.error = OSError(f"Claims database error: {e}")
+        finally:
+            if claims is not None:
+                claims.close()
+            with self.lock:
+                self.finished = True
+
+    def _flush(self, claims):
+        with self.lock:
+            completed, self.completed = self.completed, []
+            released, self.released = self.released, []
+        if completed:
+            claims.complete(completed)
+        if released:
+            claims.release(released)
+
+    def _refill(self, claims):
+        while not self.closed:
+            with self.lock:
+                if len(self.ready) >= self.batch_size:
+                    return
+            names = []
+            while len(names) < self.batch_size:
+                name = self.listing.pop()
+                if name is None:
+                    break
+                # A file moved by someone else since the listing was taken
+                if os.path.exists(os.path.join(self.folder_path, name)):
+                    names.append(name)
+            if not names:
+                if self.listing.exhausted():
+                    if self.listing.error:
+                        self.error = self.listing.error
+                    # Keeps running after this: leases on files still on screen must be renewed
+                    with self.lock:
+                        self.finished = not self.contested
+                return
+            claimed, held = claims.claim(names)
+            with self.lock:
+                self.ready.extend(claimed)
+                self.contested.update(held)
+
+    def _retry_contested(self, claims):
+        with self.lock:
+            names = list(self.contested)[:MAX_RETRY]
+        present = [name for name in names if os.path.exists(os.path.join(self.folder_path, name))]
+        claimed, held = claims.claim(present) if present else ([], {})
+        with self.lock:
+            for name in names:
+                self.contested.pop(name, None)
+            self.ready.extend(claimed)
+            self.contested.update(held)
@@ -0,0 +1,271 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from medisort.metrics import metrics
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+class DecisionError(Exception):
+    pass
+
+
+def load_decisions(path):
+    """Reads file -> tier decisions from a CSV file, a JSONL file or a sorter journal.
+
+    Later decisions for the same file replace earlier ones, as they would in the GUI, and
+    decisions a journal records as undone are dropped.
+    """
+    decisions = {}
+    files, latest = {}, {} # Journal move id -> file, file -> id of its latest decision
+    with open(path, encoding="utf-8", newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        if first.lstrip().startswith("{"):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise DecisionError(f"{path}:{number}: {e}")
+                if record.get("op") == "undone":
+                    name = files.get(record.get("id"))
+                    if name is not None and latest.get(name) == record["id"]:
+                        decisions.pop(name, None)
+                    continue
+                # Journals also hold done/failed records, which carry no decision
+                if "op" in record and record["op"] != "queued":
+                    continue
+                if "file" not in record or "tier" not in record:
+                    raise DecisionError(f"{path}:{number}: expected 'file' and 'tier' keys")
+                decisions[record["file"]] = record["tier"]
+                files[record.get("id")] = record["file"]
+                latest[record["file"]] = record.get("id")
+        else:
+            for number, row in enumerate(csv.reader(f), 1):
+                if not row or (number == 1 and [c.strip().lower() for c in row[:2]] == ["file", "tier"]):
+                    continue
+                if len(row) < 2:
+                    raise DecisionError(f"{path}:{number}: expected 'file,tier'")
+                decisions[row[0].strip()] = row[1].strip()
+
+    for name, tier in decisions.items():
+        for part in (name, tier):
+            normalized = os.path.normpath(part)
+            if not part or os.path.isabs(part) or normalized == ".." or normalized.startswith(".." + os.sep):
+                raise DecisionError(f"Refusing path outside the folder: {part}")
+    return decisions
+
+
+def plan(folder_path, decisions):
+    """Splits decisions into (to_move, already_done, problems)."""
+    to_move, already_done, problems = [], [], []
+    for name, tier in sorted(decisions.items()):
+        src = os.path.join(folder_path, name)
+        dst = os.path.join(folder_path, tier, name)
+        if os.path.exists(src) and not os.path.exists(dst):
+            to_move.append((name, tier))
+        elif not os.path.exists(src) and os.path.exists(dst):
+            already_done.append((name, tier))
+        elif os.path.exists(dst):
+            problems.append((name, tier, "destination already exists"))
+        else:
+            problems.append((name, tier, "file not found"))
+    return to_move, already_done, problems
+
+
+def report(message, quiet=False):
+    if not quiet:
+        print(message, file=sys.stderr)
+
+
+def wait_for_moves(mover, total, quiet):
+    """Blocks until the mover is idle, showing progress on a terminal."""
+    show = not quiet and sys.stderr.isatty()
+    while True:
+        pending, failed = mover.counts()
+        if show:
+            print(f"\rMoved {total - pending - failed}/{total}, failed {failed}", end="", file=sys.stderr)
+        if not pending:
+            break
+        time.sleep(0.25)
+    if show:
+        print(file=sys.stderr)
+
+
+def apply_decisions(mover, to_move, quiet):
+    started = time.monotonic()
+    failed_before = len(mover.failed)
+    mover.submit_batch(to_move)
+    wait_for_moves(mover, len(to_move), quiet)
+
+    failed = mover.failed[failed_before:]
+    elapsed = time.monotonic() - started
+    report(f"Moved {len(to_move) - len(failed)} file(s) in {elapsed:.1f}s, {len(failed)} failed", quiet)
+    for name, error in failed:
+        print(f"FAILED {name}: {error}", file=sys.stderr)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_apply(args):
+    from medisort.mover import MoveExecutor # Kept out of the GUI start-up path
+    try:
+        decisions = load_decisions(args.decisions)
+    except (OSError, DecisionError) as e:
+        print(f"medisort: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not os.path.isdir(args.folder):
+        print(f"medisort: not a folder: {args.folder}", file=sys.stderr)
+        return EXIT_USAGE
+
+    mover = None
+    if not (args.verify or args.dry_run):
+        try:
+            mover = MoveExecutor(args.folder, workers=args.workers, verify=args.checksum)
+        except OSError as e: # JournalBusy included: another sorter is working from the journal
+            print(f"medisort: {e}", file=sys.stderr)
+            return EXIT_FAILED
+        # Let moves resumed from an interrupted run land before planning around them
+        wait_for_moves(mover, mover.counts()[0], args.quiet)
+
+    to_move, already_done, problems = plan(args.folder, decisions)
+
+    if args.verify:
+        for name, tier, reason in problems:
+            print(f"MISSING {name} -> {tier}: {reason}")
+        for name, tier in to_move:
+            print(f"PENDING {name} -> {tier}")
+        report(f"{len(already_done)} of {len(decisions)} decision(s) applied", args.quiet)
+        return EXIT_OK if len(already_done) == len(decisions) else EXIT_FAILED
+
+    for name, tier, reason in problems:
+        print(f"SKIP {name} -> {tier}: {reason}", file=sys.stderr)
+
+    if args.dry_run:
+        for name, tier in to_move:
+            print(f"MOVE {name} -> {tier}")
+        report(f"{len(to_move)} to move, {len(already_done)} already applied, {len(problems)} problem(s)", args.quiet)
+        return EXIT_FAILED if problems else EXIT_OK
+
+    status = apply_decisions(mover, to_move, args.quiet)
+    mover.close(wait=True)
+    return EXIT_FAILED if problems else status
+
+
+def cmd_rules(args):
+    from medisort.mover import STATE_DIR, MoveExecutor
+    from medisort.rules import RuleError, RuleRouter, load_rules
+    from medisort.scan import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, iter_media
+    try:
+        rules = load_rules(args.rules)
+    except RuleError as e:
+        print(f"medisort: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    if not os.path.isdir(args.folder):
+        print(f"medisort: not a folder: {args.folder}", file=sys.stderr)
+        return EXIT_USAGE
+
+    mover = None
+    if not args.dry_run:
+        try:
+            mover = MoveExecutor(args.folder, workers=args.workers)
+        except OSError as e: # JournalBusy included
+            print(f"medisort: {e}", file=sys.stderr)
+            return EXIT_FAILED
+        wait_for_moves(mover, mover.counts()[0], args.quiet)
+    router = RuleRouter(args.folder, rules, mover, workers=args.jobs)
+    skip_dirs = router.tiers() | {STATE_DIR}
+    source = iter_media(args.folder, IMAGE_EXTENSIONS + VIDEO_EXTENSIONS, recursive=args.recursive, skip_dirs=skip_dirs)
+    for _ in router.route(source):
+        pass # Unmatched files stay where they are, for the GUI
+
+    failed = []
+    if mover is not None:
+        wait_for_moves(mover, router.routed, args.quiet)
+        failed = list(mover.failed)
+        mover.close(wait=True)
+    for name, tier in router.planned:
+        print(f"MOVE {name} -> {tier}")
+    for name, error in failed:
+        print(f"FAILED {name}: {error}", file=sys.stderr)
+
+    summary = router.report()
+    for rule in summary["rules"]:
+        print(f"{rule['hits']:>8}  {rule['name']} -> {rule['tier']}")
+    report(f"{summary['examined']} file(s) examined in {summary['seconds']}s: {summary['routed']} routed, "
+           f"{summary['unmatched']} left to sort, {summary['unreadable']} unreadable", args.quiet)
+    try:
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+        elif mover is not None:
+            router.write_report()
+    except OSError as e:
+        print(f"medisort: could not write the rules report: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_gui(args):
+    if getattr(args, "metrics", None) or getattr(args, "metrics_overlay", False):
+        export_path = args.metrics if args.metrics not in (None, "1") else None
+        metrics.configure(export_path=export_path, overlay=args.metrics_overlay)
+    started = time.perf_counter()
+    from medisort.medisort import main as gui_main
+    gui_main(startup_report=getattr(args, "startup_report", False), import_seconds=time.perf_counter() - started)
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="medisort", description="Sort images and videos into tier folders.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    gui = subparsers.add_parser("gui", help="open the sorting window (the default)")
+    gui.add_argument("--metrics", nargs="?", const="1", metavar="PATH",
+                     help="record per-stage timings; written to PATH (.json or .csv) or .medisort/ when the session ends")
+    gui.add_argument("--metrics-overlay", action="store_true", help="show live timings in the sorter window")
+    gui.add_argument("--startup-report", action="store_true", help="print how long the launcher took to appear")
+    gui.set_defaults(func=cmd_gui)
+
+    apply = subparsers.add_parser("apply", help="apply a decisions file to a folder without the GUI")
+    apply.add_argument("decisions", help="CSV (file,tier), JSONL ({\"file\": ..., \"tier\": ...}) or a .medisort/journal.jsonl")
+    apply.add_argument("folder", help="source folder the file names are relative to")
+    mode = apply.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="only print what would be moved")
+    mode.add_argument("--verify", action="store_true", help="check that every decision has been applied")
+    apply.add_argument("--workers", type=int, default=4, help="parallel moves (default: 4)")
+    apply.add_argument("--checksum", action="store_true",
+                       help="verify copies to another filesystem against a checksum before deleting the source")
+    apply.add_argument("-q", "--quiet", action="store_true", help="only report errors")
+    apply.set_defaults(func=cmd_apply)
+
+    rules = subparsers.add_parser("rules", help="move the files that routing rules decide, leaving the rest to sort")
+    rules.add_argument("rules", help="JSON rules file")
+    rules.add_argument("folder", help="source folder")
+    rules.add_argument("--dry-run", action="store_true", help="only print what would be moved")
+    rules.add_argument("-r", "--recursive", action="store_true", help="include subfolders")
+    rules.add_argument("--jobs", type=int, help="worker processes reading headers (default: up to 4)")
+    rules.add_argument("--workers", type=int, default=4, help="parallel moves (default: 4)")
+    rules.add_argument("--report", metavar="PATH", help="write the per-rule hit report as JSON to PATH")
+    rules.add_argument("-q", "--quiet", action="store_true", help="only report errors")
+    rules.set_defaults(func=cmd_rules)
+    return parser
+
+
+def main(argv=None):
+    """Console entry point. Exit status: 0 success, 1 failed moves or checks, 2 bad input."""
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        return cmd_gui(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
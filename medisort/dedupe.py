@@ -0,0 +1,174 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from medisort.raw import open_image
+
+HASH_SIZE = 32 # Side of the grayscale thumbnail the DCT is taken over
+CHUNK_SIZE = 64 # Images per worker task
+LEADER_BLOCK = 256 # Images compared against the leaders of their bucket at once
+SMALL_BUCKET = 32 # Buckets up to this size are simply compared pair by pair
+
+
+def dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+DCT = dct_matrix(HASH_SIZE).astype(np.float32)
+BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def pack_bits(bits):
+    """Packs an (N, 64) boolean array into N uint64 hashes."""
+    return (bits.astype(np.uint64) * BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def load_gray(path):
+    with open_image(path) as img:
+        # Let JPEG decode straight to a tiny grayscale image
+        img.draft("L", (HASH_SIZE * 2, HASH_SIZE * 2))
+        return np.asarray(img.convert("L").resize((HASH_SIZE, HASH_SIZE), Image.BILINEAR), dtype=np.float32)
+
+
+def hash_chunk(paths):
+    """Worker: returns (phashes, dhashes, ok) for a chunk of image paths, computed as one batch."""
+    thumbs = np.zeros((len(paths), HASH_SIZE, HASH_SIZE), np.float32)
+    ok = np.zeros(len(paths), bool)
+    for i, path in enumerate(paths):
+        try:
+            thumbs[i] = load_gray(path)
+            ok[i] = True
+        except (OSError, ValueError, Image.DecompressionBombError):
+            continue
+
+    # pHash: low-frequency 8x8 DCT block compared against its median (DC term excluded)
+    coefficients = (DCT @ thumbs @ DCT.T)[:, :8, :8].reshape(len(paths), 64)
+    medians = np.median(coefficients[:, 1:], axis=1)
+    phashes = pack_bits(coefficients > medians[:, None])
+
+    # dHash: horizontal gradient signs on a 9x8 grid
+    grid = thumbs.reshape(len(paths), 8, 4, HASH_SIZE).mean(axis=2)
+    grid = grid[:, :, np.linspace(0, HASH_SIZE - 1, 9).astype(int)]
+    dhashes = pack_bits((grid[:, :, 1:] > grid[:, :, :-1]).reshape(len(paths), 64))
+    return phashes, dhashes, ok
+
+
+def compute_hashes(folder_path, names, workers=None):
+    """Hashes every image across a process pool. Returns (phashes, dhashes, ok) aligned with names."""
+    paths = [os.path.join(folder_path, name) for name in names]
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    phashes, dhashes, ok = [], [], []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for p, d, o in executor.map(hash_chunk, chunks):
+            phashes.append(p)
+            dhashes.append(d)
+            ok.append(o)
+    if not chunks:
+        return np.zeros(0, np.uint64), np.zeros(0, np.uint64), np.zeros(0, bool)
+    return np.concatenate(phashes), np.concatenate(dhashes), np.concatenate(ok)
+
+
+def popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(values.shape + (8,)), axis=-1).sum(axis=-1)
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes.
+
+    The hash is split into max_distance + 1 chunks. Two hashes within max_distance bits
+    of each other must agree exactly on at least one chunk, so only items sharing a chunk
+    value ever need to be compared.
+    """
+
+    def __init__(self, hashes, max_distance):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        bounds = np.linspace(0, 64, chunks + 1).astype(int)
+        self.chunks = list(zip(bounds[:-1], bounds[1:]))
+
+    def buckets(self):
+        """Yields the index array of each group of two or more items sharing a chunk value."""
+        for start, end in self.chunks:
+            mask = np.uint64((1 << (end - start)) - 1)
+            keys = (self.hashes >> np.uint64(start)) & mask
+            order = np.argsort(keys, kind="stable")
+            boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+            for group in np.split(order, boundaries):
+                if len(group) > 1:
+                    yield group
+
+
+def find_parent(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def cluster(names, phashes, dhashes, ok, max_distance=4, dhash_distance=10):
+    """Groups near-identical images. Returns a list of name lists, each sorted, largest group first.
+
+    Candidates come from the pHash index; a pair is only merged if its dHash agrees too. A large
+    index bucket is taken in blocks compared against a growing set of leaders: an image within
+    half the pHash distance of a leader is linked through the leaders alone, so a long run of
+    near-identical frames costs linear rather than quadratic time.
+    """
+    parents = list(range(len(names)))
+
+    def union(x, y):
+        root_x, root_y = find_parent(parents, x), find_parent(parents, y)
+        if root_x != root_y:
+            parents[root_y] = root_x
+
+    def compare(items, others):
+        """Returns the pHash distances of items to others, and which pairs to merge."""
+        near = popcount(phashes[items][:, None] ^ phashes[others][None, :])
+        agree = popcount(dhashes[items][:, None] ^ dhashes[others][None, :]) <= dhash_distance
+        return near, (near <= max_distance) & agree
+
+    valid = np.flatnonzero(ok)
+    index = HammingIndex(phashes[valid], max_distance)
+    for group in index.buckets():
+        members = valid[group]
+        if len(members) <= SMALL_BUCKET:
+            _, matches = compare(members, members)
+            i, j = np.nonzero(matches)
+            keep = i < j
+            for x, y in zip(members[i[keep]].tolist(), members[j[keep]].tolist()):
+                union(x, y)
+            continue
+        leaders = members[:0]
+        for offset in range(0, len(members), LEADER_BLOCK):
+            block = members[offset:offset + LEADER_BLOCK]
+            near, matches = compare(block, leaders)
+            # Leaders already in one group need only one link each
+            roots = np.array([find_parent(parents, x) for x in leaders.tolist()], np.int64)
+            rows, columns = np.nonzero(matches)
+            for i, root in set(zip(rows.tolist(), roots[columns].tolist())):
+                union(root, int(block[i]))
+            # The rest are linked among themselves and lead from then on
+            fresh = block[~(matches & (near <= max_distance // 2)).any(axis=1)]
+            _, matches = compare(fresh, fresh)
+            labels = np.arange(len(fresh))
+            while True:
+                spread = np.where(matches, labels[None, :], len(fresh)).min(axis=1, initial=len(fresh))
+                spread = np.minimum(labels, spread)
+                if np.array_equal(spread, labels):
+                    break
+                labels = spread
+            for i in np.flatnonzero(labels != np.arange(len(fresh))).tolist():
+                union(int(fresh[labels[i]]), int(fresh[i]))
+            leaders = np.concatenate([leaders, fresh])
+
+    groups = {}
+    for i, name in enumerate(names):
+        groups.setdefault(find_parent(parents, i), []).append(name)
+    return sorted((sorted(group) for group in groups.values()), key=len, reverse=True)
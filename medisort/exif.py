@@ -0,0 +1,112 @@
+import struct
+
+# Byte sizes of the TIFF field types
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 6: "b", 8: "h", 9: "i", 11: "f", 12: "d", 13: "I"}
+
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+MAX_IFDS = 64
+MAX_ENTRIES = 4096
+
+
+class TiffReader:
+    """Reads IFDs from a TIFF structure (a TIFF file or an EXIF block) without decoding any pixels."""
+
+    def __init__(self, fp, base=0):
+        self.fp = fp
+        self.base = base
+
+        fp.seek(base)
+        header = fp.read(8)
+        if header[:2] == b"II":
+            self.endian = "<"
+        elif header[:2] == b"MM":
+            self.endian = ">"
+        else:
+            raise ValueError("Not a TIFF structure")
+        self.first_ifd = struct.unpack(self.endian + "I", header[4:8])[0]
+
+    def read_ifd(self, offset):
+        """Returns (tags, next_offset) for the IFD at offset."""
+        entries, next_offset = self.read_entries(offset)
+        tags = {}
+        for tag, (field_type, value_count, raw) in entries.items():
+            try:
+                tags[tag] = self._decode_value(field_type, value_count, raw)
+            except (ValueError, struct.error):
+                continue
+        return tags, next_offset
+
+    def read_entries(self, offset):
+        """Returns ({tag: (field_type, count, value_bytes)}, next_offset) with the values left undecoded."""
+        self.fp.seek(self.base + offset)
+        count_data = self.fp.read(2)
+        if len(count_data) < 2:
+            raise ValueError("Truncated IFD")
+        count = struct.unpack(self.endian + "H", count_data)[0]
+        if count > MAX_ENTRIES:
+            raise ValueError("Corrupt IFD")
+
+        data = self.fp.read(count * 12 + 4)
+        if len(data) < count * 12 + 4:
+            raise ValueError("Truncated IFD")
+
+        fields = []
+        for i in range(count):
+            fields.append(struct.unpack(self.endian + "HHI4s", data[i * 12:i * 12 + 12]))
+        next_offset = struct.unpack(self.endian + "I", data[-4:])[0]
+
+        entries = {}
+        for tag, field_type, value_count, raw in fields:
+            try:
+                entries[tag] = (field_type, value_count, self._value_bytes(field_type, value_count, raw))
+            except (ValueError, struct.error):
+                continue
+        return entries, next_offset
+
+    def ifds(self):
+        """Yields the tags of every IFD in the main chain."""
+        seen = set()
+        offset = self.first_ifd
+        while offset and offset not in seen and len(seen) < MAX_IFDS:
+            seen.add(offset)
+            tags, offset = self.read_ifd(offset)
+            yield tags
+
+    def _value_bytes(self, field_type, value_count, raw):
+        size = TYPE_SIZES.get(field_type)
+        if size is None:
+            raise ValueError("Unknown field type")
+        length = size * value_count
+        if length <= 4:
+            return raw[:length]
+        offset = struct.unpack(self.endian + "I", raw)[0]
+        self.fp.seek(self.base + offset)
+        raw = self.fp.read(length)
+        if len(raw) < length:
+            raise ValueError("Truncated value")
+        return raw
+
+    def _decode_value(self, field_type, value_count, raw):
+        if field_type == 2:
+            return raw.split(b"\0", 1)[0].decode("latin-1")
+        if field_type == 7:
+            return raw
+        if field_type in (5, 10):
+            fmt = "I" if field_type == 5 else "i"
+            values = struct.unpack(self.endian + fmt * (value_count * 2), raw)
+            return tuple(zip(values[::2], values[1::2]))
+        return struct.unpack(self.endian + TYPE_FORMATS[field_type] * value_count, raw)
+
+
+def embedded_jpegs(reader, ifds):
+    """Returns (absolute_offset, length) of every JPEG referenced by the given IFDs."""
+    found = []
+    for tags in ifds:
+        offset = tags.get(JPEG_INTERCHANGE_FORMAT)
+        length = tags.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+        if offset and length and length[0] > 0:
+            found.append((reader.base + offset[0], length[0]))
+    return found
@@ -0,0 +1,55 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class FrameRing:
+    """Preallocated display-sized RGB frames handed between the decode thread and the Tk thread.
+
+    The decode thread acquires a free slot, writes into it in place and publishes it.
+    The Tk thread takes the newest published slot, blits it and releases it again,
+    so steady-state playback allocates no frame buffers at all.
+    """
+
+    def __init__(self, size, slots=3):
+        width, height = size
+        self.size = size
+        self.frames = [np.empty((height, width, 3), np.uint8) for _ in range(slots)]
+        # Scratch buffer for the resized BGR frame before colour conversion
+        self.scratch = np.empty((height, width, 3), np.uint8)
+
+        self.lock = threading.Lock()
+        self.free = deque(range(slots))
+        self.ready = deque()
+
+    def acquire(self):
+        """Returns (slot, reclaimed). reclaimed is True if an unshown frame had to be overwritten."""
+        with self.lock:
+            if self.free:
+                return self.free.popleft(), False
+            return self.ready.popleft(), True
+
+    def publish(self, slot):
+        with self.lock:
+            self.ready.append(slot)
+
+    def take_latest(self):
+        """Returns (slot, skipped) for the newest published frame, or (None, 0) if there is none."""
+        with self.lock:
+            if not self.ready:
+                return None, 0
+            slot = self.ready.pop()
+            skipped = len(self.ready)
+            self.free.extend(self.ready)
+            self.ready.clear()
+            return slot, skipped
+
+    def release(self, slot):
+        with self.lock:
+            self.free.append(slot)
+
+    def clear(self):
+        with self.lock:
+            self.free.extend(self.ready)
+            self.ready.clear()
@@ -0,0 +1,223 @@
+import os
+import tkinter as tk
+from tkinter import messagebox
+from PIL import ImageTk
+from medisort.metrics import metrics
+from medisort.prefetch import ImagePrefetcher
+from medisort.preview import placeholder_preview
+from medisort.session import SortSession
+
+THUMB_SIZE = (160, 120)
+CELL_COLOR = "#f8f9fa"
+SELECTED_COLOR = "#28a745"
+RENDER_POLL_MS = 30
+
+
+class GridSorter:
+    """Shows a page of thumbnails at once and sends the selected ones to a tier as one batch."""
+
+    def __init__(self, parent_window, grid_frame, folder_path, tiers, on_close_callback,
+                 columns=6, rows=4, thumb_size=THUMB_SIZE, workers=None, preview_cache=None,
+                 status_label=None, recursive=False, shared=False, rules=None):
+        self.parent_window = parent_window
+        self.grid_frame = grid_frame
+        self.folder_path = folder_path
+        self.tiers = tiers
+        self.on_close_callback = on_close_callback
+        self.columns = columns
+        self.page_size = columns * rows
+        self.thumb_size = thumb_size
+        self.status_label = status_label
+        self.recursive = recursive
+
+        self.image_files = None
+        self.page = [] # Names on screen, in cell order
+        self.selected = set()
+        self.anchor = None # Last clicked cell, for Shift+click ranges
+        self.thumbs = {} # Name -> future of its thumbnail
+        self.photos = {} # Name -> PhotoImage once its thumbnail is on screen
+        self.status_note = ""
+        self.filling = False
+        self.rendering = False
+
+        self.session = SortSession(folder_path, tiers, "image", recursive=recursive, shared=shared, rules=rules)
+        self.decisions = self.session.decisions
+        # The current page is taken out of the prefetcher, so it only ever holds the next page
+        self.prefetcher = ImagePrefetcher(folder_path, depth=self.page_size, size=thumb_size,
+                                          workers=workers or max(2, os.cpu_count() or 1), cache=preview_cache)
+
+        self.blank = tk.PhotoImage(width=thumb_size[0], height=thumb_size[1])
+        self.cells = []
+        for i in range(self.page_size):
+            cell = tk.Label(grid_frame, image=self.blank, compound="top", bg=CELL_COLOR, padx=3, pady=3,
+                            font=("Segoe UI", 8), cursor="hand2")
+            cell.grid(row=i // columns, column=i % columns, padx=2, pady=2)
+            cell.bind("<Button-1>", lambda e, i=i: self.toggle(i))
+            cell.bind("<Shift-Button-1>", lambda e, i=i: self.select_range(i))
+            self.cells.append(cell)
+
+        self.parent_window.bind("<Control-a>", lambda e: self.select_all())
+        self.parent_window.bind("<Escape>", lambda e: self.clear_selection())
+        self.parent_window.protocol("WM_DELETE_WINDOW", self.on_window_close)
+
+    def start(self):
+        # Claims run a page ahead, so the prefetcher always has the next page to decode
+        self.image_files = self.session.open_queue(batch_size=self.page_size)
+        self.update_move_status()
+        self.fill_page()
+
+    def on_tier_select(self, tier):
+        chosen = [name for name in self.page if name in self.selected]
+        if not chosen:
+            self.status_note = "Select thumbnails first (click, Shift+click, Ctrl+A)"
+            return
+        metrics.count("decisions", len(chosen))
+        self.status_note = ""
+        self.decisions.add(chosen[0], tier, chosen)
+        self.remove(chosen)
+        self.fill_page()
+
+    def next_page(self):
+        """Leaves everything on the current page where it is and shows the next one."""
+        if self.page:
+            self.decisions.add(self.page[0], None, list(self.page))
+        self.remove(list(self.page))
+        self.fill_page()
+
+    def undo(self):
+        """Brings back the files of the last decision or skipped page, selected if they had been decided."""
+        decision = self.decisions.undo()
+        if decision is None:
+            return
+        metrics.count("undos")
+        _, tier, names = decision
+        page = names + [name for name in self.page if name not in names]
+        overflow = page[self.page_size:]
+        # Whatever no longer fits on the page goes back to the front of the queue, in order
+        self.remove(overflow)
+        for name in reversed(overflow):
+            self.image_files.unpop(name)
+        self.page = page[:self.page_size]
+        for name in names:
+            self.thumbs[name] = self.prefetcher.take(name)
+        self.selected = set(names) if tier is not None else set()
+        self.anchor = None
+        self.render()
+
+    def toggle(self, index):
+        if index >= len(self.page):
+            return
+        name = self.page[index]
+        if name in self.selected:
+            self.selected.discard(name)
+        else:
+            self.selected.add(name)
+        self.anchor = index
+        self.render()
+
+    def select_range(self, index):
+        if index >= len(self.page):
+            return
+        start = index if self.anchor is None else self.anchor
+        low, high = min(start, index), max(start, index)
+        self.selected.update(self.page[low:high + 1])
+        self.render()
+
+    def select_all(self):
+        self.selected = set(self.page)
+        self.render()
+
+    def clear_selection(self):
+        self.selected.clear()
+        self.anchor = None
+        self.render()
+
+    def remove(self, names):
+        names = set(names)
+        self.page = [name for name in self.page if name not in names]
+        self.selected -= names
+        self.anchor = None
+        for name in names:
+            future = self.thumbs.pop(name, None)
+            if future is not None:
+                future.cancel()
+            self.photos.pop(name, None)
+
+    def fill_page(self):
+        while len(self.page) < self.page_size:
+            name = self.image_files.pop()
+            if name is None:
+                break
+            self.page.append(name)
+            self.thumbs[name] = self.prefetcher.take(name)
+
+        if not self.page and self.image_files.exhausted():
+            if self.image_files.error:
+                messagebox.showerror("Folder Error", f"Could not read folder: {self.image_files.error}")
+            else:
+                messagebox.showinfo("Done", "All images have been sorted!")
+            self.on_window_close()
+            return
+
+        if len(self.page) < self.page_size and not self.image_files.exhausted() and not self.filling:
+            # Enumeration has not caught up yet; top the page up as files are found
+            self.filling = True
+            self.parent_window.after(50, self.poll_page)
+
+        self.prefetcher.schedule(self.image_files.peek(self.page_size))
+        self.render()
+
+    def poll_page(self):
+        self.filling = False
+        if self.parent_window.winfo_exists():
+            self.fill_page()
+
+    def render(self):
+        """Updates every cell without blocking; cells whose thumbnail is still decoding are revisited."""
+        waiting = False
+        for i, cell in enumerate(self.cells):
+            if i >= len(self.page):
+                cell.config(image=self.blank, text="", bg=CELL_COLOR)
+                continue
+            name = self.page[i]
+            photo = self.photos.get(name)
+            if photo is None:
+                future = self.thumbs[name]
+                if future.done():
+                    try:
+                        img = future.result()
+                    except Exception:
+                        img = placeholder_preview("No preview", self.thumb_size)
+                    with metrics.time("photoimage"):
+                        photo = self.photos[name] = ImageTk.PhotoImage(img)
+                else:
+                    waiting = True
+            label = os.path.basename(name)
+            if len(label) > 22:
+                label = label[:10] + "…" + label[-10:]
+            cell.config(image=photo or self.blank, text=label,
+                        bg=SELECTED_COLOR if name in self.selected else CELL_COLOR)
+
+        metrics.time_until_idle(self.grid_frame, "render")
+        if waiting and not self.rendering:
+            self.rendering = True
+            self.parent_window.after(RENDER_POLL_MS, self.poll_render)
+
+    def poll_render(self):
+        self.rendering = False
+        if self.parent_window.winfo_exists():
+            self.render()
+
+    def update_move_status(self):
+        if not self.parent_window.winfo_exists():
+            return
+        status = self.session.status(f"Selected: {len(self.selected)} of {len(self.page)}", self.status_note)
+        if self.status_label is not None:
+            self.status_label.config(text=status)
+        self.parent_window.after(250, self.update_move_status)
+
+    def on_window_close(self):
+        self.session.close(self.parent_window, self.status_label)
+        self.prefetcher.close()
+        self.parent_window.destroy()
+        self.on_close_callback()
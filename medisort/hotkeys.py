@@ -0,0 +1,93 @@
+import time
+from collections import deque
+from tkinter import TclError
+
+DEFAULT_TIER_KEYS = "1 2 3 4 5 6 7 8 9"
+DEFAULT_UNDO_KEY = "BackSpace"
+DEFAULT_SKIP_KEY = "space"
+ZOOM_KEY = "z"
+UNDO_DEPTH = 10
+UNDO_SECONDS = 15
+
+# Queued in place of a tier when the undo key is pressed; a tier of None means skip
+UNDO = object()
+
+
+def parse_keys(text):
+    """Splits a list of Tk key names such as "1 2 3" or "a, s, d"."""
+    return text.replace(",", " ").split()
+
+
+def bind_hotkeys(window, tiers, tier_keys, on_tier, undo_key=None, on_undo=None, skip_key=None, on_skip=None,
+                 on_zoom=None):
+    """Binds a key per tier (tier_keys in tier order) plus the undo, skip and zoom keys on window.
+
+    Returns ({tier: key} for the tier keys that were bound, [key names Tk does not know]).
+    """
+    bound, unknown = {}, []
+
+    def bind(key, func):
+        try:
+            window.bind(f"<KeyPress-{key}>", lambda e: func())
+            return True
+        except TclError:
+            unknown.append(key)
+            return False
+
+    for tier, key in zip(tiers, tier_keys):
+        if bind(key, lambda t=tier: on_tier(t)):
+            bound[tier] = key
+    if undo_key and on_undo is not None:
+        bind(undo_key, on_undo)
+    if skip_key and on_skip is not None:
+        bind(skip_key, on_skip)
+    if on_zoom is not None and ZOOM_KEY not in list(bound.values()) + [undo_key, skip_key]:
+        bind(ZOOM_KEY, on_zoom)
+    return bound, unknown
+
+
+class DecisionLog:
+    """Recent decisions, held back for a moment so they can still be undone.
+
+    record(item, tier, names), if given, is called as each decision is made, so it can be
+    journaled at once; whatever it returns is passed on to commit(item, tier, names, ticket) or
+    revert(ticket). A decision is committed once depth newer ones have been made or it is older
+    than hold_seconds; until then undo() takes it back and hands its ticket to revert.
+    """
+
+    def __init__(self, commit, depth=UNDO_DEPTH, hold_seconds=UNDO_SECONDS, record=None, revert=None):
+        self.commit = commit
+        self.depth = depth
+        self.hold_seconds = hold_seconds
+        self.record = record
+        self.revert = revert
+        self.history = deque()
+
+    def add(self, item, tier, names=None):
+        names = names or [item]
+        ticket = self.record(item, tier, names) if self.record is not None else None
+        self.history.append((item, tier, names, time.monotonic(), ticket))
+        while len(self.history) > self.depth:
+            self._commit(self.history.popleft())
+
+    def undo(self):
+        """Takes back the latest decision still held. Returns (item, tier, names), or None."""
+        if not self.history:
+            return None
+        item, tier, names, _, ticket = self.history.pop()
+        if self.revert is not None:
+            self.revert(ticket)
+        return item, tier, names
+
+    def flush(self, expired_only=False):
+        """Commits every held decision, or with expired_only just those past hold_seconds."""
+        cutoff = time.monotonic() - self.hold_seconds
+        while self.history and (not expired_only or self.history[0][3] <= cutoff):
+            self._commit(self.history.popleft())
+
+    def __len__(self):
+        return len(self.history)
+
+    def _commit(self, entry):
+        item, tier, names, _, ticket = entry
+        self.commit(item, tier, names, ticket)
@@ -1,62 +1,307 @@
 import os
-import random
-import shutil
+import threading
+import time
+from collections import deque
 from tkinter import messagebox
+import numpy as np
 from PIL import Image, ImageTk
+from medisort.dedupe import cluster, compute_hashes
+from medisort.hotkeys import UNDO
+from medisort.metrics import metrics
+from medisort.prefetch import ImagePrefetcher
+from medisort.preview import (PREVIEW_SIZE, PYRAMID_LEVELS, PreviewUnavailable, display_box, fit_size,
+                              placeholder_preview, pyramid_level)
+from medisort.session import SortSession
+from medisort.suggest import TierIndex, describe, describe_files
+
+# Below this many labelled examples suggestions are mostly noise
+MIN_LABELLED_EXAMPLES = 20
+RENDER_POLL_MS = 10
+RESIZE_DELAY_MS = 100 # Wait for a window drag to settle before redrawing
 
 class ImageSorter:
-    def __init__(self, parent_window, img_label, folder_path, tiers, on_close_callback):
+    def __init__(self, parent_window, img_label, folder_path, tiers, on_close_callback,
+                 prefetch_depth=4, prefetch_memory=256 * 1024 * 1024, preview_cache=None,
+                 status_label=None, recursive=False, group_duplicates=False,
+                 suggest_tiers=False, confident_first=False, min_confidence=0.6, on_suggest=None, shared=False,
+                 rules=None):
         self.parent_window = parent_window
         self.img_label = img_label
         self.folder_path = folder_path
         self.tiers = tiers
         self.on_close_callback = on_close_callback
+        self.status_label = status_label
+        self.recursive = recursive
+        self.group_duplicates = group_duplicates
+        self.suggest_tiers = suggest_tiers or confident_first
+        self.confident_first = confident_first
+        self.min_confidence = min_confidence
+        self.on_suggest = on_suggest
+        self.shared = shared
 
-        self.image_files = []
+        self.image_files = None
         self.current_image = None
-        self.selected_tier = None
-        
+        self.preview = None # Future of the current image's preview
+        self.requested = 0.0
+        self.typed = deque() # Decisions not yet applied, in the order they were made
+        self.polling = False
+        self.render_pending = False
+        self.resize_pending = False
+        self.levels = {} # Pyramid level -> preview of the current image decoded at it
+        self.preview_level = None
+        self.zoomed = False
+        self.suggested_for = None
+        # Previews follow the label's size; the level they are decoded at is the smallest covering it
+        self.view_size = display_box(img_label, PREVIEW_SIZE)
+        self.groups = {} # Representative name -> every file in its near-duplicate cluster
+        self.status_note = ""
+        self.tier_index = None
+        self.suggestions = {} # Precomputed (tier, confidence) per file when ranking the queue
+        self.session = SortSession(folder_path, tiers, "image", recursive=recursive, shared=shared, rules=rules)
+        self.decisions = self.session.decisions
+        self.prefetcher = ImagePrefetcher(folder_path, depth=prefetch_depth, max_bytes=prefetch_memory,
+                                          size=pyramid_level(self.view_size), cache=preview_cache)
+
+        self.img_label.bind("<Configure>", self.on_resize)
         self.parent_window.protocol("WM_DELETE_WINDOW", self.on_window_close)
 
     def start(self):
-        self.image_files = [f for f in os.listdir(self.folder_path) if f.lower().endswith((".jpg", ".jpeg", ".png", ".gif", ".bmp"))]
-        random.shuffle(self.image_files)
+        if self.suggest_tiers and not (self.confident_first and not self.shared):
+            # Ranking builds the tier index itself
+            threading.Thread(target=self.build_tier_index, daemon=True).start()
+        self.image_files = self.session.open_queue(self.arrange, shuffle=not self.confident_first)
+        self.update_move_status()
         self.next_image()
 
     def on_tier_select(self, tier):
-        self.selected_tier = tier
-        if self.selected_tier:
-            self.move_file()
-        self.next_image()
+        """Decides the current image. Decisions made faster than images render apply to the
+        following images in order; rendering catches up without holding up the next decision."""
+        self.typed.append(tier)
+        self.apply_typed()
 
-    def move_file(self):
-        if self.selected_tier and self.current_image:
-            src = os.path.join(self.folder_path, self.current_image)
-            dst = os.path.join(self.folder_path, self.selected_tier, self.current_image)
-            try:
-                shutil.move(src, dst)
-            except Exception as e:
-                messagebox.showerror("File Error", f"Could not move file: {self.current_image}\nError: {e}")
+    def skip(self):
+        self.typed.append(None)
+        self.apply_typed()
+
+    def undo(self):
+        self.typed.append(UNDO)
+        self.apply_typed()
+
+    def apply_typed(self):
+        while self.typed:
+            if self.typed[0] is UNDO:
+                self.typed.popleft()
+                self.undo_last()
+                continue
+            if self.current_image is None:
+                return # Resumed by poll_next once the next image is available
+            tier = self.typed.popleft()
+            metrics.count("decisions" if tier else "skips")
+            with metrics.time("next_image"):
+                self.decisions.add(self.current_image, tier, self.groups.get(self.current_image))
+                self.prefetcher.discard(self.current_image)
+                self.next_image()
+
+    def undo_last(self):
+        decision = self.decisions.undo()
+        if decision is None:
+            return # Already committed, or nothing decided yet
+        metrics.count("undos")
+        if self.current_image is not None:
+            self.image_files.unpop(self.current_image)
+        self.set_current(decision[0])
 
     def next_image(self):
-        if not self.image_files:
-            messagebox.showinfo("Done", "All images have been sorted!")
+        self.current_image = None
+        if self.image_files.exhausted():
+            if self.image_files.error:
+                messagebox.showerror("Folder Error", f"Could not read folder: {self.image_files.error}")
+            else:
+                messagebox.showinfo("Done", "All images have been sorted!")
             self.on_window_close()
             return
 
-        self.current_image = self.image_files.pop()
-        image_path = os.path.join(self.folder_path, self.current_image)
+        name = self.image_files.pop()
+        if name is None:
+            # Enumeration has not reached the next image yet
+            if not self.polling:
+                self.polling = True
+                self.parent_window.after(50, self.poll_next)
+            return
+        self.set_current(name)
+
+    def poll_next(self):
+        self.polling = False
+        if self.parent_window.winfo_exists() and self.current_image is None:
+            self.next_image()
+            self.apply_typed()
+
+    def set_current(self, name):
+        self.current_image = name
+        if self.group_duplicates:
+            members = self.groups.get(name)
+            self.status_note = f"{len(members)} near-identical images, this decision applies to all" if members else ""
+
+        self.levels = {}
+        self.zoomed = False
+        self.request_level(self.prefetcher.size)
+        self.prefetcher.schedule(self.upcoming_images())
+
+    def request_level(self, level):
+        """Asks for the current image at a pyramid level and draws it when it is ready."""
+        self.preview = self.prefetcher.take(self.current_image, level)
+        self.preview_level = level
+        self.requested = time.perf_counter()
+        if not self.render_pending:
+            # Drawn once Tk is idle, so a burst of decisions only renders the image it ends on
+            self.render_pending = True
+            self.parent_window.after_idle(self.render)
+
+    def render(self):
+        self.render_pending = False
+        name, future = self.current_image, self.preview
+        if name is None or not self.parent_window.winfo_exists():
+            return
+        if not future.done():
+            self.render_pending = True
+            self.parent_window.after(RENDER_POLL_MS, self.render)
+            return
+        metrics.record("preview_wait", time.perf_counter() - self.requested)
 
         try:
-            with Image.open(image_path) as img:
-                img.thumbnail((854, 480))
-                img_tk = ImageTk.PhotoImage(img)
-                self.img_label.config(image=img_tk)
-                self.img_label.image = img_tk
+            try:
+                img = future.result()
+            except PreviewUnavailable as e:
+                img = placeholder_preview(f"No preview for {name}\n{e}")
+            self.levels[self.preview_level] = img
+            self.show(img)
+            if self.suggested_for != name:
+                self.suggested_for = name
+                self.suggest_tier(img)
         except Exception as e:
-            messagebox.showerror("Error", f"Could not open image: {self.current_image}\n{e}")
-            self.next_image() # Skip to the next one
+            if not (self.shared and isinstance(e, FileNotFoundError)):
+                messagebox.showerror("Error", f"Could not open image: {name}\n{e}")
+            # Skip to the next one, leaving this one where it is
+            self.next_image()
+            self.apply_typed()
+
+    def show(self, img):
+        """Puts img on screen scaled to fit the label, or at 1:1 around its centre when zoomed."""
+        box = self.view_size
+        if self.zoomed:
+            left, top = max(0, (img.width - box[0]) // 2), max(0, (img.height - box[1]) // 2)
+            img = img.crop((left, top, left + min(box[0], img.width), top + min(box[1], img.height)))
+        elif img.width > box[0] or img.height > box[1]:
+            with metrics.time("fit"):
+                img = img.resize(fit_size(img.size, box), Image.BICUBIC, reducing_gap=2.0)
+        with metrics.time("photoimage"):
+            img_tk = ImageTk.PhotoImage(img)
+        self.img_label.config(image=img_tk)
+        self.img_label.image = img_tk
+        metrics.time_until_idle(self.img_label, "render")
+
+    def redraw(self):
+        """Redraws the current image for the display size, from a level already held when one covers it."""
+        if self.current_image is None:
+            return
+        wanted = PYRAMID_LEVELS[-1] if self.zoomed else pyramid_level(self.view_size)
+        for level in sorted(self.levels):
+            img = self.levels[level]
+            # An image smaller than its level box is the full-resolution picture and covers every level
+            full_size = img.width < level[0] and img.height < level[1]
+            if full_size or (level[0] >= wanted[0] and level[1] >= wanted[1]):
+                metrics.count("pyramid_hits")
+                self.show(img)
+                return
+        self.request_level(wanted)
+
+    def on_resize(self, event):
+        if not self.resize_pending:
+            self.resize_pending = True
+            self.parent_window.after(RESIZE_DELAY_MS, self.apply_resize)
+
+    def apply_resize(self):
+        self.resize_pending = False
+        box = display_box(self.img_label)
+        if box == self.view_size or not self.parent_window.winfo_exists():
+            return
+        self.view_size = box
+        # Upcoming images are prepared for the new size too
+        self.prefetcher.set_size(pyramid_level(box))
+        if self.image_files is not None:
+            self.prefetcher.schedule(self.upcoming_images())
+        self.redraw()
+
+    def toggle_zoom(self):
+        """Switches the current image between fitting the window and 100% (up to the largest level)."""
+        self.zoomed = not self.zoomed
+        self.redraw()
+
+    def arrange(self, source):
+        # Grouping and ranking need the whole folder to themselves, so a shared folder goes without them
+        if self.group_duplicates and not self.shared:
+            source = self.grouped_images(source)
+        if self.confident_first and not self.shared:
+            source = self.ranked_images(source)
+        return source
+
+    def grouped_images(self, source):
+        """Hashes the whole folder and yields one representative per cluster of near-identical images."""
+        names = [name for name in source if name not in self.session.mover.recovered]
+        self.status_note = f"Finding near-duplicates among {len(names)} images..."
+        phashes, dhashes, ok = compute_hashes(self.folder_path, names)
+        groups = cluster(names, phashes, dhashes, ok)
+        self.groups = {group[0]: group for group in groups if len(group) > 1}
+        self.status_note = ""
+        for group in groups:
+            yield group[0]
+
+    def build_tier_index(self):
+        self.tier_index = TierIndex.build(self.folder_path, self.tiers)
+
+    def ranked_images(self, source):
+        """Yields files ordered by how confidently the tier index can place them, most confident first."""
+        names = [name for name in source if name not in self.session.mover.recovered]
+        self.status_note = f"Ranking {len(names)} images against already sorted ones..."
+        self.tier_index = TierIndex.build(self.folder_path, self.tiers)
+        if len(self.tier_index) < MIN_LABELLED_EXAMPLES:
+            self.status_note = ""
+            yield from names
+            return
+
+        features, ok = describe_files([os.path.join(self.folder_path, name) for name in names])
+        best, confidences = self.tier_index.query(features)
+        confidences = np.where(ok, confidences, -1)
+        for i in np.flatnonzero(ok):
+            self.suggestions[names[i]] = (self.tiers[best[i]], float(confidences[i]))
+        self.status_note = ""
+        for i in np.argsort(-confidences, kind="stable"):
+            yield names[i]
+
+    def suggest_tier(self, img):
+        """Reports the likely tier of the current image to on_suggest, or None if there is no confident guess."""
+        if self.on_suggest is None or not self.suggest_tiers:
+            return
+        tier, confidence = None, 0.0
+        if self.current_image in self.suggestions:
+            tier, confidence = self.suggestions[self.current_image]
+        elif self.tier_index is not None and len(self.tier_index) >= MIN_LABELLED_EXAMPLES:
+            tier, confidence = self.tier_index.suggest(describe(img))
+        self.on_suggest(tier if confidence >= self.min_confidence else None, confidence)
+
+    def upcoming_images(self):
+        return self.image_files.peek(self.prefetcher.depth)
+
+    def update_move_status(self):
+        if not self.parent_window.winfo_exists():
+            return
+        status = self.session.status(self.status_note)
+        if self.status_label is not None:
+            self.status_label.config(text=status)
+        self.parent_window.after(250, self.update_move_status)
 
     def on_window_close(self):
+        self.session.close(self.parent_window, self.status_label)
+        self.prefetcher.close()
         self.parent_window.destroy()
-        self.on_close_callback()
\ No newline at end of file
+        self.on_close_callback()
@@ -1,20 +1,46 @@
+import importlib
 import os
+import sys
+import threading
+import time
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
-from medisort.vid_sort import VideoSorter
-from medisort.img_sort import ImageSorter
+from medisort.hotkeys import DEFAULT_SKIP_KEY, DEFAULT_TIER_KEYS, DEFAULT_UNDO_KEY, bind_hotkeys, parse_keys
+from medisort.metrics import MetricsOverlay, metrics
+
+STARTUP_REPORT_ENV = "MEDISORT_STARTUP_REPORT"
+
+# The sorters pull in OpenCV, NumPy and Pillow, so they are only imported once a mode is chosen
+MODE_MODULES = {
+    "Images": ("medisort.img_sort", "medisort.grid_sort", "medisort.preview_cache"),
+    "Videos": ("medisort.vid_sort", "medisort.preview_cache"),
+}
+WARM_DELAY_MS = 300 # Let the launcher paint before competing with it for the interpreter
+
+
+def load_class(module_name, class_name):
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def warm_imports(module_names):
+    for name in module_names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass # Reported properly when the sorter is launched
 
 class MediaSorterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Media Sorter")
-        self.root.geometry("500x700")
+        self.root.geometry("500x790")
         self.root.resizable(True, True)
         
         self.root.configure(bg='#f8f9fa')
         self.primary_color = "#007bff"
         self.success_color = "#28a745"
         self.secondary_color = "#6c757d"
+        self.suggest_color = "#fd7e14"
         self.light_bg = "#f8f9fa"
         self.card_bg = "#ffffff"
         self.border_color = "#dee2e6"
@@ -22,6 +48,18 @@ class MediaSorterApp:
         self.mode_var = tk.StringVar(value="Images")
         self.folder_path_var = tk.StringVar()
         self.tiers_var = tk.StringVar(value="Good, Bad, Skip")
+        self.recursive_var = tk.BooleanVar(value=False)
+        self.shared_var = tk.BooleanVar(value=False)
+        self.rules_path_var = tk.StringVar()
+        self.storyboard_var = tk.BooleanVar(value=False)
+        self.proxy_var = tk.BooleanVar(value=False)
+        self.group_duplicates_var = tk.BooleanVar(value=False)
+        self.grid_var = tk.BooleanVar(value=False)
+        self.suggest_var = tk.BooleanVar(value=False)
+        self.confident_first_var = tk.BooleanVar(value=False)
+        self.tier_keys_var = tk.StringVar(value=DEFAULT_TIER_KEYS)
+        self.undo_key_var = tk.StringVar(value=DEFAULT_UNDO_KEY)
+        self.skip_key_var = tk.StringVar(value=DEFAULT_SKIP_KEY)
 
         self.setup_styles()
         self.create_widgets()
@@ -30,6 +68,11 @@ class MediaSorterApp:
         self.dragging_index = None
         self.placeholder = None
 
+        self.preview_cache = None
+        self.preview_cache_failed = False
+        self.session_folder = None
+        self.warmed = set()
+
 
     def setup_styles(self):
         style = ttk.Style()
@@ -124,6 +167,78 @@ class MediaSorterApp:
         )
         self.vid_button.pack(side=tk.LEFT)
 
+        storyboard_check = tk.Checkbutton(
+            mode_section,
+            text="Show videos as a storyboard of sampled frames",
+            variable=self.storyboard_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        storyboard_check.pack(anchor="w", pady=(8, 0))
+
+        proxy_check = tk.Checkbutton(
+            mode_section,
+            text="Play 4K, HEVC and ProRes videos from small proxies made in the background",
+            variable=self.proxy_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        proxy_check.pack(anchor="w")
+
+        grid_check = tk.Checkbutton(
+            mode_section,
+            text="Show images as a grid and sort a whole selection at once",
+            variable=self.grid_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        grid_check.pack(anchor="w")
+
+        group_check = tk.Checkbutton(
+            mode_section,
+            text="Group near-identical images into one decision",
+            variable=self.group_duplicates_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        group_check.pack(anchor="w")
+
+        suggest_check = tk.Checkbutton(
+            mode_section,
+            text="Suggest a tier from images already sorted",
+            variable=self.suggest_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        suggest_check.pack(anchor="w")
+
+        confident_check = tk.Checkbutton(
+            mode_section,
+            text="Show the most confident suggestions first",
+            variable=self.confident_first_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        confident_check.pack(anchor="w")
+
     def create_folder_section(self, parent):
         folder_section = tk.Frame(parent, bg=self.card_bg)
         folder_section.pack(fill=tk.X, padx=20, pady=15)
@@ -158,6 +273,46 @@ class MediaSorterApp:
         )
         browse_btn.pack(side=tk.LEFT)
 
+        recursive_check = tk.Checkbutton(
+            folder_section,
+            text="Include subfolders",
+            variable=self.recursive_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        recursive_check.pack(anchor="w", pady=(8, 0))
+
+        shared_check = tk.Checkbutton(
+            folder_section,
+            text="Shared folder (others are sorting it at the same time)",
+            variable=self.shared_var,
+            font=("Segoe UI", 9),
+            fg=self.secondary_color,
+            bg=self.card_bg,
+            activebackground=self.card_bg,
+            anchor="w"
+        )
+        shared_check.pack(anchor="w")
+
+        rules_frame = tk.Frame(folder_section, bg=self.card_bg)
+        rules_frame.pack(fill=tk.X, pady=(8, 0))
+
+        self.rules_label = tk.Label(
+            rules_frame,
+            text="No routing rules - every file goes to the sorter",
+            bg=self.card_bg,
+            fg=self.secondary_color,
+            anchor="w",
+            font=("Segoe UI", 9)
+        )
+        self.rules_label.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(0, 10))
+
+        ttk.Button(rules_frame, text="Clear", command=self.clear_rules).pack(side=tk.RIGHT)
+        ttk.Button(rules_frame, text="Rules...", command=self.browse_rules).pack(side=tk.RIGHT, padx=(0, 6))
+
     def create_tiers_section(self, parent):
         tiers_section = tk.Frame(parent, bg=self.card_bg)
         tiers_section.pack(fill=tk.X, padx=20, pady=15)
@@ -205,6 +360,16 @@ class MediaSorterApp:
         self.categories = ["Good", "Bad", "Skip"]
         self.refresh_chips()
 
+        # Keyboard shortcuts: one key per category in order, plus undo and skip
+        keys_frame = tk.Frame(tiers_section, bg=self.card_bg)
+        keys_frame.pack(fill=tk.X, pady=(10, 0))
+        for text, var, width in (("Keys", self.tier_keys_var, 14), ("Undo", self.undo_key_var, 10),
+                                 ("Skip", self.skip_key_var, 8)):
+            tk.Label(keys_frame, text=text, font=("Segoe UI", 9), fg=self.secondary_color,
+                     bg=self.card_bg).pack(side=tk.LEFT, padx=(0, 4))
+            ttk.Entry(keys_frame, textvariable=var, width=width,
+                      font=("Segoe UI", 9)).pack(side=tk.LEFT, padx=(0, 10))
+
 
     def create_start_section(self, parent):
         start_section = tk.Frame(parent, bg=self.card_bg)
@@ -236,6 +401,7 @@ class MediaSorterApp:
 
     def select_mode(self, mode):
         self.mode_var.set(mode)
+        self.root.after(WARM_DELAY_MS, self.warm_mode, mode)
         
         if mode == "Images":
             self.pic_button.config(
@@ -268,6 +434,21 @@ class MediaSorterApp:
             if hasattr(self, 'status_label'):
                 self.status_label.config(text="Ready to sort videos")
 
+    def warm_mode(self, mode):
+        """Imports the modules behind mode in the background while the user is still picking a folder."""
+        modules = [name for name in MODE_MODULES[mode] if name not in self.warmed]
+        if modules:
+            self.warmed.update(modules)
+            threading.Thread(target=warm_imports, args=(modules,), daemon=True).start()
+
+    def sorter_class(self):
+        mode = self.mode_var.get()
+        if mode == "Videos":
+            return load_class("medisort.vid_sort", "VideoSorter")
+        if self.grid_var.get():
+            return load_class("medisort.grid_sort", "GridSorter")
+        return load_class("medisort.img_sort", "ImageSorter")
+
     def browse_folder(self):
         path = filedialog.askdirectory(title="Select folder containing your media files")
         if path:
@@ -276,6 +457,17 @@ class MediaSorterApp:
             self.folder_label.config(text=display_path, fg="#2c3e50")
             self.status_label.config(text=f"Folder selected: {os.path.basename(path)}")
 
+    def browse_rules(self):
+        path = filedialog.askopenfilename(title="Select a routing rules file",
+                                          filetypes=[("Rules", "*.json"), ("All files", "*.*")])
+        if path:
+            self.rules_path_var.set(path)
+            self.rules_label.config(text=f"Routing rules: {os.path.basename(path)}", fg="#2c3e50")
+
+    def clear_rules(self):
+        self.rules_path_var.set("")
+        self.rules_label.config(text="No routing rules - every file goes to the sorter", fg=self.secondary_color)
+
     def start_sorting(self):
         folder_path = self.folder_path_var.get()
         tiers = self.categories
@@ -295,6 +487,15 @@ class MediaSorterApp:
                                       f"You have {len(tiers)} categories. This might make the interface crowded. Continue?"):
                 return
 
+        rules = None
+        if self.rules_path_var.get():
+            from medisort.rules import RuleError, load_rules
+            try:
+                rules = load_rules(self.rules_path_var.get())
+            except RuleError as e:
+                messagebox.showerror("Invalid Rules", str(e))
+                return
+
         try:
             for tier in tiers:
                 os.makedirs(os.path.join(folder_path, tier), exist_ok=True)
@@ -304,37 +505,157 @@ class MediaSorterApp:
             return
 
         self.status_label.config(text="Starting sorter...")
+        self.root.update_idletasks()
+        try:
+            self.sorter_class() # Usually already imported by warm_mode
+        except ImportError as e:
+            messagebox.showerror("Missing Dependency",
+                                 f"Could not load the {self.mode_var.get().lower()} sorter.\nError: {e}")
+            self.status_label.config(text="Ready")
+            return
+
         self.root.withdraw()
-        self.launch_sorter_window(folder_path, tiers)
+        self.launch_sorter_window(folder_path, tiers, rules)
+
+    def restore_launcher(self):
+        """Brings the launcher back after a sorter failed to start."""
+        self.status_label.config(text="Ready")
+        self.root.deiconify()
 
     def on_sorter_finished(self):
         self.status_label.config(text="Sorting completed!")
+        if metrics.enabled:
+            path = self.export_metrics()
+            if path:
+                self.status_label.config(text=f"Sorting completed! Session metrics saved to {path}")
         self.root.deiconify()
         messagebox.showinfo("Sorting Complete", "All media files have been processed!")
 
-    def launch_sorter_window(self, folder_path, tiers):
+    def launch_sorter_window(self, folder_path, tiers, rules=None):
         sorter_window = tk.Toplevel(self.root)
         sorter_window.title(f"{self.mode_var.get()} Sorter")
         sorter_window.configure(bg=self.light_bg)
 
-        img_label = tk.Label(sorter_window, bg=self.light_bg)
-        img_label.pack(padx=15, pady=15)
+        mode = self.mode_var.get()
+        grid_mode = mode == "Images" and self.grid_var.get()
+        if grid_mode:
+            img_label = tk.Frame(sorter_window, bg=self.light_bg)
+            img_label.pack(padx=15, pady=15)
+        else:
+            # The preview follows the label's size, so the label must not follow the preview's:
+            # it requests no size of its own (pixels, since it shows an image) and takes what is left
+            width, height = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
+            sorter_window.geometry(f"{round(width * 0.7)}x{round(height * 0.8)}")
+            img_label = tk.Label(sorter_window, bg=self.light_bg, width=1, height=1)
+            img_label.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+
+        seek_bar = None
+        playback_controls = None
+        if mode == "Videos" and not self.storyboard_var.get():
+            playback_controls = tk.Frame(sorter_window, bg=self.light_bg)
+            playback_controls.pack(fill=tk.X, padx=15, pady=(0, 10))
+            seek_bar = tk.Scale(playback_controls, orient=tk.HORIZONTAL, showvalue=False, from_=0, to=1,
+                                bg=self.light_bg, troughcolor=self.border_color, highlightthickness=0)
+            seek_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
 
         button_frame = tk.Frame(sorter_window, bg=self.light_bg)
         button_frame.pack(padx=15, pady=(0, 15))
 
-        mode = self.mode_var.get()
+        move_status_label = tk.Label(sorter_window, bg=self.light_bg, fg=self.secondary_color, font=("Segoe UI", 9))
+        move_status_label.pack(pady=(0, 10))
+
+        metrics.reset()
+        self.session_folder = folder_path
+        if metrics.overlay:
+            overlay_label = tk.Label(sorter_window, bg=self.light_bg, fg=self.secondary_color,
+                                     font=("Consolas", 8), justify=tk.LEFT, anchor="w")
+            overlay_label.pack(fill=tk.X, padx=15, pady=(0, 10))
+            MetricsOverlay(overlay_label, metrics).start()
+
         sorter_logic = None
+        sorter_class = self.sorter_class()
+        preview_cache = self.get_preview_cache()
+        tier_buttons = {}
+        button_text = {tier: tier for tier in tiers}
+        suggested = [None]
+
+        def show_suggestion(suggested_tier, confidence):
+            suggested[0] = suggested_tier
+            for name, b in tier_buttons.items():
+                if name == suggested_tier:
+                    b.config(bg=self.suggest_color, text=f"{button_text[name]}\n{confidence:.0%} match")
+                else:
+                    b.config(bg=self.primary_color, text=button_text[name])
+
+        from medisort.mover import JournalBusy
+        try:
+            if grid_mode:
+                sorter_logic = sorter_class(sorter_window, img_label, folder_path, tiers, self.on_sorter_finished,
+                                          preview_cache=preview_cache, status_label=move_status_label,
+                                          recursive=self.recursive_var.get(), shared=self.shared_var.get(),
+                                          rules=rules)
+            elif mode == "Videos":
+                sorter_logic = sorter_class(sorter_window, img_label, folder_path, tiers, self.on_sorter_finished,
+                                           preview_cache=preview_cache, status_label=move_status_label,
+                                           recursive=self.recursive_var.get(), storyboard=self.storyboard_var.get(),
+                                           shared=self.shared_var.get(), seek_bar=seek_bar,
+                                           proxies=self.proxy_var.get(), rules=rules)
+            else:
+                sorter_logic = sorter_class(sorter_window, img_label, folder_path, tiers, self.on_sorter_finished,
+                                           preview_cache=preview_cache, status_label=move_status_label,
+                                           recursive=self.recursive_var.get(),
+                                           group_duplicates=self.group_duplicates_var.get(),
+                                           suggest_tiers=self.suggest_var.get(),
+                                           confident_first=self.confident_first_var.get(),
+                                           on_suggest=show_suggestion,
+                                           shared=self.shared_var.get(), rules=rules)
+        except JournalBusy as e:
+            sorter_window.destroy()
+            self.restore_launcher()
+            messagebox.showerror("Folder In Use", str(e))
+            return
+        except Exception as e:
+            sorter_window.destroy()
+            self.restore_launcher()
+            messagebox.showerror("Sorter Error", f"Could not start the sorter.\nError: {e}")
+            return
 
-        if mode == "Videos":
-            sorter_logic = VideoSorter(sorter_window, img_label, folder_path, tiers, self.on_sorter_finished)
-        else:
-            sorter_logic = ImageSorter(sorter_window, img_label, folder_path, tiers, self.on_sorter_finished)
+        if playback_controls is not None:
+            from medisort.vid_sort import TRIAGE_SPEEDS
+            speed_var = tk.IntVar(value=1)
+            for speed in TRIAGE_SPEEDS:
+                tk.Radiobutton(
+                    playback_controls,
+                    text=f"{speed}x",
+                    variable=speed_var,
+                    value=speed,
+                    indicatoron=0,
+                    width=4,
+                    command=lambda: sorter_logic.set_speed(speed_var.get()),
+                    font=("Segoe UI", 9),
+                    bg=self.card_bg,
+                    selectcolor=self.primary_color,
+                    relief="flat",
+                    cursor="hand2"
+                ).pack(side=tk.LEFT, padx=2)
+
+        # Keys go to the sorter window, so decisions can be typed faster than items render
+        skip = sorter_logic.next_page if grid_mode else sorter_logic.skip
+        tier_keys, unknown = bind_hotkeys(sorter_window, tiers, parse_keys(self.tier_keys_var.get()),
+                                          sorter_logic.on_tier_select,
+                                          undo_key=self.undo_key_var.get().strip(), on_undo=sorter_logic.undo,
+                                          skip_key=self.skip_key_var.get().strip(), on_skip=skip,
+                                          on_zoom=getattr(sorter_logic, "toggle_zoom", None))
+        if unknown:
+            messagebox.showerror("Keyboard Shortcuts", f"Unknown key name(s): {', '.join(unknown)}\n"
+                                                       "Use Tk key names such as 1, a, F1, space or BackSpace.")
+        for tier, key in tier_keys.items():
+            button_text[tier] = f"{tier}  ({key})"
 
         for i, tier in enumerate(tiers):
             btn = tk.Button(
                 button_frame,
-                text=tier,
+                text=button_text[tier],
                 command=lambda t=tier, s=sorter_logic: s.on_tier_select(t),
                 width=12,
                 height=2,
@@ -346,11 +667,56 @@ class MediaSorterApp:
                 cursor="hand2"
             )
             btn.pack(side=tk.LEFT, padx=8)
+            tier_buttons[tier] = btn
             
             btn.bind("<Enter>", lambda e, b=btn: b.config(bg=self.success_color))
-            btn.bind("<Leave>", lambda e, b=btn: b.config(bg=self.primary_color))
+            btn.bind("<Leave>", lambda e, b=btn, t=tier: b.config(
+                bg=self.suggest_color if suggested[0] == t else self.primary_color))
 
-        sorter_logic.start()
+        if grid_mode:
+            tk.Button(
+                button_frame,
+                text="Next page",
+                command=sorter_logic.next_page,
+                width=12,
+                height=2,
+                font=("Segoe UI", 12, "bold"),
+                bg=self.secondary_color,
+                fg="white",
+                relief="flat",
+                borderwidth=0,
+                cursor="hand2"
+            ).pack(side=tk.LEFT, padx=8)
+
+        with metrics.time("sorter_start"):
+            sorter_logic.start()
+
+    def export_metrics(self):
+        """Writes the session metrics. Returns their path, or None if they could not be written."""
+        from medisort.mover import STATE_DIR
+        path = metrics.export_path or os.path.join(self.session_folder, STATE_DIR,
+                                                   time.strftime("metrics-%Y%m%d-%H%M%S.json"))
+        try:
+            metrics.export(path)
+        except OSError as e:
+            messagebox.showerror("Session Metrics", f"Could not write session metrics.\nError: {e}")
+            return None
+        return path
+
+    def get_preview_cache(self):
+        if self.preview_cache is None and not self.preview_cache_failed:
+            import sqlite3
+            from medisort.preview_cache import PreviewCache
+            try:
+                self.preview_cache = PreviewCache()
+            except (OSError, sqlite3.Error) as e:
+                # Sorting still works without the cache, it is just slower on repeat visits; said once per run
+                self.preview_cache_failed = True
+                metrics.count("preview_cache_disabled")
+                messagebox.showwarning("Preview Cache",
+                                       f"Previews will not be cached between sessions, so reopening a folder "
+                                       f"is slower.\nError: {e}")
+        return self.preview_cache
 
     def add_category(self):
         new_cat = self.new_category_var.get().strip()
@@ -432,3 +798,51 @@ class MediaSorterApp:
                 return i
         return len(positions)
 
+def process_age():
+    """Seconds since this process started, where the platform makes that cheap to find out (Linux)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def report_startup(phases, before_main):
+    lines = ["Startup timings:"]
+    if before_main is not None:
+        lines.append(f"  {'interpreter and imports before main':<36} {before_main * 1000:8.1f} ms")
+    for name, seconds in phases:
+        lines.append(f"  {name:<36} {seconds * 1000:8.1f} ms")
+    total = sum(seconds for _, seconds in phases) + (before_main or 0)
+    lines.append(f"  {'launcher visible after':<36} {total * 1000:8.1f} ms")
+    print("\n".join(lines), file=sys.stderr)
+
+
+def main(startup_report=False, import_seconds=None):
+    """Opens the launcher. import_seconds is how long the caller spent importing this module."""
+    startup_report = startup_report or os.environ.get(STARTUP_REPORT_ENV, "") not in ("", "0")
+    before_main = process_age() if startup_report else None
+    phases = []
+    if import_seconds is not None:
+        phases.append(("import medisort.medisort", import_seconds))
+        if before_main is not None:
+            before_main -= import_seconds
+
+    started = time.perf_counter()
+    root = tk.Tk()
+    phases.append(("create Tk root", time.perf_counter() - started))
+
+    started = time.perf_counter()
+    MediaSorterApp(root)
+    phases.append(("build launcher widgets", time.perf_counter() - started))
+
+    if startup_report:
+        started = time.perf_counter()
+        root.wait_visibility(root)
+        root.update_idletasks()
+        phases.append(("map and first paint", time.perf_counter() - started))
+        report_startup(phases, before_main)
+    root.mainloop()
@@ -0,0 +1,234 @@
+import csv
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENV = "MEDISORT_METRICS" # "1" to record, or a .json/.csv path to also export there
+OVERLAY_ENV = "MEDISORT_METRICS_OVERLAY"
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (capped at the largest sample)."""
+        target = self.count * p / 100
+        running = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            running += count
+            if running >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)},
+        }
+
+
+class StageTimer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """Per-stage latency histograms, counters and queue-depth gauges for one sorting session.
+
+    Every hook is a cheap no-op while disabled, so the calls can stay in hot paths.
+    """
+
+    def __init__(self, enabled=False, export_path=None, overlay=False):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.overlay = overlay
+        self.lock = threading.Lock()
+        self.reset()
+
+    def configure(self, enabled=True, export_path=None, overlay=False):
+        self.enabled = enabled or overlay or bool(export_path)
+        self.export_path = export_path or self.export_path
+        self.overlay = overlay or self.overlay
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {} # Name -> [last, max]
+
+    def time(self, stage):
+        """Context manager that records how long its block took under stage."""
+        return StageTimer(self, stage) if self.enabled else NULL_TIMER
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram()
+            histogram.add(seconds * 1000)
+
+    def time_until_idle(self, widget, stage):
+        """Records the time until Tk has processed its pending redraws, without forcing them early."""
+        if not self.enabled:
+            return
+        started = time.perf_counter()
+        widget.after_idle(lambda: self.record(stage, time.perf_counter() - started))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                self.gauges[name] = [value, value]
+            else:
+                gauge[0] = value
+                gauge[1] = max(gauge[1], value)
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            stages = {name: histogram.summary() for name, histogram in sorted(self.stages.items())}
+            gauges = {name: {"last": last, "max": peak} for name, (last, peak) in sorted(self.gauges.items())}
+
+        playback_s = stages.get("playback", {}).get("total_ms", 0) / 1000
+        rates = {
+            "decisions_per_minute": round(counters.get("decisions", 0) / elapsed * 60, 2) if elapsed else 0.0,
+            "decode_fps": round(counters.get("frames_decoded", 0) / playback_s, 2) if playback_s else 0.0,
+            "display_fps": round(counters.get("frames_shown", 0) / playback_s, 2) if playback_s else 0.0,
+        }
+        return {"elapsed_s": round(elapsed, 3), "rates": rates, "counters": counters,
+                "gauges": gauges, "stages": stages}
+
+    def export(self, path):
+        """Writes the snapshot as JSON, or as CSV rows of (section, name, field, value) for a .csv path."""
+        snapshot = self.snapshot()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if not path.lower().endswith(".csv"):
+                json.dump(snapshot, f, indent=2)
+                return
+            writer = csv.writer(f)
+            writer.writerow(["section", "name", "field", "value"])
+            writer.writerow(["session", "elapsed_s", "value", snapshot["elapsed_s"]])
+            for name, value in snapshot["rates"].items():
+                writer.writerow(["rates", name, "value", value])
+            for name, value in snapshot["counters"].items():
+                writer.writerow(["counters", name, "value", value])
+            for name, gauge in snapshot["gauges"].items():
+                for field, value in gauge.items():
+                    writer.writerow(["gauges", name, field, value])
+            for name, summary in snapshot["stages"].items():
+                for field, value in summary.items():
+                    if field == "buckets":
+                        for bucket, count in value.items():
+                            writer.writerow(["stages", name, bucket, count])
+                    else:
+                        writer.writerow(["stages", name, field, value])
+
+
+class MetricsOverlay:
+    """Keeps a label updated with live stage latencies and rates for the running session."""
+
+    def __init__(self, label, metrics, interval_ms=500):
+        self.label = label
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.last = None
+
+    def start(self):
+        self.refresh()
+
+    def refresh(self):
+        if not self.label.winfo_exists():
+            return
+        now = time.monotonic()
+        snapshot = self.metrics.snapshot()
+        counters = snapshot["counters"]
+
+        # Frame rates over the last refresh interval rather than the whole session
+        fps = ""
+        if self.last is not None:
+            previous_time, previous = self.last
+            span = now - previous_time
+            decoded = counters.get("frames_decoded", 0) - previous.get("frames_decoded", 0)
+            shown = counters.get("frames_shown", 0) - previous.get("frames_shown", 0)
+            if decoded or shown:
+                fps = f"decode {decoded / span:.1f} fps   display {shown / span:.1f} fps   "
+        self.last = (now, counters)
+
+        lines = [f"{fps}{snapshot['rates']['decisions_per_minute']:.1f} decisions/min   "
+                 f"dropped {counters.get('frames_dropped', 0)}"]
+        for name, summary in snapshot["stages"].items():
+            lines.append(f"{name:<16} n={summary['count']:<6} p50={summary['p50_ms']:>7.1f}ms "
+                         f"p95={summary['p95_ms']:>7.1f}ms max={summary['max_ms']:>8.1f}ms")
+        for name, gauge in snapshot["gauges"].items():
+            lines.append(f"{name:<16} now={gauge['last']:<6} max={gauge['max']}")
+        self.label.config(text="\n".join(lines))
+        self.label.after(self.interval_ms, self.refresh)
+
+
+def from_environment():
+    value = os.environ.get(METRICS_ENV, "").strip()
+    enabled = value not in ("", "0")
+    export_path = value if enabled and value != "1" else None
+    overlay = os.environ.get(OVERLAY_ENV, "").strip() not in ("", "0")
+    return Metrics(enabled=enabled or overlay, export_path=export_path, overlay=overlay)
+
+
+# Shared by every sorter, worker thread and the launcher
+metrics = from_environment()
@@ -0,0 +1,269 @@
+import errno
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from medisort.metrics import metrics
+from medisort.scan import sidecars
+from medisort.transfer import TransferEngine
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+STATE_DIR = ".medisort"
+LOCK_TIMEOUT = 10.0 # Seconds to wait for another executor on the same journal to finish
+# Errors meaning "held by someone else", as opposed to a filesystem without locks
+LOCK_BUSY = {errno.EAGAIN, errno.EWOULDBLOCK, errno.EACCES, errno.EDEADLK}
+
+
+class JournalBusy(OSError):
+    """Another sorter, here or on another machine, is still working from the same journal."""
+
+
+def journal_path_for(folder_path, operator=None):
+    # In a shared folder each operator appends to their own journal; appends from
+    # several machines to one file are not atomic on network filesystems
+    name = f"journal-{operator}.jsonl" if operator else "journal.jsonl"
+    return os.path.join(folder_path, STATE_DIR, name)
+
+
+def same_file_contents(a, b):
+    # Copies keep the source mtime, so a finished copy matches its source on size and mtime
+    sa, sb = os.stat(a), os.stat(b)
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+
+def read_journal(path):
+    """Returns the journal records in order, skipping a torn final line."""
+    records = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def lock_journal(journal_path, timeout=LOCK_TIMEOUT):
+    """Takes the exclusive lock that lets one executor at a time act on a journal. Returns the
+    open lock file, which holds the lock until it is closed. Raises JournalBusy on timeout."""
+    lock = open(journal_path + ".lock", "a+b")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+            return lock
+        except OSError as e:
+            if e.errno not in LOCK_BUSY:
+                # A file server without locks: the journal is used unguarded, as before locking existed
+                metrics.count("journal_unlocked")
+                return lock
+            if time.monotonic() >= deadline:
+                lock.close()
+                raise JournalBusy(errno.EBUSY, "This folder is still being sorted (or finishing its moves) "
+                                               "by another medisort window or machine", journal_path)
+        time.sleep(0.1)
+
+
+class MoveExecutor:
+    """Moves files on a background pool and journals every decision before acting on it.
+
+    An executor holds an exclusive lock on its journal from start-up until close(), so no
+    other executor can recover, and so repeat, moves that are still in progress.
+    """
+
+    def __init__(self, folder_path, workers=2, journal_path=None, verify=False, ignore_vanished=False,
+                 lock_timeout=LOCK_TIMEOUT):
+        self.folder_path = folder_path
+        # In a shared folder a source that has disappeared was taken by someone else, not lost
+        self.ignore_vanished = ignore_vanished
+        self.journal_path = journal_path or journal_path_for(folder_path)
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        self.journal_lock = lock_journal(self.journal_path, lock_timeout)
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.failed = []
+        self.held = {} # Move id -> (name, tier) for decisions journaled but not yet started
+        # Files whose move was resumed from an earlier session; sorters must not offer them again
+        self.recovered = set()
+
+        try:
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+        except BaseException:
+            self.journal_lock.close()
+            raise
+        self.engine = TransferEngine(verify=verify)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="medisort-move")
+        try:
+            self.recover()
+        except BaseException:
+            # Moves recovery already started still finish; the journal and its lock are not left open
+            self.close(wait=True)
+            raise
+
+    def submit(self, name, tier):
+        """Queues name to be moved into tier. Returns once the decision is safely on disk."""
+        move_id = uuid.uuid4().hex
+        with metrics.time("journal"):
+            self._record({"op": "queued", "id": move_id, "file": name, "tier": tier, "time": time.time()})
+        with self.lock:
+            self.pending += 1
+            metrics.gauge("moves_pending", self.pending)
+        self.executor.submit(self._run, move_id, name, tier)
+        return move_id
+
+    def submit_batch(self, items):
+        """Queues several (name, tier) moves behind a single journal flush. Returns their ids."""
+        move_ids = self.hold(items)
+        self.release(move_ids)
+        return move_ids
+
+    def hold(self, items):
+        """Journals several (name, tier) decisions behind a single flush but moves nothing yet.
+
+        Returns their ids, for release() to start the moves or cancel() to take the decisions back.
+        Held moves that are neither are carried out by the next session's recovery.
+        """
+        now = time.time()
+        moves = [(uuid.uuid4().hex, name, tier) for name, tier in items]
+        with metrics.time("journal"):
+            self._record(*({"op": "queued", "id": move_id, "file": name, "tier": tier, "time": now}
+                           for move_id, name, tier in moves))
+        with self.lock:
+            self.held.update((move_id, (name, tier)) for move_id, name, tier in moves)
+        return [move[0] for move in moves]
+
+    def release(self, move_ids):
+        """Starts held moves."""
+        with self.lock:
+            moves = [(move_id,) + self.held.pop(move_id) for move_id in move_ids if move_id in self.held]
+            self.pending += len(moves)
+            metrics.gauge("moves_pending", self.pending)
+        for move in moves:
+            self.executor.submit(self._run, *move)
+
+    def cancel(self, move_ids):
+        """Takes back held moves, journaling that they are undone so recovery leaves them alone."""
+        with self.lock:
+            move_ids = [move_id for move_id in move_ids if self.held.pop(move_id, None) is not None]
+        if move_ids:
+            now = time.time()
+            self._record(*({"op": "undone", "id": move_id, "time": now} for move_id in move_ids))
+
+    def counts(self):
+        with self.lock:
+            return self.pending, len(self.failed)
+
+    def failure_summary(self, limit=10):
+        with self.lock:
+            failed = list(self.failed)
+        if not failed:
+            return None
+        lines = [f"{name}: {error}" for name, error in failed[:limit]]
+        if len(failed) > limit:
+            lines.append(f"...and {len(failed) - limit} more")
+        return f"{len(failed)} file(s) could not be moved:\n\n" + "\n".join(lines)
+
+    def close(self, wait=False):
+        """Lets queued moves finish, then closes the journal and releases its lock. With wait,
+        returns once that is done; otherwise it happens on a background thread."""
+        if not wait:
+            threading.Thread(target=self.close, args=(True,), name="medisort-close").start()
+            return
+        self.executor.shutdown(wait=True)
+        self.engine.close(wait=True)
+        with self.lock:
+            self.journal.close()
+        self.journal_lock.close()
+
+    def recover(self):
+        """Re-queues decisions from a previous session that never finished."""
+        unfinished = {}
+        for record in read_journal(self.journal_path):
+            if record.get("op") == "queued":
+                unfinished[record["id"]] = record
+            elif record.get("op") in ("done", "failed", "undone"):
+                unfinished.pop(record.get("id"), None)
+
+        for move_id, record in unfinished.items():
+            src, dst = self._paths(record["file"], record["tier"])
+            if not os.path.exists(src) and os.path.exists(dst):
+                self._record({"op": "done", "id": move_id, "time": time.time()})
+                continue
+            if os.path.exists(src) and os.path.exists(dst) and same_file_contents(src, dst):
+                # Crashed between swapping the copy in and unlinking the source
+                os.unlink(src)
+                self._record({"op": "done", "id": move_id, "time": time.time()})
+                continue
+            with self.lock:
+                self.pending += 1
+            self.recovered.add(record["file"])
+            self.executor.submit(self._run, move_id, record["file"], record["tier"])
+
+    def _run(self, move_id, name, tier):
+        src, dst = self._paths(name, tier)
+        started = time.perf_counter()
+        try:
+            # Looked up first: whether a stem.xmp belongs to this file depends on it still being here
+            extras = sidecars(src)
+            # Cross-device copies finish later, once the engine has synced their batch
+            self.engine.move(src, dst, lambda error: self._finish(move_id, name, tier, error, started, extras))
+        except Exception as e:
+            self._finish(move_id, name, tier, e, started)
+
+    def _finish(self, move_id, name, tier, error, started, extras=()):
+        try:
+            if error is None:
+                metrics.record("move", time.perf_counter() - started)
+                self._record({"op": "done", "id": move_id, "time": time.time()})
+                metrics.count("moves_done")
+                self._move_sidecars(extras, os.path.dirname(self._paths(name, tier)[1]))
+            else:
+                self._record({"op": "failed", "id": move_id, "error": str(error), "time": time.time()})
+                vanished = isinstance(error, FileNotFoundError) and not os.path.exists(self._paths(name, tier)[0])
+                metrics.count("moves_vanished" if vanished else "moves_failed")
+                if not (vanished and self.ignore_vanished):
+                    with self.lock:
+                        self.failed.append((name, str(error)))
+        finally:
+            with self.lock:
+                self.pending -= 1
+                metrics.gauge("moves_pending", self.pending)
+
+    def _move_sidecars(self, paths, dst_dir):
+        """Moves sidecar files after their media file, once it has safely arrived."""
+        for path in paths:
+            def done(error, path=path):
+                metrics.count("sidecars_failed" if error else "sidecars_moved")
+                if error is not None:
+                    with self.lock:
+                        self.failed.append((os.path.relpath(path, self.folder_path), str(error)))
+            try:
+                self.engine.move(path, os.path.join(dst_dir, os.path.basename(path)), done)
+            except Exception as e:
+                done(e)
+
+    def _paths(self, name, tier):
+        return os.path.join(self.folder_path, name), os.path.join(self.folder_path, tier, name)
+
+    def _record(self, *records):
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self.lock:
+            self.journal.write(lines)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
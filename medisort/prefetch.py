@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from medisort.metrics import metrics
+from medisort.preview import PREVIEW_SIZE, PYRAMID_LEVELS, decode_preview
+
+
+def preview_kind(size):
+    return f"image-{size[0]}x{size[1]}"
+
+
+class ImagePrefetcher:
+    """Decodes the next few images on a worker pool into a memory-capped cache."""
+
+    def __init__(self, folder_path, depth=4, max_bytes=256 * 1024 * 1024, workers=2, size=PREVIEW_SIZE, cache=None):
+        self.folder_path = folder_path
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.size = size
+        self.cache = cache
+
+        # Upper bound for a single prepared preview (RGBA at full preview size)
+        self.entry_bytes = size[0] * size[1] * 4
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="medisort-prefetch")
+
+    def schedule(self, upcoming):
+        """Starts decoding the given names (nearest first) and drops everything else."""
+        wanted = list(upcoming)[:self.depth]
+        with self.lock:
+            for name in list(self.entries):
+                if name not in wanted:
+                    self._drop(name)
+
+            budget = self.max_bytes
+            for name in wanted:
+                future = self.entries.get(name)
+                if future is None:
+                    if budget < self.entry_bytes:
+                        break
+                    path = os.path.join(self.folder_path, name)
+                    future = self.executor.submit(self.load, path, self.size)
+                    self.entries[name] = future
+                budget -= self._cost(future)
+
+    def set_size(self, size):
+        """Prepares previews at size from now on, dropping the ones prepared at the old size."""
+        with self.lock:
+            if size == self.size:
+                return
+            self.size = size
+            self.entry_bytes = size[0] * size[1] * 4
+            for name in list(self.entries):
+                self._drop(name)
+
+    def take(self, name, size=None):
+        """Returns a future for the prepared preview, decoding it now if it was never scheduled.
+
+        With a size other than the current one, the preview is prepared at that size instead.
+        """
+        future = None
+        if size is None or size == self.size:
+            with self.lock:
+                future = self.entries.pop(name, None)
+        if future is None:
+            path = os.path.join(self.folder_path, name)
+            future = self.executor.submit(self.load, path, size or self.size)
+        return future
+
+    def load(self, path, size=None):
+        size = size or self.size
+        if self.cache is not None:
+            with metrics.time("cache_get"):
+                img = self.cached(path, size)
+            if img is not None:
+                metrics.count("cache_hits")
+                return img
+            metrics.count("cache_misses")
+        img = decode_preview(path, size)
+        if self.cache is not None:
+            with metrics.time("cache_put"):
+                self.cache.put(path, preview_kind(size), img)
+        return img
+
+    def cached(self, path, size):
+        """Returns the cached preview at size, or scales one down from a larger cached pyramid level."""
+        larger = [level for level in PYRAMID_LEVELS if level[0] > size[0] and level[1] > size[1]]
+        for level in [size] + larger:
+            img = self.cache.get(path, preview_kind(level))
+            if img is not None:
+                if level != size:
+                    img.thumbnail(size)
+                return img
+        return None
+
+    def discard(self, name):
+        with self.lock:
+            self._drop(name)
+
+    def close(self):
+        with self.lock:
+            for name in list(self.entries):
+                self._drop(name)
+        self.executor.shutdown(wait=False)
+
+    def _drop(self, name):
+        future = self.entries.pop(name, None)
+        if future is not None:
+            future.cancel()
+
+    def _cost(self, future):
+        if future.done() and not future.cancelled() and future.exception() is None:
+            img = future.result()
+            return img.width * img.height * len(img.getbands())
+        return self.entry_bytes
@@ -0,0 +1,172 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from medisort.bands import image_bands
+from medisort.exif import TiffReader, embedded_jpegs
+from medisort.metrics import metrics
+from medisort.raw import RAW_ORIENTATION, SIDEWAYS, UnsupportedImage, open_image, upright
+
+PREVIEW_SIZE = (854, 480)
+
+# Bounding boxes previews are decoded and cached at; the display picks the smallest that covers it
+PYRAMID_LEVELS = ((854, 480), (1280, 720), (1920, 1080), (2560, 1440), (3840, 2160))
+
+# Hard ceiling on the pixel buffer a single preview decode may allocate
+MAX_DECODE_BYTES = 64 * 1024 * 1024
+
+# The scales a JPEG decoder can downscale by in the DCT domain
+JPEG_SCALES = (1, 2, 4, 8)
+
+# Bytes per pixel of Pillow's in-memory storage for each mode
+MODE_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+class PreviewTooLarge(PreviewUnavailable):
+    pass
+
+
+def decode_preview(path, size=PREVIEW_SIZE, max_bytes=MAX_DECODE_BYTES):
+    """Decodes an image down to fit within size using the cheapest path its format allows."""
+    try:
+        img = open_image(path)
+    except UnsupportedImage as e:
+        raise PreviewUnavailable(str(e)) from e
+    orientation = img.info.get(RAW_ORIENTATION, 1)
+    if orientation in SIDEWAYS:
+        size = size[::-1]
+    with img:
+        return upright(decode_opened(path, img, size, max_bytes), orientation)
+
+
+def decode_opened(path, img, size, max_bytes):
+    """Decodes an already opened image, cheapest path first."""
+    with metrics.time("embedded_preview"):
+        embedded = embedded_preview(img, size)
+    if embedded is not None:
+        return embedded
+
+    if img.format in ("JPEG", "MPO"):
+        # DCT-domain downscale: the decoder only produces 1/2, 1/4 or 1/8 of the pixels
+        img.draft(None, draft_box(img, size, max_bytes))
+
+    if decode_bytes(img) > max_bytes:
+        with metrics.time("decode_banded"):
+            return decode_by_bands(path, img, size, max_bytes)
+
+    with metrics.time("decode"):
+        img.load()
+    with metrics.time("resize"):
+        img.thumbnail(size)
+    return img
+
+
+def embedded_preview(img, size):
+    """Returns the embedded EXIF/MPO preview if it is large enough to stand in for the full image."""
+    candidates = []
+
+    if img.format == "MPO" and getattr(img, "n_frames", 1) > 1:
+        candidates.append(("frame", 1))
+
+    exif = img.info.get("exif")
+    if exif and exif.startswith(b"Exif\0\0"):
+        try:
+            reader = TiffReader(io.BytesIO(exif), base=6)
+            for offset, length in embedded_jpegs(reader, reader.ifds()):
+                candidates.append(("jpeg", exif[offset:offset + length]))
+        except (ValueError, EOFError):
+            pass
+
+    for kind, value in candidates:
+        try:
+            if kind == "frame":
+                img.seek(value)
+                preview = img.copy() if preview_fits(img.size, img, size) else None
+                img.seek(0)
+            else:
+                preview = Image.open(io.BytesIO(value))
+                if not preview_fits(preview.size, img, size):
+                    preview = None
+            if preview is not None:
+                preview.draft(None, size)
+                preview.thumbnail(size)
+                preview.load()
+                return preview
+        except (OSError, ValueError, EOFError):
+            continue
+    return None
+
+
+def preview_fits(preview_size, img, size):
+    target_w, target_h = fit_size(img.size, size)
+    same_aspect = abs(preview_size[0] / preview_size[1] - img.width / img.height) < 0.02
+    return same_aspect and preview_size[0] >= target_w and preview_size[1] >= target_h
+
+
+def display_box(widget, default=PREVIEW_SIZE, padding=8):
+    """Returns the size previews should be shown at in widget: its real size once it is on
+    screen, before that the default scaled up for high-DPI displays."""
+    width, height = widget.winfo_width(), widget.winfo_height()
+    if width > padding + 1 and height > padding + 1:
+        return width - padding, height - padding
+    scale = max(1.0, widget.winfo_fpixels("1i") / 96)
+    return round(default[0] * scale), round(default[1] * scale)
+
+
+def pyramid_level(size):
+    """Returns the smallest pyramid level covering size, or the largest level."""
+    for level in PYRAMID_LEVELS:
+        if level[0] >= size[0] and level[1] >= size[1]:
+            return level
+    return PYRAMID_LEVELS[-1]
+
+
+def fit_size(source_size, size):
+    scale = min(size[0] / source_size[0], size[1] / source_size[1], 1)
+    return max(1, round(source_size[0] * scale)), max(1, round(source_size[1] * scale))
+
+
+def draft_box(img, size, max_bytes):
+    """Returns the box to draft a JPEG to: size, or a smaller one if the scale size needs would
+    not fit in max_bytes. The largest levels of a big photo then come out a little under size."""
+    scale = min(img.width // size[0], img.height // size[1])
+    scale = max(s for s in JPEG_SCALES if s <= scale) if scale >= 1 else 1
+    while scale < JPEG_SCALES[-1] and \
+            -(-img.width // scale) * -(-img.height // scale) * MODE_BYTES.get(img.mode, 4) > max_bytes:
+        scale *= 2
+    return max(1, img.width // scale), max(1, img.height // scale)
+
+
+def decode_bytes(img):
+    return img.width * img.height * MODE_BYTES.get(img.mode, 4)
+
+
+def decode_by_bands(path, img, size, max_bytes):
+    """Decodes an image a horizontal band at a time, downscaling each band as it goes."""
+    bands = image_bands(path, img, img.width * MODE_BYTES.get(img.mode, 4), max_bytes)
+    if bands is None:
+        raise PreviewTooLarge(f"{img.width}x{img.height} exceeds the preview memory limit")
+    target = fit_size(img.size, size)
+    scale_y = target[1] / img.height
+
+    result = Image.new(img.mode, target)
+    if img.palette is not None:
+        result.putpalette(img.getpalette())
+    for band_top, band in bands:
+        top = round(band_top * scale_y)
+        bottom = max(top + 1, round((band_top + band.height) * scale_y))
+        result.paste(band.resize((target[0], bottom - top), Image.BOX), (0, top))
+    if "transparency" in img.info:
+        result.info["transparency"] = img.info["transparency"]
+    return result
+
+
+def placeholder_preview(message, size=PREVIEW_SIZE):
+    """Builds a neutral preview card for files that cannot be previewed."""
+    img = Image.new("RGB", size, (52, 58, 64))
+    draw = ImageDraw.Draw(img)
+    draw.multiline_text((24, size[1] // 2 - 20), message, fill=(233, 236, 239))
+    return img
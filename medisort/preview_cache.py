@@ -0,0 +1,135 @@
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from PIL import Image
+
+
+def default_cache_dir():
+    """Returns the per-user cache directory, honouring MEDISORT_CACHE_DIR."""
+    if os.environ.get("MEDISORT_CACHE_DIR"):
+        return os.environ["MEDISORT_CACHE_DIR"]
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "medisort")
+
+
+class PreviewCache:
+    """Stores ready-to-display previews in a single SQLite file, evicting least recently used entries."""
+
+    def __init__(self, cache_dir=None, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, "previews.sqlite3"), check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS previews ("
+            " path TEXT NOT NULL, kind TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " data BLOB NOT NULL, bytes INTEGER NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (path, kind))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS previews_last_used ON previews (last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM previews").fetchone()[0]
+
+    def get(self, path, kind):
+        """Returns the cached preview for path, or None if it is missing or the file changed since."""
+        key = self._key(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        with self.lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT data FROM previews WHERE path = ? AND kind = ? AND size = ? AND mtime_ns = ?",
+                    (key, kind, st.st_size, st.st_mtime_ns),
+                ).fetchone()
+                if row is None:
+                    return None
+                self.conn.execute("UPDATE previews SET last_used = ? WHERE path = ? AND kind = ?", (time.time(), key, kind))
+                self.conn.commit()
+            except sqlite3.Error:
+                return None
+
+        img = Image.open(io.BytesIO(row[0]))
+        img.load()
+        return img
+
+    def has(self, path, kind):
+        """Returns True if an up-to-date preview is stored, without decoding it."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        with self.lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT 1 FROM previews WHERE path = ? AND kind = ? AND size = ? AND mtime_ns = ?",
+                    (self._key(path), kind, st.st_size, st.st_mtime_ns),
+                ).fetchone()
+            except sqlite3.Error:
+                return False
+        return row is not None
+
+    def put(self, path, kind, img):
+        key = self._key(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+
+        buf = io.BytesIO()
+        if img.mode in ("RGB", "L"):
+            img.save(buf, "JPEG", quality=90)
+        else:
+            img.save(buf, "PNG", compress_level=1)
+        data = buf.getvalue()
+
+        with self.lock:
+            try:
+                old = self.conn.execute("SELECT bytes FROM previews WHERE path = ? AND kind = ?", (key, kind)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO previews (path, kind, size, mtime_ns, data, bytes, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, st.st_size, st.st_mtime_ns, data, len(data), time.time()),
+                )
+                total = self.total_bytes + len(data) - (old[0] if old else 0)
+                if total > self.max_bytes:
+                    total = self._evict(total)
+                self.conn.commit()
+                self.total_bytes = total
+            except sqlite3.Error:
+                # The cache is best effort; a locked or full disk must not break sorting
+                self.conn.rollback()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _evict(self, total):
+        # Trim to 90% so a full cache does not evict on every insert
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT path, kind, bytes FROM previews ORDER BY last_used").fetchall()
+        doomed = []
+        for path, kind, size in rows:
+            if total <= target:
+                break
+            doomed.append((path, kind))
+            total -= size
+        self.conn.executemany("DELETE FROM previews WHERE path = ? AND kind = ?", doomed)
+        return total
+
+    def _key(self, path):
+        return os.path.normcase(os.path.abspath(path))
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from medisort.metrics import metrics
+from medisort.preview import fit_size
+from medisort.preview_cache import default_cache_dir
+
+PROXY_SIZE = (854, 480)
+PROXY_FOURCC = "mp4v" # MPEG-4 Part 2: every OpenCV build can write it and it decodes cheaply
+PART_SUFFIX = ".part.mp4" # VideoWriter picks the container from the extension
+# Codecs too expensive to decode at full speed, as OpenCV reports their FourCC
+HEAVY_CODECS = {"hev1", "hvc1", "hevc", "apcn", "apch", "apcs", "apco", "ap4h", "ap4x"}
+# Anything larger than this is proxied whatever its codec
+MAX_DIRECT_PIXELS = 1920 * 1080
+CPU_BUDGET = 0.5 # Share of the cores the encoders may use
+MAX_CACHE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def proxy_dir(cache_dir=None):
+    return os.path.join(cache_dir or default_cache_dir(), "proxies")
+
+
+def fourcc_name(cap):
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((code >> shift) & 0xFF) for shift in (0, 8, 16, 24)).lower()
+
+
+def is_heavy(cap):
+    width, height = cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    return fourcc_name(cap) in HEAVY_CODECS or width * height > MAX_DIRECT_PIXELS
+
+
+def lower_priority():
+    """Worker initializer: one decoder thread per process, below the priority of the sorter itself."""
+    cv2.setNumThreads(1)
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+def make_proxy(src, dst, size=PROXY_SIZE):
+    """Worker: transcodes src to a small proxy at dst. Returns dst, or None if src plays fine as it is."""
+    cap = cv2.VideoCapture(src)
+    writer = None
+    part = dst[:-len(".mp4")] + PART_SUFFIX
+    try:
+        if not cap.isOpened():
+            raise OSError(f"Could not open video: {src}")
+        if not is_heavy(cap):
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if not 1 <= fps <= 240:
+            fps = 30.0
+        source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        # Codecs want even dimensions
+        width, height = fit_size(source_size, size)
+        frame_size = (width - width % 2 or 2, height - height % 2 or 2)
+        writer = cv2.VideoWriter(part, cv2.VideoWriter_fourcc(*PROXY_FOURCC), fps, frame_size)
+        if not writer.isOpened():
+            raise OSError(f"Could not write proxy: {part}")
+
+        raw, small = None, None
+        while True:
+            ok, raw = cap.read(raw)
+            if not ok:
+                break
+            small = cv2.resize(raw, frame_size, dst=small, interpolation=cv2.INTER_AREA)
+            writer.write(small)
+        writer.release()
+        writer = None
+        os.replace(part, dst)
+        return dst
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        if os.path.exists(part):
+            os.unlink(part)
+
+
+class ProxyManager:
+    """Transcodes upcoming heavy videos (4K, HEVC, ProRes) into small proxies in the cache directory.
+
+    Encoding runs in a low-priority process pool sized to a share of the cores. Proxies are
+    keyed by the source's path, size and mtime, so an edited file gets a fresh one; the cache
+    is trimmed to max_bytes, least recently played first. Only playback uses a proxy.
+    """
+
+    def __init__(self, folder_path, cache_dir=None, depth=3, cpu_budget=CPU_BUDGET, max_bytes=MAX_CACHE_BYTES,
+                 size=PROXY_SIZE):
+        self.folder_path = folder_path
+        self.cache_dir = proxy_dir(cache_dir)
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.size = size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.jobs = {} # Proxy path -> future
+        self.skipped = set() # Proxy paths of sources that need none or could not be converted
+        self.lock = threading.Lock()
+        workers = max(1, int((os.cpu_count() or 1) * cpu_budget))
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=lower_priority)
+        threading.Thread(target=self.trim, daemon=True).start()
+
+    def schedule(self, upcoming):
+        """Starts proxies for the given names (nearest first) and cancels those no longer upcoming."""
+        wanted = {}
+        for name in list(upcoming)[:self.depth]:
+            path = self.proxy_path(name)
+            if path is not None and path not in self.skipped and not os.path.exists(path):
+                wanted[path] = name
+        with self.lock:
+            for path in list(self.jobs):
+                # One already encoding is left to finish; the proxy is kept for the next visit
+                if path not in wanted and self.jobs[path].cancel():
+                    del self.jobs[path]
+            for path, name in wanted.items():
+                if path not in self.jobs:
+                    future = self.executor.submit(make_proxy, os.path.join(self.folder_path, name), path, self.size)
+                    future.add_done_callback(lambda done, path=path, started=time.monotonic():
+                                             self._finished(path, done, started))
+                    self.jobs[path] = future
+
+    def playback_path(self, name):
+        """Returns the proxy for name if it is ready, else the original file."""
+        path = self.proxy_path(name)
+        if path is not None and os.path.exists(path):
+            try:
+                os.utime(path) # Marks it recently used for trim()
+            except OSError:
+                pass
+            return path
+        return os.path.join(self.folder_path, name)
+
+    def proxy_path(self, name):
+        try:
+            st = os.stat(os.path.join(self.folder_path, name))
+        except OSError:
+            return None
+        source = os.path.normcase(os.path.abspath(os.path.join(self.folder_path, name)))
+        key = hashlib.sha1(f"{source}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8", "surrogateescape"))
+        return os.path.join(self.cache_dir, key.hexdigest() + ".mp4")
+
+    def trim(self):
+        """Deletes the least recently played proxies until the cache fits in max_bytes."""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".mp4") and not entry.name.endswith(PART_SUFFIX):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                continue
+
+    def close(self):
+        with self.lock:
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs.clear()
+        self.executor.shutdown(wait=False)
+
+    def _finished(self, path, future, started):
+        with self.lock:
+            if self.jobs.get(path) is future:
+                del self.jobs[path]
+        if future.cancelled():
+            return
+        if future.exception() is not None or future.result() is None:
+            # Playback falls back to the original, as it would without proxies
+            self.skipped.add(path)
+            metrics.count("proxies_failed" if future.exception() is not None else "proxies_not_needed")
+            return
+        metrics.record("proxy_encode", time.monotonic() - started)
+        metrics.count("proxies_made")
+        self.trim()
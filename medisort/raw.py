@@ -0,0 +1,171 @@
+import io
+import os
+import struct
+
+from PIL import Image
+
+from medisort.exif import JPEG_INTERCHANGE_FORMAT, JPEG_INTERCHANGE_FORMAT_LENGTH, MAX_IFDS, TiffReader
+from medisort.metrics import metrics
+from medisort.scan import HEIF_EXTENSIONS, RAW_EXTENSIONS
+
+COMPRESSION = 0x0103
+STRIP_OFFSETS = 0x0111
+ORIENTATION = 0x0112
+STRIP_BYTE_COUNTS = 0x0117
+SUB_IFDS = 0x014A
+EXIF_IFD = 0x8769
+JPEG_COMPRESSIONS = (6, 7)
+
+# Read from the start of each candidate to reach its frame header; an EXIF segment may come first
+HEADER_BYTES = 128 * 1024
+
+# Start-of-frame markers. The lossless ones (SOF3, 7, 11, 15) hold the sensor data itself, not a preview
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+LOSSLESS_MARKERS = {0xC3, 0xC7, 0xCB, 0xCF}
+
+# Set in the info of an opened RAW preview: the EXIF orientation still to be applied after decoding
+RAW_ORIENTATION = "medisort_orientation"
+TRANSPOSES = {
+    2: Image.FLIP_LEFT_RIGHT, 3: Image.ROTATE_180, 4: Image.FLIP_TOP_BOTTOM, 5: Image.TRANSPOSE,
+    6: Image.ROTATE_270, 7: Image.TRANSVERSE, 8: Image.ROTATE_90,
+}
+SIDEWAYS = (5, 6, 7, 8)
+
+heif_registered = None
+
+
+class UnsupportedImage(OSError):
+    """A file medisort lists as an image but cannot decode in this installation."""
+
+
+def jpeg_frame(data):
+    """Returns (width, height, lossless) from the frame header of a JPEG stream, or None."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF: # Fill byte
+            pos += 1
+            continue
+        if marker in SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height, marker in LOSSLESS_MARKERS
+        pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    return None
+
+
+def raw_ifds(reader):
+    """Returns the tags of every IFD a RAW file may keep a preview in: the main chain, SubIFDs and the EXIF IFD."""
+    found = []
+    try:
+        for tags in reader.ifds():
+            found.append(tags)
+    except (ValueError, struct.error):
+        pass
+
+    pending, seen = list(found), set()
+    while pending and len(found) < MAX_IFDS:
+        tags = pending.pop()
+        for offset in tags.get(SUB_IFDS, ()) + tags.get(EXIF_IFD, ())[:1]:
+            if offset in seen:
+                continue
+            seen.add(offset)
+            try:
+                child, _ = reader.read_ifd(offset)
+            except (ValueError, struct.error):
+                continue
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def preview_candidates(ifds):
+    """Returns (offset, length) of every JPEG stream the IFDs point at, as a thumbnail or as a single strip."""
+    candidates = set()
+    for tags in ifds:
+        offset, length = tags.get(JPEG_INTERCHANGE_FORMAT), tags.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+        if offset and length and length[0] > 0:
+            candidates.add((offset[0], length[0]))
+        strips, counts = tags.get(STRIP_OFFSETS), tags.get(STRIP_BYTE_COUNTS)
+        if tags.get(COMPRESSION, (0,))[0] in JPEG_COMPRESSIONS and strips and counts and len(strips) == 1:
+            candidates.add((strips[0], counts[0]))
+    return candidates
+
+
+def largest_preview(fp):
+    """Finds the largest lossy JPEG embedded in a TIFF-based RAW file.
+
+    Returns (offset, length, orientation), or None. Only IFDs and frame headers are read.
+    """
+    reader = TiffReader(fp)
+    ifds = raw_ifds(reader)
+    best, best_pixels = None, 0
+    for offset, length in preview_candidates(ifds):
+        fp.seek(offset)
+        frame = jpeg_frame(fp.read(min(length, HEADER_BYTES)))
+        if frame is None or frame[2]:
+            continue
+        if frame[0] * frame[1] > best_pixels:
+            best, best_pixels = (offset, length), frame[0] * frame[1]
+    if best is None:
+        return None
+    orientation = ifds[0].get(ORIENTATION, (1,))[0] if ifds else 1
+    return best + (orientation,)
+
+
+def open_raw_preview(path):
+    """Opens the largest JPEG preview embedded in a RAW file without touching the sensor data.
+
+    The image is not decoded yet, so draft() still applies. Its EXIF orientation is left in
+    info[RAW_ORIENTATION]; the preview itself is usually stored unrotated.
+    """
+    with metrics.time("raw_parse"):
+        with open(path, "rb") as fp:
+            try:
+                found = largest_preview(fp)
+            except (ValueError, struct.error, EOFError):
+                found = None
+            if found is None:
+                raise UnsupportedImage(f"No embedded preview in {os.path.basename(path)}")
+            offset, length, orientation = found
+            fp.seek(offset)
+            data = fp.read(length)
+    img = Image.open(io.BytesIO(data))
+    img.info[RAW_ORIENTATION] = orientation
+    return img
+
+
+def register_heif():
+    """Registers the pillow-heif opener the first time it is needed. Returns whether it is installed."""
+    global heif_registered
+    if heif_registered is None:
+        try:
+            from pillow_heif import register_heif_opener
+        except ImportError:
+            heif_registered = False
+        else:
+            register_heif_opener()
+            heif_registered = True
+    return heif_registered
+
+
+def open_image(path):
+    """Image.open for every image type medisort lists: RAW files open as their embedded preview,
+    HEIC/HEIF through the optional pillow-heif plugin."""
+    lower = path.lower()
+    if lower.endswith(RAW_EXTENSIONS):
+        return open_raw_preview(path)
+    if lower.endswith(HEIF_EXTENSIONS) and not register_heif():
+        raise UnsupportedImage("HEIC/HEIF previews need the pillow-heif package (pip install pillow-heif)")
+    return Image.open(path)
+
+
+def upright(img, orientation):
+    """Applies an EXIF orientation to a decoded image."""
+    transpose = TRANSPOSES.get(orientation)
+    return img.transpose(transpose) if transpose is not None else img
@@ -0,0 +1,333 @@
+import fnmatch
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from medisort.catalog import media_kind, read_dimensions
+from medisort.exif import TiffReader
+from medisort.metrics import metrics
+from medisort.mover import STATE_DIR
+from medisort.raw import open_image, raw_ifds
+from medisort.scan import RAW_EXTENSIONS
+
+IMAGE_WIDTH = 0x0100
+IMAGE_LENGTH = 0x0101
+MAKE = 0x010F
+MODEL = 0x0110
+DATE_TIME = 0x0132
+EXIF_IFD = 0x8769
+DATE_TIME_ORIGINAL = 0x9003
+PIXEL_X_DIMENSION = 0xA002
+PIXEL_Y_DIMENSION = 0xA003
+
+NUMBER_FIELDS = {"width", "height", "pixels", "size", "duration"}
+TEXT_FIELDS = {"name", "ext", "camera_make", "camera_model", "date", "mtime"}
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "contains": lambda a, b: b.lower() in a.lower(),
+    "matches": lambda a, b: fnmatch.fnmatch(a.lower(), b.lower()),
+}
+TEXT_OPERATORS = {"contains", "matches"}
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+CHUNK_SIZE = 64 # Files per worker task
+
+
+class RuleError(Exception):
+    pass
+
+
+class Rule:
+    def __init__(self, name, tier, kind, conditions):
+        self.name = name
+        self.tier = tier
+        self.kind = kind # "image", "video" or None for both
+        self.conditions = conditions # [(field, operator, value)]
+
+    def matches(self, header):
+        if self.kind is not None and self.kind != header["kind"]:
+            return False
+        for field, op, value in self.conditions:
+            actual = header.get(field)
+            if actual is None:
+                return False # A missing value (no EXIF date, a corrupt header) never matches
+            try:
+                if not OPERATORS[op](actual, value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+
+def parse_size(value):
+    """Accepts a byte count or a string such as "500KB" or "1.5 GB"."""
+    if isinstance(value, (int, float)):
+        return value
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*", str(value).upper())
+    if not match:
+        raise ValueError(f"not a size: {value!r}")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2).rstrip("B")]
+
+
+def parse_condition(field, op, value):
+    if field not in NUMBER_FIELDS | TEXT_FIELDS:
+        raise ValueError(f"unknown field {field!r}")
+    if op not in OPERATORS:
+        raise ValueError(f"unknown operator {op!r}")
+    if field in NUMBER_FIELDS and op in TEXT_OPERATORS:
+        raise ValueError(f"{op!r} only applies to text fields")
+    if field == "size":
+        convert = parse_size
+    elif field in NUMBER_FIELDS:
+        convert = float
+    elif field == "ext":
+        convert = lambda v: str(v).lower()
+    else:
+        convert = str
+    if op == "in":
+        if not isinstance(value, list):
+            raise ValueError("'in' needs a list")
+        return field, op, [convert(v) for v in value]
+    return field, op, convert(value)
+
+
+def load_rules(path):
+    """Reads and checks a rules file. Raises RuleError naming the offending rule."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleError(f"{path}: {e}")
+    if not isinstance(data, list):
+        raise RuleError(f"{path}: expected a list of rules")
+
+    rules = []
+    for number, entry in enumerate(data, 1):
+        where = f"{path}: rule {number}"
+        if not isinstance(entry, dict) or not isinstance(entry.get("tier"), str) or not entry["tier"].strip():
+            raise RuleError(f"{where}: every rule needs a 'tier'")
+        tier = entry["tier"].strip()
+        normalized = os.path.normpath(tier)
+        if os.path.isabs(tier) or normalized == ".." or normalized.startswith(".." + os.sep):
+            raise RuleError(f"{where}: refusing tier outside the folder: {tier}")
+        kind = entry.get("kind")
+        if kind not in (None, "image", "video"):
+            raise RuleError(f"{where}: 'kind' must be \"image\" or \"video\"")
+        when = entry.get("when")
+        if not isinstance(when, dict) or not when:
+            raise RuleError(f"{where}: 'when' must map fields to conditions")
+
+        conditions = []
+        for field, tests in when.items():
+            # A bare value is shorthand for equality
+            for op, value in (tests.items() if isinstance(tests, dict) else [("=", tests)]):
+                try:
+                    conditions.append(parse_condition(field, op, value))
+                except ValueError as e:
+                    raise RuleError(f"{where}: {e}")
+        rules.append(Rule(str(entry.get("name") or f"rule {number}"), tier, kind, conditions))
+    return rules
+
+
+def exif_text(tags, exif):
+    """Returns (make, model, date) from the main and EXIF IFD tags."""
+    def text(value):
+        if not isinstance(value, str):
+            return None
+        return value.strip("\0 ") or None
+    return text(tags.get(MAKE)), text(tags.get(MODEL)), text(exif.get(DATE_TIME_ORIGINAL) or tags.get(DATE_TIME))
+
+
+def raw_fields(path):
+    """Returns (width, height, make, model, date) from the TIFF structure of a RAW file; neither
+    the sensor data nor the embedded preview is touched. The size is that of the largest IFD."""
+    with open(path, "rb") as fp:
+        reader = TiffReader(fp)
+        ifds = raw_ifds(reader)
+        if not ifds:
+            raise ValueError("No IFDs")
+        tags, exif = ifds[0], {}
+        if EXIF_IFD in tags:
+            try:
+                exif = reader.read_ifd(tags[EXIF_IFD][0])[0]
+            except (ValueError, struct.error):
+                pass
+    sizes = [(t[IMAGE_WIDTH][0], t[IMAGE_LENGTH][0]) for t in ifds if t.get(IMAGE_WIDTH) and t.get(IMAGE_LENGTH)]
+    if not sizes and exif.get(PIXEL_X_DIMENSION) and exif.get(PIXEL_Y_DIMENSION):
+        sizes = [(exif[PIXEL_X_DIMENSION][0], exif[PIXEL_Y_DIMENSION][0])]
+    width, height = max(sizes, key=lambda size: size[0] * size[1], default=(None, None))
+    return (width, height) + exif_text(tags, exif)
+
+
+def read_header(folder_path, name):
+    """Returns the fields rules can test for one file, reading only its headers."""
+    path = os.path.join(folder_path, name)
+    st = os.stat(path)
+    kind = media_kind(name)
+    header = {
+        "kind": kind, "name": name, "ext": os.path.splitext(name)[1].lower(), "size": st.st_size,
+        "camera_make": None, "camera_model": None, "date": None,
+        "mtime": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(st.st_mtime)),
+    }
+    if kind == "image":
+        header["duration"] = None
+        if path.lower().endswith(RAW_EXTENSIONS):
+            header["width"], header["height"], make, model, date = raw_fields(path)
+        else:
+            with open_image(path) as img:
+                header["width"], header["height"] = img.width, img.height
+                try:
+                    data = img.getexif()
+                    make, model, date = exif_text(dict(data), dict(data.get_ifd(EXIF_IFD)))
+                except (OSError, ValueError, struct.error):
+                    make, model, date = None, None, None
+        header["camera_make"], header["camera_model"] = make, model
+        if date:
+            # EXIF writes "2019:07:14 10:31:02"; rules compare against "2019-07-14 10:31:02"
+            header["date"] = date[:10].replace(":", "-") + date[10:]
+    else:
+        header["width"], header["height"], header["duration"] = read_dimensions(path, kind)
+    if not header["width"]:
+        header["width"] = header["height"] = None # read_dimensions reports an unreadable file as 0x0
+    header["pixels"] = header["width"] * header["height"] if header["width"] else None
+    return header
+
+
+def evaluate_chunk(folder_path, rules, names):
+    """Worker: returns the index of the first matching rule for each name, None if none matches,
+    or -1 if the file's headers could not be read."""
+    results = []
+    for name in names:
+        try:
+            header = read_header(folder_path, name)
+        except Exception:
+            results.append(-1)
+            continue
+        results.append(next((i for i, rule in enumerate(rules) if rule.matches(header)), None))
+    return results
+
+
+class RuleRouter:
+    """Runs the rules over files streaming from a listing, ahead of the human queue.
+
+    Files are evaluated in chunks across a process pool. Each chunk's matches go to the
+    mover as one bulk move (one journal flush); the rest are yielded on, in their order.
+    Without a mover nothing is moved and the matches are only collected in planned.
+    """
+
+    def __init__(self, folder_path, rules, mover=None, catalog=None, workers=None, chunk_size=CHUNK_SIZE):
+        self.folder_path = folder_path
+        self.rules = rules
+        self.mover = mover
+        self.catalog = catalog
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.chunk_size = chunk_size
+
+        self.hits = [0] * len(rules)
+        self.examined = 0
+        self.unreadable = 0
+        self.routed = 0
+        self.planned = []
+        self.seconds = 0.0
+        self.stopping = threading.Event()
+
+    def tiers(self):
+        return {rule.tier for rule in self.rules}
+
+    def route(self, source):
+        """Yields the files of source that no rule decides, until stop() is called."""
+        started = time.monotonic()
+        in_flight = deque()
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            chunk = []
+            for name in source:
+                if self.stopping.is_set():
+                    return
+                chunk.append(name)
+                if len(chunk) < self.chunk_size:
+                    continue
+                in_flight.append((chunk, executor.submit(evaluate_chunk, self.folder_path, self.rules, chunk)))
+                chunk = []
+                # Hands results on in order as soon as they are in, keeping every worker busy meanwhile
+                while in_flight and (in_flight[0][1].done() or len(in_flight) > self.workers * 2):
+                    yield from self._collect(*in_flight.popleft())
+            if chunk:
+                in_flight.append((chunk, executor.submit(evaluate_chunk, self.folder_path, self.rules, chunk)))
+            while in_flight and not self.stopping.is_set():
+                yield from self._collect(*in_flight.popleft())
+        finally:
+            # Chunks not collected yet are dropped whole, so the report only counts files fully dealt with
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.seconds = time.monotonic() - started
+
+    def stop(self):
+        """Makes route() end at the next chunk boundary, routing nothing further."""
+        self.stopping.set()
+
+    def report(self):
+        """Returns the per-rule hit counts and totals of the run."""
+        return {
+            "rules": [{"name": rule.name, "tier": rule.tier, "hits": hits} for rule, hits in zip(self.rules, self.hits)],
+            "examined": self.examined,
+            "routed": self.routed,
+            "unmatched": self.examined - self.routed - self.unreadable,
+            "unreadable": self.unreadable,
+            "seconds": round(self.seconds, 2),
+        }
+
+    def write_report(self):
+        """Saves report() to .medisort/rules-<time>.json. Returns its path, or None if nothing was examined.
+
+        Raises OSError if the report cannot be written.
+        """
+        if not self.examined:
+            return None
+        path = os.path.join(self.folder_path, STATE_DIR, time.strftime("rules-%Y%m%d-%H%M%S.json"))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def _collect(self, chunk, future):
+        try:
+            with metrics.time("rules_wait"):
+                results = future.result()
+        except Exception:
+            # A broken pool must not hold files back from the human queue
+            results = [-1] * len(chunk)
+        self.examined += len(chunk)
+
+        routed, unmatched = {}, []
+        for name, index in zip(chunk, results):
+            if index is None:
+                unmatched.append(name)
+            elif index < 0:
+                self.unreadable += 1
+                unmatched.append(name)
+            else:
+                self.hits[index] += 1
+                routed.setdefault(self.rules[index].tier, []).append(name)
+        # The chunk's moves go out before any of its files is yielded: a consumer may stop at any yield
+        if routed:
+            moves = [(name, tier) for tier, names in routed.items() for name in names]
+            if self.mover is None:
+                self.planned.extend(moves)
+            else:
+                self.mover.submit_batch(moves)
+            if self.catalog is not None:
+                for tier, names in routed.items():
+                    self.catalog.mark_decided(names, tier)
+            self.routed += len(moves)
+            metrics.count("files_routed", len(moves))
+        yield from unmatched
@@ -0,0 +1,154 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from medisort.metrics import metrics
+
+# TIFF-based camera RAW formats; these are previewed from the JPEG the camera embeds in them
+RAW_EXTENSIONS = (".cr2", ".nef", ".nrw", ".arw", ".srw", ".dng", ".orf", ".pef")
+HEIF_EXTENSIONS = (".heic", ".heif")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp") + RAW_EXTENSIONS + HEIF_EXTENSIONS
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+SIDECAR_EXTENSIONS = (".xmp", ".thm")
+
+
+def sidecars(path):
+    """Returns the existing sidecar files (.xmp, .thm) that belong to the media file at path.
+
+    Sidecars named after the whole file (IMG_1.CR2.xmp) always belong to it; ones named after its
+    stem (IMG_1.xmp) only while no other media file shares that stem, as in a RAW+JPEG pair.
+    """
+    stem = os.path.splitext(path)[0]
+    found = [existing_variant(path + ext) for ext in SIDECAR_EXTENSIONS]
+    shared = [existing_variant(stem + ext) for ext in SIDECAR_EXTENSIONS]
+    if any(shared):
+        for ext in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS:
+            sibling = existing_variant(stem + ext)
+            if sibling and not os.path.samefile(sibling, path):
+                shared = []
+                break
+        found.extend(shared)
+    return [name for name in found if name]
+
+
+def existing_variant(path):
+    """Returns path with its extension in lower or upper case, whichever exists, or None."""
+    stem, ext = os.path.splitext(path)
+    for candidate in (stem + ext, stem + ext.upper()):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def iter_media(folder_path, extensions, recursive=False, skip_dirs=()):
+    """Yields media file paths relative to folder_path as soon as scandir reports them."""
+    pending_dirs = [""]
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        try:
+            it = os.scandir(os.path.join(folder_path, rel_dir))
+        except OSError:
+            if not rel_dir:
+                raise
+            continue
+
+        with it:
+            for entry in it:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    # scandir carries the entry type, so this normally needs no extra stat call
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not entry.name.startswith(".") and rel_path not in skip_dirs:
+                            pending_dirs.append(rel_path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file():
+                        yield rel_path
+                except OSError:
+                    continue
+
+
+class MediaQueue:
+    """Hands out media files while a background thread is still enumerating them.
+
+    With shuffle enabled, each file is drawn at random from everything found so far,
+    so random ordering never needs the full listing up front.
+    """
+
+    def __init__(self, source, shuffle=True, exclude=()):
+        self.shuffle = shuffle
+        self.exclude = exclude
+
+        self.found = [] if shuffle else deque()
+        self.ordered = deque()
+        self.finished = False
+        self.error = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._enumerate, args=(source,), daemon=True)
+        self.thread.start()
+
+    def pop(self):
+        """Returns the next file, or None if enumeration has not produced one yet."""
+        with self.lock:
+            metrics.gauge("queue_depth", len(self.ordered) + len(self.found))
+            if self.ordered:
+                return self.ordered.popleft()
+            if self.found:
+                return self._draw()
+            return None
+
+    def peek(self, count):
+        """Returns up to count upcoming files (nearest first) without consuming them."""
+        with self.lock:
+            while len(self.ordered) < count and self.found:
+                self.ordered.append(self._draw())
+            return list(self.ordered)[:count]
+
+    def unpop(self, name):
+        """Puts name back so that it is the next file handed out, e.g. after an undo."""
+        with self.lock:
+            self.ordered.appendleft(name)
+
+    def exhausted(self):
+        with self.lock:
+            return self.finished and not self.ordered and not self.found
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ordered) + len(self.found)
+
+    def close(self, wait=False):
+        """Stops enumerating. With wait, returns once the source has been let go of."""
+        self.closed = True
+        if wait:
+            self.thread.join()
+
+    def _draw(self):
+        if not self.shuffle:
+            return self.found.popleft()
+        i = random.randrange(len(self.found))
+        self.found[i], self.found[-1] = self.found[-1], self.found[i]
+        return self.found.pop()
+
+    def _enumerate(self, source):
+        started = time.perf_counter()
+        try:
+            for name in source:
+                if self.closed:
+                    break
+                if name in self.exclude:
+                    continue
+                with self.lock:
+                    self.found.append(name)
+                metrics.count("files_found")
+        except Exception as e:
+            # Rules, grouping or ranking failing too: the sorter must not report the folder as done
+            self.error = e
+        finally:
+            if hasattr(source, "close"):
+                source.close() # Lets a generator stopped early release what it holds now
+            metrics.record("enumerate", time.perf_counter() - started)
+            with self.lock:
+                self.finished = True
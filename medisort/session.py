@@ -0,0 +1,146 @@
+from tkinter import messagebox
+from medisort.catalog import open_catalog
+from medisort.claims import BATCH_SIZE, ClaimQueue, operator_name
+from medisort.hotkeys import DecisionLog
+from medisort.mover import STATE_DIR, MoveExecutor, journal_path_for
+from medisort.rules import RuleRouter
+from medisort.scan import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, MediaQueue, iter_media
+
+
+class SortSession:
+    """What every sorter does around the display: where its files come from and where its decisions go.
+
+    Owns the move executor, the catalog, rule routing, the queue of files to show and the log of
+    recent decisions. Create it before any other resource of a sorter: it raises JournalBusy if
+    another sorter is still working from the same journal.
+    """
+
+    def __init__(self, folder_path, tiers, kind, recursive=False, shared=False, rules=None):
+        self.folder_path = folder_path
+        self.tiers = tiers
+        self.kind = kind
+        self.recursive = recursive
+        self.shared = shared
+        self.queue = None
+        self.warnings = [] # Shown on the status line for the whole session
+
+        if shared:
+            # Other people sort this folder too: files are leased from a shared claims table,
+            # and the catalog (WAL-mode SQLite) is left out, since it cannot live on a network share
+            self.mover = MoveExecutor(folder_path, journal_path=journal_path_for(folder_path, operator_name()),
+                                      ignore_vanished=True)
+            self.catalog = None
+        else:
+            self.mover = MoveExecutor(folder_path)
+            self.catalog, error = open_catalog(folder_path)
+            if error is not None:
+                self.warnings.append(f"Catalog disabled, this session will not resume: {error}")
+        # Rules route files before anyone sees them, so they would move files others hold in a shared folder
+        self.router = RuleRouter(folder_path, rules, self.mover, self.catalog) if rules and not shared else None
+        # Decisions are journaled as they are made; only the moves wait out the undo window
+        self.decisions = DecisionLog(self.decide, record=self.record, revert=self.revert)
+
+    def open_queue(self, arrange=None, shuffle=True, batch_size=BATCH_SIZE):
+        """Starts listing the folder and returns the queue of files to show.
+
+        arrange(names) may reorder or filter the listing after the rules have taken their files.
+        """
+        skip_dirs = set(self.tiers) | {STATE_DIR}
+        if self.router is not None:
+            skip_dirs |= self.router.tiers()
+        if self.catalog is not None:
+            # Resumes in the order of the previous session; only changed directories are listed again
+            source = self.catalog.iter_pending(self.kind, recursive=self.recursive, skip_dirs=skip_dirs)
+        else:
+            extensions = IMAGE_EXTENSIONS if self.kind == "image" else VIDEO_EXTENSIONS
+            source = iter_media(self.folder_path, extensions, recursive=self.recursive, skip_dirs=skip_dirs)
+        if self.router is not None:
+            source = self.router.route(source)
+        if arrange is not None:
+            source = arrange(source)
+        if self.shared:
+            self.queue = ClaimQueue(self.folder_path, source, exclude=self.mover.recovered, batch_size=batch_size)
+        else:
+            self.queue = MediaQueue(source, shuffle=shuffle and self.catalog is None,
+                                    exclude=self.mover.recovered)
+        return self.queue
+
+    def record(self, item, tier, names):
+        """Journals a decision as it is made. Returns the ids of its held moves, or None."""
+        if tier is None:
+            return None
+        try:
+            return self.mover.hold([(name, tier) for name in names])
+        except Exception:
+            return None # decide() tries again and reports the error
+
+    def revert(self, move_ids):
+        if not move_ids:
+            return
+        try:
+            self.mover.cancel(move_ids)
+        except Exception as e:
+            messagebox.showerror("File Error", f"Could not journal the undo; the files may still be moved "
+                                               f"when this folder is next opened.\n\nError: {e}")
+
+    def decide(self, item, tier, names, move_ids=None):
+        """Acts on a decision once it can no longer be undone; a tier of None leaves the files in place."""
+        if tier is None:
+            if self.shared:
+                self.queue.release(names) # Someone else may sort them
+            return
+        try:
+            if move_ids:
+                self.mover.release(move_ids)
+            else:
+                self.mover.submit_batch([(name, tier) for name in names])
+            if self.catalog is not None:
+                self.catalog.mark_decided(names, tier)
+            if self.shared:
+                self.queue.complete(names)
+        except Exception as e:
+            messagebox.showerror("File Error", f"Could not move {item}" +
+                                 (f" and {len(names) - 1} other file(s)" if len(names) > 1 else "") +
+                                 f"\n\nError: {e}")
+
+    def status(self, *notes):
+        """Commits the decisions past their hold-back time and returns the status line."""
+        self.decisions.flush(expired_only=True)
+        pending, failed = self.mover.counts()
+        parts = [f"Moves pending: {pending}", f"Failed: {failed}"]
+        if self.router is not None and self.router.routed:
+            parts.append(f"Routed by rules: {self.router.routed}")
+        if self.shared and self.queue is not None and self.queue.held_elsewhere():
+            parts.append(f"Being sorted by others: {self.queue.held_elsewhere()}")
+        parts.extend(note for note in notes + tuple(self.warnings) if note)
+        return "    ".join(parts)
+
+    def close(self, window, status_label=None):
+        """Commits every held decision, stops the listing and rule routing, and waits for the
+        moves, so no later session can start on the journal while they run; then reports
+        failures, closes the catalog and saves the rules report."""
+        self.decisions.flush()
+        # Routing submits moves from the listing thread, so that thread has to end before the mover
+        if self.router is not None:
+            self.router.stop()
+        if self.queue is not None:
+            self.queue.close(wait=self.router is not None)
+        pending, _ = self.mover.counts()
+        if pending and status_label is not None:
+            status_label.config(text=f"Finishing {pending} pending move(s)...")
+            window.update_idletasks()
+        self.mover.close(wait=True)
+        failures = self.mover.failure_summary()
+        if failures:
+            messagebox.showerror("File Error", failures)
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.router is not None:
+            try:
+                report = self.router.write_report()
+            except OSError as e:
+                messagebox.showerror("Rules Report", f"Could not write the rules report.\n\nError: {e}")
+            else:
+                if report:
+                    messagebox.showinfo("Rules Report", f"The rules moved {self.router.routed} file(s).\n\n"
+                                                        f"Report saved to {report}")
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from PIL import Image, ImageDraw
+
+from medisort.preview import PREVIEW_SIZE, fit_size
+
+
+def extract_frames(path, frames, first, last, tile_size):
+    """Worker: seeks to frames first..last-1 of an evenly spaced set and returns (time_ms, rgb) tiles."""
+    cap = cv2.VideoCapture(path)
+    tiles = []
+    try:
+        if not cap.isOpened():
+            raise OSError(f"Could not open video: {path}")
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        for i in range(first, last):
+            # Sample the centre of each of the equal segments
+            position = (i + 0.5) / frames
+            if frame_count > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(position * frame_count))
+            else:
+                # Some containers do not report a frame count; fall back to a relative seek
+                cap.set(cv2.CAP_PROP_POS_AVI_RATIO, position)
+            ok, frame = cap.read()
+            if not ok:
+                tiles.append(None)
+                continue
+            time_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            size = fit_size((frame.shape[1], frame.shape[0]), tile_size)
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            tiles.append((time_ms, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+    finally:
+        cap.release()
+    return tiles
+
+
+class StoryboardBuild:
+    """A contact sheet being built by several worker processes."""
+
+    def __init__(self, futures, columns, rows, size):
+        self.started = time.monotonic()
+        self.futures = futures
+        self.columns = columns
+        self.rows = rows
+        self.size = size
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+    def result(self):
+        tiles = []
+        for future in self.futures:
+            tiles.extend(future.result())
+        if not any(tiles):
+            raise OSError("No frames could be decoded")
+
+        cell_w = self.size[0] // self.columns
+        cell_h = self.size[1] // self.rows
+        sheet = Image.new("RGB", self.size, (33, 37, 41))
+        draw = ImageDraw.Draw(sheet)
+        for i, tile in enumerate(tiles):
+            if tile is None:
+                continue
+            time_ms, rgb = tile
+            img = Image.fromarray(rgb)
+            x = (i % self.columns) * cell_w + (cell_w - img.width) // 2
+            y = (i // self.columns) * cell_h + (cell_h - img.height) // 2
+            sheet.paste(img, (x, y))
+            seconds = int(time_ms / 1000)
+            draw.text((x + 4, y + 2), f"{seconds // 60:02d}:{seconds % 60:02d}", fill=(255, 255, 255))
+        return sheet
+
+
+class StoryboardBuilder:
+    """Builds contact sheets of evenly spaced frames, seeking in parallel in a process pool."""
+
+    def __init__(self, folder_path, frames=12, columns=4, size=PREVIEW_SIZE, workers=None):
+        self.folder_path = folder_path
+        self.frames = frames
+        self.columns = columns
+        self.rows = -(-frames // columns)
+        self.size = size
+        self.tile_size = (size[0] // columns - 4, size[1] // self.rows - 4)
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.kind = f"storyboard-{frames}-{size[0]}x{size[1]}"
+
+        self.builds = {}
+        self.lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def schedule(self, names):
+        """Starts building storyboards for the given names and cancels any other pending builds."""
+        with self.lock:
+            for name in list(self.builds):
+                if name not in names:
+                    self.builds.pop(name).cancel()
+            for name in names:
+                if name not in self.builds:
+                    self.builds[name] = self._submit(name)
+
+    def take(self, name):
+        with self.lock:
+            build = self.builds.pop(name, None)
+        return build or self._submit(name)
+
+    def discard(self, name):
+        with self.lock:
+            build = self.builds.pop(name, None)
+        if build is not None:
+            build.cancel()
+
+    def close(self):
+        with self.lock:
+            for build in self.builds.values():
+                build.cancel()
+            self.builds.clear()
+        self.executor.shutdown(wait=False)
+
+    def _submit(self, name):
+        path = os.path.join(self.folder_path, name)
+        # Give each worker a contiguous run of frames so its seeks stay in order
+        chunk = -(-self.frames // self.workers)
+        futures = [
+            self.executor.submit(extract_frames, path, self.frames, first, min(first + chunk, self.frames), self.tile_size)
+            for first in range(0, self.frames, chunk)
+        ]
+        return StoryboardBuild(futures, self.columns, self.rows, self.size)
@@ -0,0 +1,153 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from medisort.mover import STATE_DIR
+from medisort.raw import open_image
+from medisort.scan import IMAGE_EXTENSIONS, iter_media
+
+THUMB_SIZE = 32
+HISTOGRAM_BINS = 4 # Per channel, so 64 colour bins
+CHUNK_SIZE = 64
+FEATURES = HISTOGRAM_BINS ** 3 + 64
+# Descriptors scored per matrix product: a block against 100k labelled images is about 100 MB
+QUERY_BLOCK = 256
+
+
+def describe(img):
+    """Returns a compact, L2-normalized descriptor: a coarse colour histogram plus an 8x8 luminance layout."""
+    pixels = np.asarray(img.convert("RGB").resize((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR), dtype=np.uint8)
+    bins = (pixels // (256 // HISTOGRAM_BINS)).reshape(-1, 3).astype(np.int32)
+    codes = (bins[:, 0] * HISTOGRAM_BINS + bins[:, 1]) * HISTOGRAM_BINS + bins[:, 2]
+    histogram = np.bincount(codes, minlength=HISTOGRAM_BINS ** 3).astype(np.float32)
+    histogram /= np.linalg.norm(histogram) or 1
+
+    gray = pixels.astype(np.float32).mean(axis=2).reshape(8, 4, 8, 4).mean(axis=(1, 3)).ravel()
+    gray -= gray.mean()
+    gray /= np.linalg.norm(gray) or 1
+
+    feature = np.concatenate([histogram, gray])
+    return feature / np.linalg.norm(feature)
+
+
+def describe_file(path):
+    with open_image(path) as img:
+        img.draft("RGB", (THUMB_SIZE * 2, THUMB_SIZE * 2))
+        return describe(img)
+
+
+def describe_chunk(paths):
+    """Worker: returns (features, ok) for a chunk of image paths."""
+    features = np.zeros((len(paths), FEATURES), np.float32)
+    ok = np.zeros(len(paths), bool)
+    for i, path in enumerate(paths):
+        try:
+            features[i] = describe_file(path)
+            ok[i] = True
+        except (OSError, ValueError, Image.DecompressionBombError):
+            continue
+    return features, ok
+
+
+def describe_files(paths, workers=None):
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    if not chunks:
+        return np.zeros((0, FEATURES), np.float32), np.zeros(0, bool)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(describe_chunk, chunks))
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+class TierIndex:
+    """kNN index over images already sorted into tier folders, stored as one NumPy matrix."""
+
+    def __init__(self, tiers, features, labels, k=15):
+        self.tiers = list(tiers)
+        self.features = features
+        self.labels = labels
+        self.k = k
+
+    def __len__(self):
+        return len(self.labels)
+
+    def query(self, features):
+        """Returns (tier_indices, confidences) for a batch of descriptors using weighted kNN votes."""
+        features = np.atleast_2d(features).astype(np.float32)
+        if not len(self.labels):
+            return np.full(len(features), -1), np.zeros(len(features), np.float32)
+
+        k = min(self.k, len(self.labels))
+        nearest = np.empty((len(features), k), np.int64)
+        weights = np.empty((len(features), k), np.float32)
+        # Scored a block at a time, keeping only each block's top k, so memory does not grow with the queue
+        for start in range(0, len(features), QUERY_BLOCK):
+            similarities = features[start:start + QUERY_BLOCK] @ self.features.T
+            block = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            nearest[start:start + len(block)] = block
+            weights[start:start + len(block)] = np.clip(np.take_along_axis(similarities, block, axis=1), 0, None)
+
+        votes = np.zeros((len(features), len(self.tiers)), np.float32)
+        rows = np.repeat(np.arange(len(features)), k)
+        np.add.at(votes, (rows, self.labels[nearest].ravel()), weights.ravel())
+        totals = votes.sum(axis=1)
+        best = votes.argmax(axis=1)
+        confidences = np.where(totals > 0, votes[np.arange(len(features)), best] / np.maximum(totals, 1e-9), 0)
+        return best, confidences
+
+    def suggest(self, feature):
+        """Returns (tier, confidence) for one descriptor, or (None, 0.0) if nothing is labelled yet."""
+        best, confidences = self.query(feature)
+        if best[0] < 0:
+            return None, 0.0
+        return self.tiers[best[0]], float(confidences[0])
+
+    @classmethod
+    def build(cls, folder_path, tiers, workers=None):
+        """Indexes every image in the tier folders, reusing descriptors cached from earlier sessions."""
+        cache_path = os.path.join(folder_path, STATE_DIR, "tier_index.npz")
+        cached = {}
+        try:
+            with np.load(cache_path) as data:
+                for key, stamp, feature in zip(data["keys"], data["stamps"], data["features"]):
+                    cached[str(key)] = (int(stamp), feature)
+        except (OSError, KeyError, ValueError):
+            pass
+
+        keys, stamps, labels = [], [], []
+        for label, tier in enumerate(tiers):
+            tier_path = os.path.join(folder_path, tier)
+            if not os.path.isdir(tier_path):
+                continue
+            for name in iter_media(tier_path, IMAGE_EXTENSIONS, recursive=True):
+                try:
+                    st = os.stat(os.path.join(tier_path, name))
+                except OSError:
+                    continue
+                keys.append(os.path.join(tier, name))
+                stamps.append(st.st_mtime_ns ^ st.st_size)
+                labels.append(label)
+
+        features = np.zeros((len(keys), FEATURES), np.float32)
+        ok = np.ones(len(keys), bool)
+        missing = []
+        for i, (key, stamp) in enumerate(zip(keys, stamps)):
+            hit = cached.get(key)
+            if hit is not None and hit[0] == stamp:
+                features[i] = hit[1]
+            else:
+                missing.append(i)
+
+        if missing:
+            described, described_ok = describe_files([os.path.join(folder_path, keys[i]) for i in missing], workers)
+            features[missing] = described
+            ok[missing] = described_ok
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                np.savez(cache_path, keys=np.array(keys, dtype=str)[ok], stamps=np.array(stamps, dtype=np.int64)[ok],
+                         features=features[ok])
+            except OSError:
+                pass
+
+        return cls(tiers, features[ok], np.array(labels, dtype=np.int64)[ok])
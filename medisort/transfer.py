@@ -0,0 +1,282 @@
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+
+from medisort.metrics import metrics
+
+PART_SUFFIX = ".medisort-part"
+COPY_CHUNK = 64 * 1024 * 1024 # Per kernel copy call
+READ_CHUNK = 8 * 1024 * 1024 # For the user-space fallback and checksums
+
+# Errors meaning "this kernel copy call is not supported here", as opposed to a real I/O failure
+UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+if hasattr(errno, "ENOTSOCK"):
+    UNSUPPORTED.add(errno.ENOTSOCK)
+
+
+def copy_data(src_fd, dst_fd, size):
+    """Copies size bytes between two fds positioned at 0, in kernel space where the platform allows."""
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - copied))
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            # Kernels before 5.3, and 5.19+ between different filesystem types, refuse cross-device copies
+            if copied or e.errno not in UNSUPPORTED:
+                raise
+
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK, size - copied))
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError as e:
+            if copied or e.errno not in UNSUPPORTED:
+                raise
+
+    buf = bytearray(READ_CHUNK)
+    view = memoryview(buf)
+    with open(src_fd, "rb", buffering=0, closefd=False) as src:
+        while True:
+            n = src.readinto(buf)
+            if not n:
+                break
+            written = 0
+            while written < n:
+                written += os.write(dst_fd, view[written:n])
+            copied += n
+    return copied
+
+
+def file_digest(path, drop_cache=False):
+    """BLAKE2b of the file. With drop_cache the pages are evicted first, so the read comes from disk."""
+    digest = hashlib.blake2b()
+    with open(path, "rb", buffering=0) as f:
+        if drop_cache and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        buf = bytearray(READ_CHUNK)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def same_device(src, dst_dir):
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+class PendingCopy:
+    """A cross-device copy that has been written but not yet made durable and swapped in."""
+
+    def __init__(self, src, dst, part_file, size, digest, on_complete):
+        self.src = src
+        self.dst = dst
+        self.part = dst + PART_SUFFIX
+        # Kept open until it is fsynced: a write-back error is only reported to descriptors open when it happens
+        self.part_file = part_file
+        self.size = size
+        self.digest = digest
+        self.on_complete = on_complete
+        self.queued = time.monotonic()
+
+
+class TransferEngine:
+    """Moves files: an atomic rename within a filesystem, a kernel-space copy across filesystems.
+
+    Copies land under a temporary name. A background thread finalizes them in batches: it
+    fsyncs each copy, optionally verifies it against a checksum read back from disk, swaps it
+    in, fsyncs the destination directories once per batch, and only then deletes the sources.
+    """
+
+    def __init__(self, verify=False, batch_files=32, batch_bytes=1024 * 1024 * 1024, batch_delay=1.0):
+        self.verify = verify
+        self.batch_files = batch_files
+        self.batch_bytes = batch_bytes
+        self.batch_delay = batch_delay
+
+        self.batch = []
+        self.batch_size = 0
+        self.closing = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def move(self, src, dst, on_complete):
+        """Moves src to dst. on_complete(error) is called once dst is final and src is gone, or on failure.
+
+        Renames complete before this returns; cross-device copies complete when their batch is synced.
+        """
+        if os.path.exists(dst):
+            raise FileExistsError(errno.EEXIST, "Destination already exists", dst)
+        dst_dir = os.path.dirname(dst)
+        os.makedirs(dst_dir, exist_ok=True)
+
+        if same_device(src, dst_dir):
+            try:
+                os.rename(src, dst)
+                on_complete(None)
+                return
+            except OSError as e:
+                # Bind mounts share a device number but still cannot rename across each other
+                if e.errno != errno.EXDEV:
+                    raise
+
+        pending = self.copy(src, dst, on_complete)
+        with self.condition:
+            self.batch.append(pending)
+            self.batch_size += pending.size
+            if self.thread is None:
+                # Not a daemon: a batch still waiting for its sync must not be abandoned at exit
+                self.thread = threading.Thread(target=self._sync_loop, name="medisort-sync")
+                self.thread.start()
+            self.condition.notify()
+
+    def copy(self, src, dst, on_complete):
+        digest = file_digest(src) if self.verify else None
+        part = dst + PART_SUFFIX
+        with metrics.time("transfer_copy"):
+            # O_TRUNC: a part file left by a crash is simply overwritten
+            fdst = open(part, "wb", buffering=0)
+            try:
+                with open(src, "rb", buffering=0) as fsrc:
+                    size = os.fstat(fsrc.fileno()).st_size
+                    copied = copy_data(fsrc.fileno(), fdst.fileno(), size)
+                if copied != size:
+                    raise OSError(errno.EIO, f"Copied {copied} of {size} bytes", src)
+                # Recovery recognises a finished copy by its size and mtime
+                shutil.copystat(src, part)
+            except BaseException:
+                fdst.close()
+                try:
+                    os.unlink(part)
+                except OSError:
+                    pass
+                raise
+        metrics.count("bytes_copied", size)
+        return PendingCopy(src, dst, fdst, size, digest, on_complete)
+
+    def close(self, wait=False):
+        """Flushes the pending batch now. With wait, returns once it has been finalized."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+            thread = self.thread
+        if wait and thread is not None:
+            thread.join()
+
+    def _sync_loop(self):
+        try:
+            while True:
+                with self.condition:
+                    while True:
+                        if self.batch and (self.closing or len(self.batch) >= self.batch_files
+                                           or self.batch_size >= self.batch_bytes
+                                           or time.monotonic() - self.batch[0].queued >= self.batch_delay):
+                            break
+                        if not self.batch and self.closing:
+                            self.thread = None
+                            return
+                        timeout = self.batch_delay if not self.batch else \
+                            max(0.0, self.batch[0].queued + self.batch_delay - time.monotonic())
+                        if not self.condition.wait(timeout) and not self.batch:
+                            self.thread = None # Idle; move() starts a new thread when work arrives
+                            return
+                    batch, self.batch, self.batch_size = self.batch, [], 0
+                self._finalize(batch)
+        finally:
+            with self.condition:
+                # Should this thread die, the next move() starts another instead of queueing behind it
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def _finalize(self, batch):
+        with metrics.time("transfer_sync"):
+            synced = self._sync(batch)
+        placed = []
+        for pending in batch:
+            error = synced.get(pending.part)
+            try:
+                if error is not None:
+                    raise error
+                if self.verify:
+                    with metrics.time("transfer_verify"):
+                        if file_digest(pending.part, drop_cache=True) != pending.digest:
+                            raise OSError(errno.EIO, "Checksum mismatch after copy", pending.src)
+                os.replace(pending.part, pending.dst)
+            except Exception as e:
+                try:
+                    os.unlink(pending.part)
+                except OSError:
+                    pass
+                self._complete(pending, e)
+                continue
+            placed.append(pending)
+
+        # The renames must be on disk before any source is deleted
+        with metrics.time("transfer_sync"):
+            synced = self._sync_dirs({os.path.dirname(pending.dst) for pending in placed})
+        for pending in placed:
+            try:
+                error = synced.get(os.path.dirname(pending.dst))
+                if error is not None:
+                    raise error
+                os.unlink(pending.src)
+            except Exception as e:
+                # The source is kept: the copy is in place but may not survive a crash
+                self._complete(pending, e)
+                continue
+            self._complete(pending, None)
+
+    def _complete(self, pending, error):
+        """Reports a copy's outcome. A failing callback (say, a full disk under the journal) must
+        not take the sync thread down with it, or every later copy would wait forever."""
+        try:
+            pending.on_complete(error)
+        except Exception:
+            metrics.count("transfer_callback_errors")
+
+    def _sync(self, batch):
+        """fsyncs and closes every part file. Returns {part: error} for the ones that could not be made durable."""
+        errors = {}
+        for pending in batch:
+            try:
+                with pending.part_file:
+                    os.fsync(pending.part_file.fileno())
+            except OSError as e:
+                errors[pending.part] = e
+        return errors
+
+    def _sync_dirs(self, paths):
+        """fsyncs directories so the entries renamed into them persist. Returns {path: error}."""
+        errors = {}
+        if os.name == "nt":
+            return errors # Windows cannot open a directory; NTFS journals the rename itself
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                # Some filesystems do not support fsync on a directory at all
+                if e.errno not in (errno.EINVAL, errno.ENOTSUP, errno.EOPNOTSUPP):
+                    errors[path] = e
+        return errors
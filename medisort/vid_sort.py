@@ -1,134 +1,469 @@
 import os
 import cv2
-import random
-import shutil
 import threading
-import queue
 import time
+from collections import deque
 from tkinter import messagebox
 from PIL import Image, ImageTk
+from medisort.capture_pool import CapturePool, release_when_done
+from medisort.frame_ring import FrameRing
+from medisort.hotkeys import UNDO
+from medisort.metrics import metrics
+from medisort.preview import PREVIEW_SIZE, display_box, fit_size, placeholder_preview
+from medisort.proxy import ProxyManager
+from medisort.session import SortSession
+from medisort.storyboard import StoryboardBuilder
+
+POSTER_KIND = "poster-854x480"
+DEFAULT_FPS = 30.0
+# Late frames are dropped, but never for longer than this, so slow decoders still show something
+MAX_DROP_GAP = 0.25
+DISPLAY_POLL_MS = 10
+RESIZE_DELAY_MS = 100
+TRIAGE_SPEEDS = (1, 2, 4, 8, 16)
+# OpenCV exposes no keyframe index, so seeks snap to a step about as long as a typical camera GOP
+SEEK_STEP = 2.0
 
 class VideoSorter:
-    def __init__(self, parent_window, img_label, folder_path, tiers, on_close_callback):
+    def __init__(self, parent_window, img_label, folder_path, tiers, on_close_callback, preview_cache=None,
+                 status_label=None, recursive=False, storyboard=False, storyboard_frames=12, shared=False,
+                 speed=1, seek_bar=None, proxies=False, rules=None):
         self.parent_window = parent_window
         self.img_label = img_label
         self.folder_path = folder_path
         self.tiers = tiers
         self.on_close_callback = on_close_callback
+        self.preview_cache = preview_cache
+        self.status_label = status_label
+        self.recursive = recursive
+        self.shared = shared
+        self.speed = speed
+        self.seek_bar = seek_bar
 
-        self.video_files = []
+        self.session = SortSession(folder_path, tiers, "video", recursive=recursive, shared=shared, rules=rules)
+        self.decisions = self.session.decisions
+        self.video_files = None
         self.current_video = None # Stores the filename of the video currently on display
+        self.videos_shown = 0
+        self.typed = deque() # Decisions not yet applied, in the order they were made
+        self.polling = False
 
         self.video_cap = None
         self.stop_playback = threading.Event()
         self.video_lock = threading.Lock()
-        self.frame_queue = queue.Queue(maxsize=30)
+        self.frame_ring = None
+        self.photo = None # Persistent PhotoImage that every frame is pasted into
+        self.dropped_frames = 0
+        self.position = 0.0 # Playback position of the current video in seconds
+        self.seek_request = None
+        self.dragging = False
+        # Frames are scaled to the label's real size, updated as the window is resized
+        self.view_size = display_box(img_label, PREVIEW_SIZE)
+        self.resize_pending = False
+        img_label.bind("<Configure>", self.on_resize)
+        if seek_bar is not None:
+            seek_bar.config(resolution=SEEK_STEP)
+            seek_bar.bind("<ButtonPress-1>", self.start_seek_drag)
+            seek_bar.bind("<ButtonRelease-1>", self.end_seek_drag)
+        self.storyboards = None
+        self.captures = None
+        self.proxies = None
+        if storyboard:
+            self.storyboards = StoryboardBuilder(folder_path, frames=storyboard_frames)
+        else:
+            if proxies:
+                try:
+                    self.proxies = ProxyManager(folder_path)
+                except OSError as e:
+                    # Playback still works from the originals, just not as smoothly
+                    self.session.warnings.append(f"Video proxies disabled: {e}")
+            # Moves, the catalog and the poster cache keep using the original file
+            playback_path = self.proxies.playback_path if self.proxies is not None else None
+            self.captures = CapturePool(folder_path, playback_path=playback_path)
         
         self.parent_window.protocol("WM_DELETE_WINDOW", self.on_window_close)
 
     def start(self):
-        """Loads video files and starts the sorter by calling next_video."""
-        all_files = os.listdir(self.folder_path)
-        self.video_files = [f for f in all_files if f.lower().endswith((".mp4", ".mov", ".avi", ".mkv", ".webm"))]
-        
-        self.video_files = [f for f in self.video_files if os.path.isfile(os.path.join(self.folder_path, f))]
-        
-        random.shuffle(self.video_files)
-        
-        if not self.video_files:
-            messagebox.showinfo("No Videos Found", "There are no videos in the root of the selected folder to sort.")
-            self.on_window_close()
-            return
+        """Starts enumerating video files and shows the first one as soon as it is found."""
+        self.video_files = self.session.open_queue()
 
-        self.parent_window.after(100, self.next_video)
+        self.parent_window.after(100, self.poll_next)
         self.display_frame_from_queue()
+        self.update_move_status()
 
     def on_tier_select(self, tier):
-        if not self.stop_playback.is_set():
+        """Decides the current video, even before it has started playing. Decisions made ahead
+        of the display apply to the following videos in order."""
+        self.typed.append(tier)
+        self.apply_typed()
+
+    def skip(self):
+        self.typed.append(None)
+        self.apply_typed()
+
+    def undo(self):
+        self.typed.append(UNDO)
+        self.apply_typed()
+
+    def apply_typed(self):
+        while self.typed:
+            if self.typed[0] is UNDO:
+                self.typed.popleft()
+                self.undo_last()
+                continue
+            if self.current_video is None:
+                return # Resumed by poll_next once the next video is available
+            tier = self.typed.popleft()
+            metrics.count("decisions" if tier else "skips")
             self.stop_playback.set()
-            self.next_video(tier_for_previous=tier)
+            with metrics.time("next_video"):
+                self.decisions.add(self.current_video, tier)
+                self.next_video()
 
-    def move_file(self, video_to_move, tier):
-        src = os.path.join(self.folder_path, video_to_move)
-        dst = os.path.join(self.folder_path, tier, video_to_move)
-        try:
-            print(f"Moving {src} to {dst}")
-            shutil.move(src, dst)
-        except Exception as e:
-            messagebox.showerror("File Move Error", f"Could not move file: {video_to_move}\n\nError: {e}")
+    def undo_last(self):
+        decision = self.decisions.undo()
+        if decision is None:
+            return # Already committed, or nothing decided yet
+        metrics.count("undos")
+        self.stop_playback.set()
+        self.release_capture()
+        if self.current_video is not None:
+            self.video_files.unpop(self.current_video)
+        self.show_video(decision[0])
 
-    def next_video(self, tier_for_previous=None):
+    def release_capture(self):
         with self.video_lock:
             if self.video_cap:
                 self.video_cap.release()
             self.video_cap = None
 
-        if tier_for_previous and self.current_video:
-            self.move_file(self.current_video, tier_for_previous)
+    def next_video(self):
+        self.release_capture()
+        self.current_video = None
 
-        if not self.video_files:
-            messagebox.showinfo("Done", "All videos have been sorted!")
+        if self.video_files.exhausted():
+            if self.video_files.error:
+                messagebox.showerror("Folder Error", f"Could not read folder: {self.video_files.error}")
+            elif not self.videos_shown and self.session.router is not None and self.session.router.routed:
+                messagebox.showinfo("Done", f"The rules sorted all {self.session.router.routed} videos.")
+            elif not self.videos_shown:
+                where = "selected folder" if self.recursive else "root of the selected folder"
+                messagebox.showinfo("No Videos Found", f"There are no videos in the {where} to sort.")
+            else:
+                messagebox.showinfo("Done", "All videos have been sorted!")
             self.on_window_close()
             return
 
-        self.current_video = self.video_files.pop()
-        video_path = os.path.join(self.folder_path, self.current_video)
-        
+        name = self.video_files.pop()
+        if name is None:
+            # Enumeration has not reached the next video yet
+            if not self.polling:
+                self.polling = True
+                self.parent_window.after(50, self.poll_next)
+            return
+        self.show_video(name)
+
+    def poll_next(self):
+        self.polling = False
+        if self.parent_window.winfo_exists() and self.current_video is None:
+            self.next_video()
+            self.apply_typed()
+
+    def show_video(self, name):
+        self.current_video = name
+        self.videos_shown += 1
+        video_path = os.path.join(self.folder_path, name)
+
+        if self.storyboards is not None:
+            self.stop_playback.clear()
+            self.show_storyboard(video_path)
+            return
+
+        poster_shown = self.show_cached_poster(video_path)
+
+        if self.frame_ring is not None:
+            self.frame_ring.clear()
         self.stop_playback.clear()
-        new_cap = cv2.VideoCapture(video_path)
+
+        future = self.captures.take(name)
+        self.captures.schedule(self.video_files.peek(self.captures.depth))
+        if self.proxies is not None:
+            self.proxies.schedule(self.video_files.peek(self.proxies.depth))
+        self.start_playback(name, future, poster_shown)
+
+    def start_playback(self, name, future, poster_shown):
+        """Starts playback once the prepared capture for name is ready, without blocking the Tk thread."""
+        if name != self.current_video or self.stop_playback.is_set():
+            release_when_done(future)
+            return
+        if not future.done():
+            self.parent_window.after(10, self.start_playback, name, future, poster_shown)
+            return
+
+        try:
+            prepared = future.result()
+        except Exception:
+            # In a shared folder a file can be moved away by someone else; that is no error
+            if not (self.shared and not os.path.exists(os.path.join(self.folder_path, name))):
+                messagebox.showerror("Error", f"Could not open video: {name}. Skipping file.")
+            self.parent_window.after(50, self.skip_broken, name)
+            return
+
+        self.show_image(prepared.first_image)
+        if not poster_shown and self.preview_cache is not None:
+            self.preview_cache.put(os.path.join(self.folder_path, name), POSTER_KIND, prepared.first_image)
+
+        if self.seek_bar is not None:
+            fps = prepared.cap.get(cv2.CAP_PROP_FPS)
+            frames = prepared.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            duration = frames / fps if fps > 0 and frames > 0 else 0
+            self.seek_bar.config(to=max(duration, SEEK_STEP))
+            self.seek_bar.set(0)
 
         with self.video_lock:
-            if new_cap.isOpened():
-                self.video_cap = new_cap
-                threading.Thread(target=self.video_playback_thread, daemon=True).start()
-            else:
-                messagebox.showerror("Error", f"Could not open video: {self.current_video}. Skipping file.")
-                self.parent_window.after(50, self.next_video)
+            self.video_cap = prepared.cap
+        self.seek_request = None
+        self.position = 0.0
+        threading.Thread(target=self.video_playback_thread, daemon=True).start()
+
+    def set_speed(self, speed):
+        """Plays at speed times real time, skipping the frames in between without converting them."""
+        self.speed = speed
+
+    def seek(self, seconds):
+        self.seek_request = round(seconds / SEEK_STEP) * SEEK_STEP
+
+    def start_seek_drag(self, event):
+        self.dragging = True
+
+    def end_seek_drag(self, event):
+        self.dragging = False
+        self.seek(float(self.seek_bar.get()))
+
+    def on_resize(self, event):
+        if not self.resize_pending:
+            self.resize_pending = True
+            self.parent_window.after(RESIZE_DELAY_MS, self.apply_resize)
+
+    def apply_resize(self):
+        self.resize_pending = False
+        if self.parent_window.winfo_exists():
+            # Picked up by the playback thread with its next frame
+            self.view_size = display_box(self.img_label)
+
+    def skip_broken(self, name):
+        """Moves past a video that could not be opened, leaving it where it is."""
+        if name == self.current_video and self.parent_window.winfo_exists():
+            self.next_video()
+            self.apply_typed()
+
+    def show_cached_poster(self, video_path):
+        """Shows the cached poster frame for the video right away. Returns False on a cache miss."""
+        if self.preview_cache is None:
+            return False
+        img = self.preview_cache.get(video_path, POSTER_KIND)
+        if img is None:
+            return False
+        self.show_image(img)
+        return True
+
+    def show_storyboard(self, video_path):
+        """Shows the contact sheet for the current video and starts building the next one."""
+        sheet = None
+        if self.preview_cache is not None:
+            sheet = self.preview_cache.get(video_path, self.storyboards.kind)
+        if sheet is not None:
+            self.storyboards.discard(self.current_video)
+            self.show_image(sheet)
+        else:
+            self.show_cached_poster(video_path)
+            self.poll_storyboard(self.current_video, self.storyboards.take(self.current_video))
+
+        upcoming = self.video_files.peek(1)
+        if self.preview_cache is not None:
+            upcoming = [name for name in upcoming
+                        if not self.preview_cache.has(os.path.join(self.folder_path, name), self.storyboards.kind)]
+        self.storyboards.schedule(upcoming)
+
+    def poll_storyboard(self, name, build):
+        if name != self.current_video or not self.parent_window.winfo_exists():
+            build.cancel()
+            return
+        if not build.done():
+            self.parent_window.after(30, self.poll_storyboard, name, build)
+            return
+        metrics.record("storyboard", time.monotonic() - build.started)
+
+        video_path = os.path.join(self.folder_path, name)
+        try:
+            sheet = build.result()
+            if self.preview_cache is not None:
+                self.preview_cache.put(video_path, self.storyboards.kind, sheet)
+        except Exception as e:
+            sheet = placeholder_preview(f"No storyboard for {name}\n{e}")
+        self.show_image(sheet)
+
+    def show_image(self, img):
+        with metrics.time("photoimage"):
+            img_tk = ImageTk.PhotoImage(image=img)
+        self.img_label.config(image=img_tk)
+        self.img_label.image = img_tk
 
     def video_playback_thread(self):
-        """Reads frames from the video in a background thread."""
+        """Decodes, downscales and paces frames in a background thread."""
+        with self.video_lock:
+            cap = self.video_cap
+            if cap is None:
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        # Some containers report 0 or a timebase (e.g. 1000) instead of a real frame rate
+        if not 1 <= fps <= 240:
+            fps = DEFAULT_FPS
+        frame_interval = 1.0 / fps
+        view_size = self.view_size
+        display_size = fit_size(source_size, view_size) if min(source_size) > 0 else None
+        ring = None
+        raw = None # Decoder output buffer, reused for every frame
+
+        next_due = time.monotonic()
+        last_shown = next_due
+        started = next_due
+        frame = 1 # The prepared capture has already read the first frame
         while not self.stop_playback.is_set():
-            frame = None
             read_success = False
+            seek = self.seek_request
             with self.video_lock:
-                if self.video_cap and self.video_cap.isOpened():
+                if self.video_cap is not cap:
+                    break # A newer video has taken over
+                if seek is not None:
+                    self.seek_request = None
+                    frame = int(seek * fps)
+                    with metrics.time("video_seek"):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+                    next_due = time.monotonic()
+                if cap.isOpened():
                     try:
-                        read_success, frame = self.video_cap.read()
+                        with metrics.time("video_read"):
+                            read_success, raw = cap.read(raw)
                     except cv2.error:
                         self.stop_playback.set() # Stop on error
                         break
-            
+
             if not read_success:
                 with self.video_lock:
-                    if self.video_cap:
-                        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    if self.video_cap is cap:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                frame = 0
+                next_due = time.monotonic()
                 continue
+            frame += 1
+            self.position = frame / fps
 
-            if frame is not None:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                try:
-                    self.frame_queue.put_nowait(frame_rgb)
-                except queue.Full:
-                    pass
-            time.sleep(0.02)
+            now = time.monotonic()
+            if now > next_due + frame_interval and now - last_shown < MAX_DROP_GAP:
+                # Behind schedule: drop this frame before paying for resize and colour conversion
+                self.dropped_frames += 1
+                metrics.count("frames_dropped")
+                next_due += frame_interval
+                continue
+
+            if self.view_size != view_size:
+                view_size = self.view_size
+                display_size, ring = None, None # The window was resized
+            if ring is None:
+                if display_size is None:
+                    display_size = fit_size((raw.shape[1], raw.shape[0]), view_size)
+                ring = self.frame_ring
+                if ring is None or ring.size != display_size:
+                    ring = FrameRing(display_size)
+                    self.frame_ring = ring
+
+            slot, reclaimed = ring.acquire()
+            if reclaimed:
+                self.dropped_frames += 1 # The display fell behind; overwrite its oldest unshown frame
+                metrics.count("frames_dropped")
+            with metrics.time("video_convert"):
+                if display_size != (raw.shape[1], raw.shape[0]):
+                    cv2.resize(raw, display_size, dst=ring.scratch, interpolation=cv2.INTER_AREA)
+                    cv2.cvtColor(ring.scratch, cv2.COLOR_BGR2RGB, dst=ring.frames[slot])
+                else:
+                    cv2.cvtColor(raw, cv2.COLOR_BGR2RGB, dst=ring.frames[slot])
+            metrics.count("frames_decoded")
+
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -MAX_DROP_GAP:
+                next_due = time.monotonic() # Too far behind to catch up, resync the clock
+            next_due += frame_interval
+
+            ring.publish(slot)
+            last_shown = time.monotonic()
+            frame += self.skip_frames(cap)
+
+        metrics.record("playback", time.monotonic() - started)
+
+    def skip_frames(self, cap):
+        """At triage speeds, steps over the frames between two shown ones. grab() still has to
+        decode them, but skips the colour conversion, scaling and display. Returns the count."""
+        skipped = 0
+        for _ in range(self.speed - 1):
+            with self.video_lock:
+                if self.video_cap is not cap or self.seek_request is not None:
+                    break
+                with metrics.time("video_grab"):
+                    if not cap.grab():
+                        break
+            skipped += 1
+        metrics.count("frames_skipped", skipped)
+        return skipped
 
     def display_frame_from_queue(self):
         try:
-            frame = self.frame_queue.get_nowait()
-            img = Image.fromarray(frame)
-            img.thumbnail((854, 480))
-            img_tk = ImageTk.PhotoImage(image=img)
-            
-            if self.img_label.winfo_exists():
-                self.img_label.config(image=img_tk)
-                self.img_label.image = img_tk
-        except queue.Empty:
-            pass
+            ring = self.frame_ring
+            if ring is not None and self.img_label.winfo_exists():
+                slot, skipped = ring.take_latest()
+                if slot is not None:
+                    self.dropped_frames += skipped
+                    metrics.count("frames_dropped", skipped)
+                    with metrics.time("video_blit"):
+                        self.blit_frame(ring, slot)
+                    ring.release(slot)
+                    metrics.count("frames_shown")
+                    if self.seek_bar is not None and not self.dragging:
+                        self.seek_bar.set(self.position)
         finally:
             if self.parent_window.winfo_exists():
-                self.parent_window.after(15, self.display_frame_from_queue)
+                self.parent_window.after(DISPLAY_POLL_MS, self.display_frame_from_queue)
+
+    def blit_frame(self, ring, slot):
+        """Pastes a ring slot into the persistent PhotoImage without allocating a new one."""
+        if self.photo is None or (self.photo.width(), self.photo.height()) != ring.size:
+            self.photo = ImageTk.PhotoImage("RGB", ring.size)
+        # frombuffer wraps the slot's memory directly; paste copies it into Tk's image
+        self.photo.paste(Image.frombuffer("RGB", ring.size, ring.frames[slot], "raw", "RGB", 0, 1))
+        if getattr(self.img_label, "image", None) is not self.photo:
+            self.img_label.config(image=self.photo)
+            self.img_label.image = self.photo
+
+    def update_move_status(self):
+        if not self.parent_window.winfo_exists():
+            return
+        status = self.session.status()
+        if self.status_label is not None:
+            self.status_label.config(text=status)
+        self.parent_window.after(250, self.update_move_status)
 
     def on_window_close(self):
+        self.session.close(self.parent_window, self.status_label)
+        if self.storyboards is not None:
+            self.storyboards.close()
+        if self.captures is not None:
+            self.captures.close()
+        if self.proxies is not None:
+            self.proxies.close()
         self.stop_playback.set()
         with self.video_lock:
             if self.video_cap:
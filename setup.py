@@ -3,14 +3,17 @@ from setuptools import setup, find_packages
 setup(
     name="medisort",
     version="0.1",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=[
         'pillow>=9.0.0',
         'opencv-python>=4.5.0',
     ],
+    extras_require={
+        'heic': ['pillow-heif'],
+    },
     entry_points={
         'console_scripts': [
-            'medisort=medisort.medisort:main',
+            'medisort=medisort.cli:main',
         ],
     },
     python_requires='>=3.6',
@@ -0,0 +1,59 @@
+import os
+
+from medisort.catalog import Catalog
+
+
+def write_file(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"data")
+
+
+def listing(folder, **kwargs):
+    catalog = Catalog(str(folder))
+    return list(catalog.iter_pending("image", **kwargs)), catalog
+
+
+def test_a_later_session_resumes_in_the_same_order_without_decided_files(tmp_path):
+    for i in range(20):
+        write_file(str(tmp_path / f"{i}.jpg"))
+    write_file(str(tmp_path / "clip.mp4"))
+
+    first, catalog = listing(tmp_path)
+    assert sorted(first) == sorted(f"{i}.jpg" for i in range(20))
+    catalog.mark_decided(first[:5], "Good")
+    catalog.close()
+
+    second, catalog = listing(tmp_path)
+    catalog.close()
+    assert second == first[5:]
+
+
+def test_new_files_come_first_and_removed_ones_are_dropped(tmp_path):
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        write_file(str(tmp_path / name))
+    first, catalog = listing(tmp_path)
+    catalog.mark_decided(["a.jpg"], "Good")
+    catalog.close()
+
+    os.remove(tmp_path / "b.jpg")
+    write_file(str(tmp_path / "d.jpg"))
+    write_file(str(tmp_path / "a.jpg")) # A decided file back in the folder, e.g. after a failed move
+
+    second, catalog = listing(tmp_path)
+    catalog.close()
+    assert sorted(second[:2]) == ["a.jpg", "d.jpg"]
+    assert second[2:] == ["c.jpg"]
+
+
+def test_recursive_listing_leaves_out_skipped_directories(tmp_path):
+    for name in ("a.jpg", os.path.join("sub", "b.jpg"), os.path.join("Good", "c.jpg")):
+        write_file(str(tmp_path / name))
+
+    flat, catalog = listing(tmp_path, skip_dirs={"Good"})
+    catalog.close()
+    assert flat == ["a.jpg"]
+
+    nested, catalog = listing(tmp_path, recursive=True, skip_dirs={"Good"})
+    catalog.close()
+    assert sorted(nested) == ["a.jpg", os.path.join("sub", "b.jpg")]
@@ -0,0 +1,91 @@
+import os
+import time
+
+from medisort import claims as claims_module
+from medisort.claims import ClaimQueue, ClaimTable
+
+
+def write_files(folder, *names):
+    for name in names:
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(b"data")
+
+
+def drain(queue, timeout=10):
+    names, deadline = [], time.monotonic() + timeout
+    while not queue.exhausted() and time.monotonic() < deadline:
+        name = queue.pop()
+        if name is not None:
+            names.append(name)
+        else:
+            time.sleep(0.01)
+    return names
+
+
+def test_a_lease_keeps_others_off_until_it_expires(tmp_path):
+    first = ClaimTable(str(tmp_path), lease_seconds=0.3)
+    second = ClaimTable(str(tmp_path), lease_seconds=0.3)
+    try:
+        assert first.claim(["a.jpg", "b.jpg"]) == (["a.jpg", "b.jpg"], {})
+        claimed, held = second.claim(["a.jpg", "b.jpg", "c.jpg"])
+        assert claimed == ["c.jpg"]
+        assert sorted(held) == ["a.jpg", "b.jpg"]
+
+        time.sleep(0.4) # The first session stopped renewing, as if it had crashed
+        assert second.claim(["a.jpg", "b.jpg"]) == (["a.jpg", "b.jpg"], {})
+        assert sorted(first.claim(["a.jpg", "b.jpg"])[1]) == ["a.jpg", "b.jpg"]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_decided_files_are_not_offered_and_released_ones_are_at_once(tmp_path):
+    first = ClaimTable(str(tmp_path))
+    second = ClaimTable(str(tmp_path))
+    try:
+        first.claim(["a.jpg", "b.jpg", "c.jpg"])
+        first.complete(["a.jpg"])
+        first.release(["b.jpg"])
+        claimed, held = second.claim(["a.jpg", "b.jpg", "c.jpg"])
+        assert claimed == ["b.jpg"]
+        assert list(held) == ["c.jpg"]
+
+        first.close() # Hands back the undecided leases
+        assert second.claim(["a.jpg", "c.jpg"]) == (["c.jpg"], {})
+    finally:
+        second.close()
+
+
+def test_queue_takes_over_the_leases_of_a_session_that_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(claims_module, "CONTESTED_RETRY", 0.1)
+    write_files(str(tmp_path), "a.jpg", "b.jpg", "c.jpg")
+    crashed = ClaimTable(str(tmp_path), lease_seconds=0.5)
+    crashed.claim(["a.jpg"])
+
+    queue = ClaimQueue(str(tmp_path), iter(["a.jpg", "b.jpg", "c.jpg"]), batch_size=3)
+    try:
+        deadline = time.monotonic() + 5
+        while not queue.held_elsewhere() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert queue.held_elsewhere() == 1
+        assert sorted(drain(queue)) == ["a.jpg", "b.jpg", "c.jpg"]
+        assert queue.held_elsewhere() == 0
+        assert queue.error is None
+    finally:
+        queue.close(wait=True)
+        crashed.conn.close()
+
+
+def test_closing_the_queue_hands_its_leases_to_the_next_session(tmp_path):
+    write_files(str(tmp_path), "a.jpg", "b.jpg")
+    queue = ClaimQueue(str(tmp_path), iter(["a.jpg", "b.jpg"]))
+    names = drain(queue)
+    assert sorted(names) == ["a.jpg", "b.jpg"]
+    queue.complete(names[:1])
+    queue.close(wait=True)
+
+    following = ClaimTable(str(tmp_path))
+    try:
+        assert following.claim(["a.jpg", "b.jpg"]) == (names[1:], {})
+    finally:
+        following.close()
@@ -0,0 +1,43 @@
+import json
+
+from medisort.cli import EXIT_FAILED, load_decisions, main
+
+
+def test_load_decisions_drops_decisions_a_journal_undid(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    records = [{"op": "queued", "id": "m1", "file": "a.jpg", "tier": "Good"},
+               {"op": "queued", "id": "m2", "file": "b.jpg", "tier": "Bad"},
+               {"op": "undone", "id": "m2"},
+               {"op": "queued", "id": "m3", "file": "c.jpg", "tier": "Bad"},
+               {"op": "undone", "id": "m3"},
+               {"op": "queued", "id": "m4", "file": "c.jpg", "tier": "Good"},
+               {"op": "done", "id": "m1"}]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+    assert load_decisions(str(path)) == {"a.jpg": "Good", "c.jpg": "Good"}
+
+
+def test_apply_reports_a_folder_in_use(tmp_path, capsys, monkeypatch):
+    from medisort import mover as mover_module
+    (tmp_path / "a.jpg").write_bytes(b"data")
+    decisions = tmp_path / "decisions.csv"
+    decisions.write_text("a.jpg,Good\n", encoding="utf-8")
+    lock_journal = mover_module.lock_journal
+    monkeypatch.setattr(mover_module, "lock_journal", lambda path, timeout: lock_journal(path, 0.2))
+    holder = mover_module.MoveExecutor(str(tmp_path))
+    try:
+        status = main(["apply", str(decisions), str(tmp_path)])
+    finally:
+        holder.close(wait=True)
+    assert status == EXIT_FAILED
+    assert capsys.readouterr().err.startswith("medisort: ")
+    assert (tmp_path / "a.jpg").exists()
+
+
+def test_rules_reports_an_unwritable_report(tmp_path, capsys):
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps([{"tier": "Bad", "when": {"size": {">": 0}}}]), encoding="utf-8")
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    status = main(["rules", str(rules), str(folder), "--dry-run", "-q", "--report", str(tmp_path / "no" / "r.json")])
+    assert status == EXIT_FAILED
+    assert "could not write the rules report" in capsys.readouterr().err
@@ -0,0 +1,72 @@
+import numpy as np
+
+from medisort.dedupe import cluster, popcount
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def hashes(*values):
+    return np.array(values, np.uint64)
+
+
+def groups_by_brute_force(names, phashes, dhashes, max_distance=4, dhash_distance=10):
+    parents = list(range(len(names)))
+
+    def find(i):
+        while parents[i] != i:
+            i = parents[i]
+        return i
+
+    close = ((popcount(phashes[:, None] ^ phashes[None, :]) <= max_distance)
+             & (popcount(dhashes[:, None] ^ dhashes[None, :]) <= dhash_distance))
+    for a, b in zip(*np.nonzero(close)):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parents[root_b] = root_a
+    groups = {}
+    for i, name in enumerate(names):
+        groups.setdefault(find(i), []).append(name)
+    return sorted((sorted(group) for group in groups.values()), key=len, reverse=True)
+
+
+def test_only_pairs_within_both_distances_are_grouped():
+    base = 0x0123456789ABCDEF
+    phashes = hashes(base, flip(base, 1, 9, 30, 60), flip(base, 2, 10, 20, 40, 50), flip(base, 3))
+    dhashes = hashes(base, base, base, flip(base, *range(11)))
+    names = ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    assert cluster(names, phashes, dhashes, np.ones(4, bool)) == [["a.jpg", "b.jpg"], ["c.jpg"], ["d.jpg"]]
+
+
+def test_groups_are_transitive_and_unreadable_images_stand_alone():
+    base = 0x0F0F0F0F0F0F0F0F
+    # Each step is 3 bits from the last, so the ends of the chain are 9 bits apart
+    chain = [base, flip(base, 0, 1, 2), flip(base, 0, 1, 2, 20, 21, 22), flip(base, 0, 1, 2, 20, 21, 22, 40, 41, 42)]
+    phashes = hashes(*chain, base)
+    names = ["1.jpg", "2.jpg", "3.jpg", "4.jpg", "broken.jpg"]
+    ok = np.array([True, True, True, True, False])
+    assert cluster(names, phashes, phashes, ok) == [["1.jpg", "2.jpg", "3.jpg", "4.jpg"], ["broken.jpg"]]
+
+
+def test_long_runs_of_similar_frames_group_as_if_compared_pair_by_pair():
+    rng = np.random.default_rng(0)
+    phashes, dhashes = [], []
+    for scene in range(3):
+        start = int(rng.integers(0, 1 << 63))
+        value = start
+        for frame in range(400):
+            # Slow drift within a scene, as in consecutive video frames
+            value = flip(value, int(rng.integers(0, 64))) if frame % 2 else value
+            if popcount(np.uint64(value ^ start)) > 3:
+                value = start
+            phashes.append(value)
+            dhashes.append(flip(start, *rng.integers(0, 64, 3).tolist()))
+    phashes, dhashes = np.array(phashes, np.uint64), np.array(dhashes, np.uint64)
+    names = [f"{i:04d}.jpg" for i in range(len(phashes))]
+
+    groups = cluster(names, phashes, dhashes, np.ones(len(names), bool))
+    assert groups == groups_by_brute_force(names, phashes, dhashes)
+    assert [len(group) for group in groups] == [400, 400, 400]
@@ -0,0 +1,19 @@
+from medisort.hotkeys import DecisionLog
+
+
+def test_decisions_are_recorded_at_once_and_committed_or_reverted_later():
+    events = []
+    ticket = iter(range(100))
+    log = DecisionLog(lambda item, tier, names, t: events.append(("commit", item, t)), depth=2,
+                      record=lambda item, tier, names: events.append(("record", item)) or next(ticket),
+                      revert=lambda t: events.append(("revert", t)))
+    log.add("a", "Good")
+    log.add("b", "Bad")
+    assert events == [("record", "a"), ("record", "b")]
+
+    assert log.undo() == ("b", "Bad", ["b"])
+    log.add("c", "Good")
+    log.add("d", None)
+    log.flush()
+    assert events[2:] == [("revert", 1), ("record", "c"), ("record", "d"), ("commit", "a", 0),
+                          ("commit", "c", 2), ("commit", "d", 3)]
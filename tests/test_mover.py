@@ -0,0 +1,147 @@
+import json
+import os
+import time
+
+import pytest
+
+from medisort.mover import JournalBusy, MoveExecutor, journal_path_for, read_journal
+
+
+def write_file(path, data=b"data", mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def journal_crash(folder, *moves):
+    """Leaves queued records with no outcome, as a session killed mid-move would."""
+    path = journal_path_for(str(folder))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for move_id, name, tier in moves:
+            f.write(json.dumps({"op": "queued", "id": move_id, "file": name, "tier": tier, "time": time.time()}) + "\n")
+
+
+def outcomes(folder):
+    result = {}
+    for record in read_journal(journal_path_for(str(folder))):
+        if record["op"] != "queued":
+            result.setdefault(record["id"], []).append(record["op"])
+    return result
+
+
+def test_recover_finishes_a_move_interrupted_before_it_started(tmp_path):
+    write_file(str(tmp_path / "a.jpg"))
+    journal_crash(tmp_path, ("m1", "a.jpg", "keep"))
+
+    mover = MoveExecutor(str(tmp_path))
+    assert "a.jpg" in mover.recovered
+    mover.close(wait=True)
+
+    assert not os.path.exists(tmp_path / "a.jpg")
+    assert os.path.exists(tmp_path / "keep" / "a.jpg")
+    assert outcomes(tmp_path) == {"m1": ["done"]}
+
+
+def test_recover_marks_a_completed_move_done(tmp_path):
+    write_file(str(tmp_path / "keep" / "a.jpg"))
+    journal_crash(tmp_path, ("m1", "a.jpg", "keep"))
+
+    mover = MoveExecutor(str(tmp_path))
+    assert not mover.recovered
+    mover.close(wait=True)
+    assert outcomes(tmp_path) == {"m1": ["done"]}
+
+
+def test_recover_drops_a_source_matching_its_copy(tmp_path):
+    # Crashed after the copy was swapped in but before the source was unlinked
+    write_file(str(tmp_path / "a.jpg"), mtime=1500000000)
+    write_file(str(tmp_path / "keep" / "a.jpg"), mtime=1500000000)
+    journal_crash(tmp_path, ("m1", "a.jpg", "keep"))
+
+    mover = MoveExecutor(str(tmp_path))
+    mover.close(wait=True)
+    assert not os.path.exists(tmp_path / "a.jpg")
+    assert outcomes(tmp_path) == {"m1": ["done"]}
+
+
+@pytest.mark.parametrize("src_data, src_mtime", [(b"other data", 1500000000), (b"data", 1600000000)])
+def test_recover_keeps_a_source_that_differs_from_the_destination(tmp_path, src_data, src_mtime):
+    write_file(str(tmp_path / "a.jpg"), src_data, mtime=src_mtime)
+    write_file(str(tmp_path / "keep" / "a.jpg"), mtime=1500000000)
+    journal_crash(tmp_path, ("m1", "a.jpg", "keep"))
+
+    mover = MoveExecutor(str(tmp_path))
+    mover.close(wait=True)
+    assert os.path.exists(tmp_path / "a.jpg")
+    assert outcomes(tmp_path) == {"m1": ["failed"]}
+    assert [name for name, _ in mover.failed] == ["a.jpg"]
+
+
+def test_second_executor_cannot_recover_moves_in_progress(tmp_path):
+    write_file(str(tmp_path / "a.jpg"))
+    first = MoveExecutor(str(tmp_path))
+    with pytest.raises(JournalBusy):
+        MoveExecutor(str(tmp_path), lock_timeout=0.2)
+    first.close(wait=True)
+    MoveExecutor(str(tmp_path), lock_timeout=0.2).close(wait=True)
+
+
+def test_double_recovery_runs_each_move_once(tmp_path):
+    for i in range(6):
+        write_file(str(tmp_path / f"{i}.jpg"))
+    journal_crash(tmp_path, *((f"m{i}", f"{i}.jpg", "keep") for i in range(6)))
+
+    first = MoveExecutor(str(tmp_path), workers=1)
+    move = first.engine.move
+
+    def slow_move(src, dst, on_complete):
+        time.sleep(0.05)
+        move(src, dst, on_complete)
+    first.engine.move = slow_move
+    # Closing without waiting, as a sorter window reopened straight away would
+    first.close()
+    second = MoveExecutor(str(tmp_path))
+    second.close(wait=True)
+    deadline = time.monotonic() + 5
+    while not first.journal.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert outcomes(tmp_path) == {f"m{i}": ["done"] for i in range(6)}
+    assert sorted(os.listdir(tmp_path / "keep")) == [f"{i}.jpg" for i in range(6)]
+
+
+def test_held_decisions_are_journaled_and_undone_ones_never_recovered(tmp_path):
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        write_file(str(tmp_path / name))
+    mover = MoveExecutor(str(tmp_path))
+    kept = mover.hold([("a.jpg", "keep")])
+    undone = mover.hold([("b.jpg", "keep")])
+    mover.hold([("c.jpg", "keep")]) # Still held when the session dies
+    mover.cancel(undone)
+    mover.release(kept)
+    mover.close(wait=True)
+    assert sorted(os.listdir(tmp_path / "keep")) == ["a.jpg"]
+
+    mover = MoveExecutor(str(tmp_path))
+    assert mover.recovered == {"c.jpg"}
+    mover.close(wait=True)
+    assert sorted(os.listdir(tmp_path / "keep")) == ["a.jpg", "c.jpg"]
+    assert os.path.exists(tmp_path / "b.jpg")
+    assert outcomes(tmp_path)[undone[0]] == ["undone"]
+
+
+def test_failed_recovery_releases_the_journal(tmp_path, monkeypatch):
+    journal_crash(tmp_path, ("m1", "a.jpg", "keep"))
+
+    def broken(self):
+        raise OSError("disk gone")
+    monkeypatch.setattr(MoveExecutor, "recover", broken)
+    # The traceback keeps the half-built executor alive, as an error dialog would
+    with pytest.raises(OSError) as failure:
+        MoveExecutor(str(tmp_path))
+    monkeypatch.undo()
+    MoveExecutor(str(tmp_path), lock_timeout=0.2).close(wait=True)
+    assert failure.traceback
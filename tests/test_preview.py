@@ -0,0 +1,68 @@
+import pytest
+from PIL import Image
+
+from medisort.preview import MAX_DECODE_BYTES, PYRAMID_LEVELS, decode_bytes, decode_preview, draft_box, fit_size
+
+
+def sample(mode="RGB", size=(257, 301)):
+    img = Image.radial_gradient("L").resize(size)
+    img = Image.merge("RGB", (img, img.transpose(Image.FLIP_LEFT_RIGHT), img.transpose(Image.FLIP_TOP_BOTTOM)))
+    return img.quantize(37) if mode == "P" else img.convert(mode)
+
+
+@pytest.mark.parametrize("name, mode, options", [
+    ("rgb.png", "RGB", {}),
+    ("rgba.png", "RGBA", {}),
+    ("palette.png", "P", {}),
+    ("gray.png", "L", {}),
+    ("deflate.tif", "RGB", {"compression": "tiff_adobe_deflate", "tiffinfo": {278: 8}}),
+    ("lzw.tif", "RGB", {"compression": "tiff_lzw", "tiffinfo": {278: 8}}),
+    ("bottom-up.bmp", "RGB", {}),
+])
+def test_large_images_decode_in_bands(tmp_path, name, mode, options):
+    path = str(tmp_path / name)
+    sample(mode).save(path, **options)
+    with Image.open(path) as full:
+        full.load()
+        # Decoded at full size, the bands must reassemble the image exactly
+        banded = decode_preview(path, full.size, max_bytes=100000)
+        assert banded.mode == full.mode and banded.size == full.size
+        assert banded.tobytes() == full.tobytes()
+        assert banded.getpalette() == full.getpalette()
+
+
+def test_banded_decode_downscales(tmp_path):
+    path = str(tmp_path / "big.png")
+    sample(size=(1200, 800)).save(path)
+    preview = decode_preview(path, (300, 300), max_bytes=100000)
+    assert preview.size == (300, 200)
+
+
+def test_truncated_png_raises_oserror(tmp_path):
+    path = str(tmp_path / "truncated.png")
+    sample().save(path, compress_level=0)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    with pytest.raises(OSError):
+        decode_preview(path, (100, 100), max_bytes=100000)
+
+
+@pytest.fixture(scope="module")
+def photo_24mp(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("jpeg") / "24mp.jpg")
+    sample(size=(6000, 4000)).save(path, quality=85)
+    return path
+
+
+@pytest.mark.parametrize("level", PYRAMID_LEVELS)
+def test_24mp_jpeg_decodes_at_every_level(photo_24mp, level):
+    with Image.open(photo_24mp) as img:
+        img.draft(None, draft_box(img, level, MAX_DECODE_BYTES))
+        assert decode_bytes(img) <= MAX_DECODE_BYTES
+    preview = decode_preview(photo_24mp, level)
+    target = fit_size((6000, 4000), level)
+    # The top level cannot be drafted at full scale within the ceiling, so it comes out at half
+    assert preview.width <= target[0] and preview.height <= target[1]
+    assert preview.width >= min(target[0], 3000)
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+from PIL import Image
+
+from medisort import rules
+from medisort.rules import Rule, RuleRouter, read_header
+
+
+def test_raw_header_comes_from_the_tiff_structure(tmp_path, monkeypatch):
+    # A RAW file is a TIFF structure; the rules must not open its embedded preview for the size
+    Image.new("RGB", (64, 48)).save(str(tmp_path / "a.cr2"), format="TIFF",
+                                    tiffinfo={271: "Canon", 272: "Canon EOS R5", 306: "2019:07:14 10:31:02"})
+    monkeypatch.setattr(rules, "open_image", None)
+
+    header = read_header(str(tmp_path), "a.cr2")
+    assert (header["width"], header["height"], header["pixels"]) == (64, 48, 64 * 48)
+    assert (header["camera_make"], header["camera_model"]) == ("Canon", "Canon EOS R5")
+    assert header["date"] == "2019-07-14 10:31:02"
+
+
+def test_date_is_only_the_exif_date(tmp_path):
+    path = str(tmp_path / "a.png")
+    Image.new("RGB", (8, 8)).save(path)
+    os.utime(path, (1500000000, 1500000000))
+
+    header = read_header(str(tmp_path), "a.png")
+    assert header["date"] is None
+    assert header["mtime"].startswith("2017-07-1")
+
+
+def test_write_report_raises_to_the_caller(tmp_path):
+    router = RuleRouter(str(tmp_path), [Rule("Small", "Bad", None, [("pixels", "<", 100)])])
+    router.examined = 1
+    with pytest.raises(OSError):
+        router.write_report() # There is no .medisort folder to write into
+    os.mkdir(tmp_path / ".medisort")
+    assert os.path.exists(router.write_report())
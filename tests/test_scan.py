@@ -0,0 +1,27 @@
+import time
+
+from medisort.scan import MediaQueue
+
+
+def drain(queue, timeout=5):
+    names, deadline = [], time.monotonic() + timeout
+    while not queue.exhausted() and time.monotonic() < deadline:
+        name = queue.pop()
+        if name is not None:
+            names.append(name)
+    return names
+
+
+def test_queue_hands_out_the_listing_in_order_without_excluded_files():
+    queue = MediaQueue(iter(["a.jpg", "b.jpg", "c.jpg"]), shuffle=False, exclude={"b.jpg"})
+    assert drain(queue) == ["a.jpg", "c.jpg"]
+    assert queue.error is None
+
+
+def test_a_failing_source_is_reported_not_taken_for_the_end():
+    def source():
+        yield "a.jpg"
+        raise ValueError("ranking failed")
+    queue = MediaQueue(source(), shuffle=False)
+    assert drain(queue) == ["a.jpg"]
+    assert isinstance(queue.error, ValueError)
@@ -0,0 +1,91 @@
+import os
+import time
+
+from PIL import Image
+
+from medisort import catalog as catalog_module
+from medisort import session as session_module
+from medisort.mover import journal_path_for, read_journal
+from medisort.rules import Rule
+from medisort.session import SortSession
+
+
+def write_file(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"data")
+
+
+def drain(queue):
+    names = []
+    while not queue.exhausted():
+        name = queue.pop()
+        if name is not None:
+            names.append(name)
+    return names
+
+
+def test_session_lists_the_folder_and_moves_decided_files(tmp_path):
+    for name in ("a.jpg", "b.png", "notes.txt", os.path.join("Good", "c.jpg")):
+        write_file(str(tmp_path / name))
+
+    session = SortSession(str(tmp_path), ["Good", "Bad"], "image")
+    queue = session.open_queue(arrange=sorted)
+    assert drain(queue) == ["a.jpg", "b.png"]
+
+    session.decisions.add("a.jpg", "Good")
+    session.decisions.add("b.png", None)
+    assert session.status("Note").startswith("Moves pending: 0    Failed: 0")
+    session.close(None)
+
+    assert os.path.exists(tmp_path / "Good" / "a.jpg")
+    assert os.path.exists(tmp_path / "b.png")
+
+
+def test_session_without_a_catalog_says_so_on_the_status_line(tmp_path, monkeypatch):
+    def unavailable(folder_path):
+        raise OSError("read-only file system")
+    monkeypatch.setattr(catalog_module, "Catalog", unavailable)
+    write_file(str(tmp_path / "a.jpg"))
+
+    session = SortSession(str(tmp_path), ["Good"], "image")
+    assert session.catalog is None
+    assert drain(session.open_queue()) == ["a.jpg"]
+    assert "Catalog disabled" in session.status()
+    assert "read-only file system" in session.status("Note")
+    session.close(None)
+
+
+class Messages:
+    def __init__(self):
+        self.shown = []
+
+    def showinfo(self, title, message):
+        self.shown.append(("info", title, message))
+
+    def showerror(self, title, message):
+        self.shown.append(("error", title, message))
+
+
+def test_closing_while_rules_route_moves_every_file_it_routed(tmp_path, monkeypatch):
+    messages = Messages()
+    monkeypatch.setattr(session_module, "messagebox", messages)
+    for i in range(3000):
+        Image.new("L", (4, 4)).save(str(tmp_path / f"{i}.png"))
+    rules = [Rule("Tiny", "Bad", None, [("pixels", "<", 100)])]
+
+    session = SortSession(str(tmp_path), ["Good"], "image", rules=rules)
+    session.open_queue()
+    deadline = time.monotonic() + 30
+    while not session.router.routed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    session.close(None)
+
+    routed = session.router.routed
+    assert 0 < routed < 3000
+    assert len(os.listdir(tmp_path / "Bad")) == routed
+    assert len(os.listdir(tmp_path)) - 2 == 3000 - routed # Less the Bad and .medisort folders
+    records = read_journal(journal_path_for(str(tmp_path)))
+    assert sum(record["op"] == "queued" for record in records) == routed
+    assert sum(record["op"] == "done" for record in records) == routed
+    assert [kind for kind, _, _ in messages.shown] == ["info"]
@@ -0,0 +1,29 @@
+import numpy as np
+
+from medisort import suggest
+from medisort.suggest import FEATURES, TierIndex
+
+
+def normalized(rows):
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_query_in_blocks_matches_scoring_all_at_once(monkeypatch):
+    rng = np.random.default_rng(7)
+    labelled = normalized(rng.random((500, FEATURES), np.float32))
+    queue = normalized(rng.random((70, FEATURES), np.float32))
+    index = TierIndex(["Good", "Bad", "Meh"], labelled, rng.integers(0, 3, 500), k=5)
+
+    whole = index.query(queue)
+    monkeypatch.setattr(suggest, "QUERY_BLOCK", 16)
+    blocked = index.query(queue)
+    assert np.array_equal(whole[0], blocked[0])
+    assert np.allclose(whole[1], blocked[1])
+
+
+def test_query_follows_the_nearest_labelled_images():
+    labelled = np.eye(4, FEATURES, dtype=np.float32)
+    index = TierIndex(["Good", "Bad"], labelled, np.array([0, 0, 1, 1]), k=1)
+    best, confidences = index.query(labelled[[2, 0]])
+    assert best.tolist() == [1, 0]
+    assert confidences.tolist() == [1.0, 1.0]
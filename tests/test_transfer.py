@@ -0,0 +1,63 @@
+import errno
+import os
+import threading
+
+import medisort.transfer
+from medisort.transfer import TransferEngine
+
+
+def copy_move(monkeypatch, tmp_path):
+    """Moves a file through the cross-device copy path. Returns (src, dst, error)."""
+    monkeypatch.setattr(medisort.transfer, "same_device", lambda src, dst_dir: False)
+    src, dst = str(tmp_path / "a.jpg"), str(tmp_path / "keep" / "a.jpg")
+    with open(src, "wb") as f:
+        f.write(b"data" * 1000)
+    done = threading.Event()
+    errors = []
+
+    def on_complete(error):
+        errors.append(error)
+        done.set()
+    engine = TransferEngine(batch_delay=0.01)
+    engine.move(src, dst, on_complete)
+    engine.close(wait=True)
+    assert done.wait(5)
+    return src, dst, errors[0]
+
+
+def test_copy_replaces_the_source(monkeypatch, tmp_path):
+    src, dst, error = copy_move(monkeypatch, tmp_path)
+    assert error is None
+    assert not os.path.exists(src)
+    with open(dst, "rb") as f:
+        assert f.read() == b"data" * 1000
+
+
+def test_failed_fsync_keeps_the_source(monkeypatch, tmp_path):
+    def failing_fsync(fd):
+        raise OSError(errno.EIO, "Input/output error")
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    src, dst, error = copy_move(monkeypatch, tmp_path)
+    assert isinstance(error, OSError) and error.errno == errno.EIO
+    assert os.path.exists(src)
+    assert not os.path.exists(dst)
+    assert os.listdir(os.path.dirname(dst)) == []
+
+
+def test_failing_callback_does_not_stall_later_copies(monkeypatch, tmp_path):
+    monkeypatch.setattr(medisort.transfer, "same_device", lambda src, dst_dir: False)
+    for name in ("a.jpg", "b.jpg"):
+        with open(tmp_path / name, "wb") as f:
+            f.write(b"data")
+    failed, done = threading.Event(), threading.Event()
+
+    def journal_full(error):
+        failed.set()
+        raise OSError(errno.ENOSPC, "No space left on device")
+    engine = TransferEngine(batch_delay=0.01)
+    engine.move(str(tmp_path / "a.jpg"), str(tmp_path / "keep" / "a.jpg"), journal_full)
+    assert failed.wait(5)
+    engine.move(str(tmp_path / "b.jpg"), str(tmp_path / "keep" / "b.jpg"), lambda error: done.set())
+    assert done.wait(5)
+    engine.close(wait=True)
+    assert sorted(os.listdir(tmp_path / "keep")) == ["a.jpg", "b.jpg"]